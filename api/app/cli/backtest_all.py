@@ -1,28 +1,106 @@
 from __future__ import annotations
 
 import argparse
+import os
+import sys
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, List
 
 import numpy as np
 import pandas as pd
 
-from app.ml.engine_backtest import sweep_thresholds, optimize_threshold
+from app import runtime
+from app.cli.parallel import run_serial, run_tasks
+from app.ml.data_manager import DataManager
+from app.ml_core.config_core import MODELS_DIR
+from app.ml_core.sweep_core import METRICS
 
 
 def _parse_list_arg(raw: str) -> List[str]:
     return [x.strip() for x in raw.split(",") if x.strip()]
 
 
+def _parse_float_list(raw: str) -> List[float]:
+    return [float(x) for x in _parse_list_arg(raw)]
+
+
 def _parse_thresholds(raw: str) -> List[float]:
     """
-    Converte '0.50:0.65:0.01' -> [0.50, 0.51, ..., 0.65].
+    Converte '0.001:0.003:0.001' -> [0.001, 0.002, 0.003].
     """
     t0, t1, step = [float(x) for x in raw.split(":")]
     arr = np.arange(t0, t1 + 1e-9, step)
     return [float(x) for x in arr]
 
 
+def _pair_csv(out_dir: str, symbol: str, tf: str) -> Path:
+    return Path(out_dir) / f"sweep_{symbol}_{tf}.csv"
+
+
+def _load_if_up_to_date(
+    out_dir: str, symbol: str, tf: str, thresholds: List[float], fees: List[float]
+) -> List[Dict[str, Any]] | None:
+    """
+    Reaproveita o CSV do par se for mais recente que o CSV limpo e o modelo,
+    e se tiver sido gerado com a mesma grelha de thresholds/fees.
+    """
+    pair_csv = _pair_csv(out_dir, symbol, tf)
+    clean = os.path.join(DataManager().CLEAN_DIR, f"{symbol}_{tf}_clean.csv")
+    model = os.path.join(MODELS_DIR, f"{symbol}_{tf}_model.pt")
+
+    if not (pair_csv.exists() and os.path.exists(clean) and os.path.exists(model)):
+        return None
+    if pair_csv.stat().st_mtime < max(os.path.getmtime(clean), os.path.getmtime(model)):
+        return None
+
+    df = pd.read_csv(pair_csv)
+    if not {"threshold", "fees_bps"}.issubset(df.columns):
+        return None
+    same_grid = (
+        np.allclose(np.unique(df["threshold"]), np.unique(np.round(thresholds, 12)))
+        and np.allclose(np.unique(df["fees_bps"]), np.unique(fees))
+    ) if len(df) == len(thresholds) * len(fees) else False
+
+    return df.to_dict(orient="records") if same_grid else None
+
+
+def sweep_pair(
+    symbol: str,
+    tf: str,
+    thresholds: List[float],
+    fees_bps: List[float],
+    slippage_bps: float,
+    metric: str,
+    limit: int,
+    out_dir: str,
+) -> Dict[str, Any]:
+    """
+    Sweep de um par (corre no processo filho com --jobs > 1):
+    1 leitura de dados + 1 série de previsões; todos os thresholds/fees
+    avaliados numa passagem vetorizada. Grava o CSV do par.
+    """
+    from app.ml_core.config_core import FEATURE_ORDER
+    from app.ml_core.feature_cache_core import FeatureCacheCore
+    from app.ml_core.inference_core import InferenceCore
+    from app.ml_core.sweep_core import SweepCore
+
+    df_fe = FeatureCacheCore(tf).load(symbol)
+    preds = InferenceCore(symbol).predict_series(df_fe[FEATURE_ORDER].values)
+    close = df_fe["close"].values
+    if limit and limit > 0:
+        close, preds = close[-limit:], preds[-limit:]
+
+    sw = SweepCore(close, preds).run(
+        thresholds,
+        fees_bps=fees_bps,
+        slippage_bps=slippage_bps,
+        metric=metric,
+    )
+
+    pd.DataFrame(sw["rows"]).to_csv(_pair_csv(out_dir, symbol, tf), index=False)
+    return sw
+
+
 def main(argv: list[str] | None = None) -> int:
     parser = argparse.ArgumentParser(
         description="Backtest/Sweep em batch de modelos ML_TRADE para vários símbolos/timeframes."
@@ -36,33 +114,34 @@ def main(argv: list[str] | None = None) -> int:
     parser.add_argument(
         "--tfs",
         type=str,
-        default="1d",
-        help="Lista de timeframes separada por vírgulas, ex.: '1d,1h'. Default: '1d'.",
+        default="1H",
+        help="Lista de timeframes separada por vírgulas. Default: '1H' (único suportado pelo MLCore).",
     )
     parser.add_argument(
         "--limit",
         type=int,
-        default=300,
-        help="Número de barras a usar no backtest (default: 300).",
+        default=0,
+        help="Número de barras (mais recentes) a usar no backtest; 0 = todas (default: 0).",
     )
     parser.add_argument(
         "--thresholds",
         type=str,
-        default="0.50:0.65:0.01",
-        help="Intervalo de thresholds no formato 'ini:fim:step', ex.: '0.50:0.65:0.01'.",
+        default="0.0005:0.005:0.0005",
+        help="Intervalo de thresholds sobre o retorno previsto no formato 'ini:fim:step'.",
     )
     parser.add_argument(
         "--metric",
         type=str,
         default="expectancy",
+        choices=list(METRICS),
         help="Métrica de seleção do threshold (ex.: 'expectancy', 'profit_factor', 'win_rate').",
     )
     parser.add_argument(
         "--fees-bps",
         dest="fees_bps",
-        type=float,
-        default=0.0,
-        help="Fees em basis points (ex.: 5 = 0.05%%).",
+        type=str,
+        default="0",
+        help="Fees em basis points, um ou vários níveis separados por vírgulas (ex.: '0,5,10').",
     )
     parser.add_argument(
         "--slippage-bps",
@@ -71,6 +150,23 @@ def main(argv: list[str] | None = None) -> int:
         default=0.0,
         help="Slippage em basis points (ex.: 5 = 0.05%%).",
     )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Número de processos em paralelo (default: 1 = sequencial no próprio processo).",
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=0.0,
+        help="Timeout por par em segundos, só com --jobs > 1 (default: 0 = sem limite).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Recalcular mesmo os pares cujo CSV já está atualizado.",
+    )
     parser.add_argument(
         "--out-dir",
         type=str,
@@ -79,10 +175,18 @@ def main(argv: list[str] | None = None) -> int:
     )
 
     args = parser.parse_args(argv)
+    runtime.configure("train")
 
-    symbols = _parse_list_arg(args.symbols)
+    symbols = [x.upper() for x in _parse_list_arg(args.symbols)]
     tfs = _parse_list_arg(args.tfs)
+    # InferenceCore carrega sempre o modelo <SYMBOL>_1H: outro tf correria esse
+    # modelo sobre features de outro timeframe
+    unsupported = [tf for tf in tfs if tf != "1H"]
+    if unsupported:
+        print(f"ERRO: timeframes não suportados pelo MLCore: {unsupported} (só 1H)", file=sys.stderr)
+        return 1
     thr_list = _parse_thresholds(args.thresholds)
+    fee_list = _parse_float_list(args.fees_bps) or [0.0]
     out_dir = Path(args.out_dir)
     out_dir.mkdir(parents=True, exist_ok=True)
 
@@ -92,49 +196,85 @@ def main(argv: list[str] | None = None) -> int:
     print(f"Limit        : {args.limit}")
     print(f"Thresholds   : {args.thresholds} -> {len(thr_list)} valores")
     print(f"Métrica      : {args.metric}")
-    print(f"Fees bps     : {args.fees_bps}")
+    print(f"Fees bps     : {fee_list}")
     print(f"Slippage bps : {args.slippage_bps}")
+    print(f"Jobs         : {args.jobs}")
     print(f"Out dir      : {out_dir}")
     print("-" * 80)
 
     rows_global: List[dict] = []
+    summary: List[Dict[str, Any]] = []
+    tasks: List[Dict[str, Any]] = []
+
+    def _collect(symbol: str, tf: str, rows: List[Dict[str, Any]], status: str, seconds: float) -> None:
+        best_row = None
+        if rows:
+            scores = [(-np.inf if r.get(args.metric) is None or pd.isna(r.get(args.metric))
+                       else float(r[args.metric])) for r in rows]
+            best_row = rows[int(np.argmax(scores))]
+        for r in rows:
+            row = dict(r)
+            row["symbol"] = symbol
+            row["tf"] = tf
+            rows_global.append(row)
+        summary.append({
+            "pair": f"{symbol}_{tf}",
+            "status": status,
+            "seconds": seconds,
+            **({f"best_{k}": v for k, v in best_row.items()} if best_row else {}),
+        })
+        if best_row:
+            best_metric = best_row.get(args.metric)
+            best_metric = float("nan") if best_metric is None else float(best_metric)
+            print(f"[SWEEP] {symbol}_{tf} ... {status.upper()}  best_thr={float(best_row['threshold']):.4f}  "
+                  f"fees_bps={float(best_row['fees_bps']):g}  {args.metric}={best_metric:.4f}")
 
     for symbol in symbols:
         for tf in tfs:
-            pair = f"{symbol}_{tf}"
-            print(f"[SWEEP] {pair} ...", end=" ", flush=True)
-            try:
-                sw = sweep_thresholds(
-                    symbol=symbol,
-                    tf=tf,
-                    limit=args.limit,
-                    thresholds=thr_list,
-                    metric=args.metric,
-                    fees_bps=args.fees_bps,
-                    slippage_bps=args.slippage_bps,
-                )
-                best_row = sw["best_row"]
-                best_thr = float(best_row.get("threshold"))
-                best_metric = float(best_row.get(args.metric, float("nan")))
-                print(f"OK  best_thr={best_thr:.4f}  {args.metric}={best_metric:.4f}")
-
-                # Guardar todas as linhas deste par com info extra
-                for r in sw["rows"]:
-                    row = dict(r)
-                    row["symbol"] = symbol
-                    row["tf"] = tf
-                    rows_global.append(row)
-
-                # Guardar CSV específico deste par
-                df_pair = pd.DataFrame(sw["rows"])
-                pair_csv = out_dir / f"sweep_{symbol}_{tf}.csv"
-                df_pair.to_csv(pair_csv, index=False)
-            except Exception as exc:
-                print(f"FALHOU  ({exc})")
+            cached = None if args.force else _load_if_up_to_date(args.out_dir, symbol, tf, thr_list, fee_list)
+            if cached is not None:
+                _collect(symbol, tf, cached, "skipped", 0.0)
+                continue
+            tasks.append({
+                "symbol": symbol,
+                "tf": tf,
+                "thresholds": thr_list,
+                "fees_bps": fee_list,
+                "slippage_bps": args.slippage_bps,
+                "metric": args.metric,
+                "limit": args.limit,
+                "out_dir": str(out_dir),
+            })
+
+    def _report(task: Dict[str, Any], row: Dict[str, Any]) -> None:
+        if row["status"] == "ok":
+            _collect(task["symbol"], task["tf"], row["result"]["rows"], "ok", row["seconds"])
+            return
+        error = (row["error"] or "").splitlines()[0] if row["error"] else None
+        print(f"[SWEEP] {task['symbol']}_{task['tf']} ... {row['status'].upper()}  ({error})")
+        summary.append({
+            "pair": f"{task['symbol']}_{task['tf']}",
+            "status": row["status"],
+            "seconds": row["seconds"],
+            "error": error,
+        })
+
+    if args.jobs > 1:
+        run_tasks(sweep_pair, tasks, jobs=args.jobs, timeout=args.timeout or None, on_done=_report)
+    else:
+        run_serial(sweep_pair, tasks, on_done=_report)
+
+    # Tabela resumo (melhor linha por par + estado)
+    if summary:
+        df_summary = pd.DataFrame(summary).sort_values("pair").reset_index(drop=True)
+        summary_csv = out_dir / "sweep_summary.csv"
+        df_summary.to_csv(summary_csv, index=False)
+        print("-" * 80)
+        print(f"Resumo por par gravado em: {summary_csv}")
 
     # CSV global agregando todos os símbolos/tfs
     if rows_global:
-        df_all = pd.DataFrame(rows_global)
+        df_all = pd.DataFrame(rows_global).sort_values(["symbol", "tf", "fees_bps", "threshold"])
         all_csv = out_dir / "sweep_all_symbols.csv"
         df_all.to_csv(all_csv, index=False)
         print("-" * 80)
@@ -143,7 +283,8 @@ def main(argv: list[str] | None = None) -> int:
         print("-" * 80)
         print("Nenhum resultado de sweep foi agregado (tudo falhou?).")
 
-    return 0
+    n_fail = sum(1 for r in summary if r["status"] not in ("ok", "skipped"))
+    return 0 if n_fail == 0 else 2
 
 
 if __name__ == "__main__":
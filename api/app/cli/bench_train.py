@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pandas as pd
+
+from app import runtime
+
+
+def _parse_list_arg(raw: str) -> List[str]:
+    return [x.strip() for x in raw.split(",") if x.strip()]
+
+
+def _parse_mode(raw: str) -> Dict[str, Any]:
+    """
+    'fp32' | 'bf16' | 'bf16+accum4' | 'fp32+compile' | 'bf16+accum4+compile'
+    """
+    mode: Dict[str, Any] = {"precision": "fp32", "accum_steps": 1, "compile_model": False}
+    for part in raw.lower().split("+"):
+        if part in ("fp32", "bf16"):
+            mode["precision"] = part
+        elif part.startswith("accum"):
+            mode["accum_steps"] = int(part[len("accum"):])
+        elif part == "compile":
+            mode["compile_model"] = True
+        else:
+            raise ValueError(f"Modo inválido: {raw}")
+    return mode
+
+
+def bench_mode(X, y, symbol: str, mode: Dict[str, Any], epochs: int, seed: int) -> Dict[str, Any]:
+    import torch
+    from app.ml_core.config_core import BATCH_SIZE
+    from app.ml_core.trainer_core import TrainerCore
+
+    # mesmo ponto de partida em todos os modos
+    torch.manual_seed(seed)
+    trainer = TrainerCore(symbol, persist=False, **mode)
+    trainer.load_data(X, y)
+
+    epoch_times = []
+    val_loss = float("nan")
+    for _ in range(epochs):
+        start = time.perf_counter()
+        trainer.train_epoch()
+        epoch_times.append(time.perf_counter() - start)
+        val_loss = trainer.validate()
+
+    n_train = len(trainer.X_train)
+    # 1ª época inclui compilação/warm-up: reportada à parte
+    steady = epoch_times[1:] or epoch_times
+
+    return {
+        "precision": trainer.precision,
+        "accum_steps": trainer.accum_steps,
+        "effective_batch": BATCH_SIZE * trainer.accum_steps,
+        "compiled": trainer.compiled,
+        "first_epoch_s": round(epoch_times[0], 3),
+        "epoch_s": round(sum(steady) / len(steady), 3),
+        "samples_per_s": round(n_train / (sum(steady) / len(steady)), 1),
+        "final_val_loss": val_loss,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark dos modos de treino do TrainerCore (fp32 / bf16 / acumulação / compile)."
+    )
+    parser.add_argument("--symbol", type=str, required=True, help="Símbolo com CSV limpo, ex.: 'AAPL'.")
+    parser.add_argument(
+        "--modes",
+        type=str,
+        default="fp32,bf16,bf16+accum4,fp32+compile",
+        help="Modos separados por vírgulas (default: 'fp32,bf16,bf16+accum4,fp32+compile').",
+    )
+    parser.add_argument("--epochs", type=int, default=3, help="Épocas por modo (default: 3).")
+    parser.add_argument("--seed", type=int, default=42, help="Seed do torch (default: 42).")
+    parser.add_argument(
+        "--out-dir",
+        type=str,
+        default="bench_out",
+        help="Diretório onde gravar o relatório (default: 'bench_out').",
+    )
+
+    args = parser.parse_args(argv)
+    runtime.configure("train")
+
+    try:
+        modes = {raw: _parse_mode(raw) for raw in _parse_list_arg(args.modes)}
+    except ValueError as exc:
+        print(f"ERRO: {exc}", file=sys.stderr)
+        return 1
+
+    from app.ml_core.dataset_builder_core import DatasetBuilderCore
+    from app.ml_core.feature_cache_core import FeatureCacheCore
+
+    symbol = args.symbol.upper()
+    df_fe = FeatureCacheCore("1H").load(symbol)
+    X, y = DatasetBuilderCore().build(df_fe)
+
+    print("=== ML_TRADE :: BENCH_TRAIN ===")
+    print(f"Symbol : {symbol}  samples={len(X)}")
+    print(f"Modes  : {list(modes)}")
+    print(f"Epochs : {args.epochs}")
+    print(f"Threads: {runtime.report().get('torch_threads')}")
+    print("-" * 60)
+
+    rows = []
+    for raw, mode in modes.items():
+        print(f"[BENCH] {raw} ...")
+        rows.append({"mode": raw, **bench_mode(X, y, symbol, mode, args.epochs, args.seed)})
+
+    df = pd.DataFrame(rows)
+    base = df.loc[0, "epoch_s"]
+    df["speedup"] = (base / df["epoch_s"]).round(2)
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_csv = out_dir / f"bench_train_{symbol}.csv"
+    df.to_csv(out_csv, index=False)
+
+    print("-" * 60)
+    print(df.to_string(index=False))
+    print(f"Relatório gravado em: {out_csv}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import argparse
+import json
+
+from app.services import paper_db
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Ledger de PnL realizado do paper trading: verificar contra o histórico de ordens ou reconstruir."
+    )
+    parser.add_argument(
+        "command",
+        choices=("check", "rebuild"),
+        help="check: compara o ledger com um replay completo das ordens; rebuild: reescreve o ledger.",
+    )
+    parser.add_argument(
+        "--db",
+        type=str,
+        default=None,
+        help="Caminho da base SQLite (default: PAPER_DB_PATH).",
+    )
+    parser.add_argument(
+        "--tol",
+        type=float,
+        default=1e-6,
+        help="Tolerância relativa na verificação (default: 1e-6).",
+    )
+
+    args = parser.parse_args(argv)
+    if args.db:
+        paper_db.init_db(args.db)
+
+    if args.command == "rebuild":
+        res = paper_db.rebuild_ledger()
+        print(f"Ledger reconstruído: {res['symbols']} símbolos, realized_pnl_total={res['realized_pnl_total']:.6f}")
+        return 0
+
+    res = paper_db.check_ledger(tol=args.tol)
+    print(f"Símbolos          : {res['symbols']}")
+    print(f"Realized (replay) : {res['realized_pnl_total']:.6f}")
+    print(f"Realized (conta)  : {res['portfolio_realized_pnl']:.6f}")
+    if res["ok"]:
+        print("OK: ledger consistente com o histórico de ordens.")
+        return 0
+
+    print(f"DIFERENÇAS ({len(res['diffs'])}):")
+    for d in res["diffs"]:
+        print("  " + json.dumps(d, ensure_ascii=False))
+    print("Corrigir com: python -m app.cli.paper_ledger rebuild")
+    return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
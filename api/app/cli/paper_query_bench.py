@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import statistics
+import sqlite3
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.services import broker, order_book, paper_db, portfolio
+
+# (nome, base, sql, params, índice esperado no plano, sem sort temporário)
+# base: "paper" (paper_db) ou "broker" (BrokerService)
+QUERIES: List[Tuple[str, str, str, Sequence[Any], str, bool]] = [
+    ("list_orders(status=filled)", "paper", paper_db._SQL_LIST_ORDERS_STATUS, ("filled", 50), "ix_orders_status", True),
+    ("list_orders(status=open)", "paper", paper_db._SQL_LIST_ORDERS_STATUS, ("open", 50), "ix_orders_status", True),
+    ("order_book.sync (open, id>?)", "paper", order_book._SQL_OPEN_SINCE, (0,), "ix_orders_status", True),
+    ("realized: símbolos filled", "paper", portfolio._SQL_FILLED_SYMBOLS, (), "ix_orders_symbol_status_ts", True),
+    ("realized: filled por símbolo", "paper", portfolio._SQL_FILLED_BY_SYMBOL, ("SYM0001",), "ix_orders_symbol_status_ts", True),
+    ("list_filled_orders", "paper", portfolio._SQL_FILLED, (), "ix_orders_status_ts_cover", True),
+    ("replay_ledger", "paper", paper_db._SQL_REPLAY, (), "ix_orders_symbol_status_ts", False),
+    ("broker.list_orders", "broker", broker._SQL_LIST_ORDERS, (100,), "ix_broker_orders_created", True),
+]
+
+
+def _seed_paper(db: paper_db.PaperDB, n_orders: int, n_symbols: int, rng: random.Random) -> None:
+    t0 = int(time.time()) - n_orders * 60
+    rows = []
+    for i in range(n_orders):
+        r = rng.random()
+        status = "filled" if r < 0.9 else ("open" if r < 0.95 else "cancelled")
+        qty = float(rng.randint(1, 100))
+        price = round(rng.uniform(10, 500), 2)
+        filled = status == "filled"
+        rows.append((
+            t0 + i * 60,
+            f"SYM{rng.randrange(n_symbols):04d}",
+            rng.choice(("buy", "sell")),
+            qty,
+            "market" if filled else "limit",
+            status,
+            price if filled else None,
+            None if filled else price,
+            qty * price if filled else None,
+            qty if filled else 0.0,
+        ))
+    with db.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO orders(ts, symbol, side, qty, type, status, price, limit_price, value, filled_qty) "
+            "VALUES(?,?,?,?,?,?,?,?,?,?)",
+            rows,
+        )
+        conn.execute("ANALYZE orders")
+
+
+def _seed_broker(svc: broker.BrokerService, n_orders: int, n_symbols: int, rng: random.Random) -> None:
+    t0 = int(time.time()) - n_orders * 60
+    rows = [
+        (
+            f"o{i:09d}",
+            f"SYM{rng.randrange(n_symbols):04d}",
+            rng.choice(("buy", "sell")),
+            float(rng.randint(1, 100)),
+            "market",
+            None,
+            "filled",
+            t0 + i * 60,
+            t0 + i * 60,
+        )
+        for i in range(n_orders)
+    ]
+    with svc.transaction() as cur:
+        cur.executemany("INSERT INTO orders VALUES(?,?,?,?,?,?,?,?,?)", rows)
+        cur.execute("ANALYZE orders")
+
+
+def _plan(conn: sqlite3.Connection, sql: str, params: Sequence[Any]) -> List[str]:
+    return [str(r[3]) for r in conn.execute("EXPLAIN QUERY PLAN " + sql, tuple(params)).fetchall()]
+
+
+def _time_ms(conn: sqlite3.Connection, sql: str, params: Sequence[Any], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        conn.execute(sql, tuple(params)).fetchall()
+        samples.append((time.perf_counter() - t) * 1000.0)
+    return statistics.median(samples)
+
+
+def check_plans(conns: Dict[str, sqlite3.Connection], repeat: int = 5) -> List[Dict[str, Any]]:
+    """
+    EXPLAIN QUERY PLAN + tempo mediano de cada query de QUERIES.
+    ok=False se o índice esperado não aparece no plano (ou há sort temporário).
+    """
+    out = []
+    for name, base, sql, params, index, no_sort in QUERIES:
+        conn = conns.get(base)
+        if conn is None:
+            continue
+        plan = _plan(conn, sql, params)
+        uses_index = any(index in p for p in plan)
+        temp_sort = any("TEMP B-TREE" in p for p in plan)
+        out.append({
+            "query": name,
+            "index": index,
+            "ok": uses_index and not (no_sort and temp_sort),
+            "ms": _time_ms(conn, sql, params, repeat),
+            "plan": plan,
+        })
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark das queries do paper trading: confirma o uso dos índices via EXPLAIN QUERY PLAN."
+    )
+    parser.add_argument(
+        "--db",
+        type=str,
+        default=None,
+        help="Base paper_db existente a analisar (default: base temporária com dados sintéticos).",
+    )
+    parser.add_argument(
+        "--broker-db",
+        type=str,
+        default=None,
+        help="Base do broker existente a analisar (default: temporária com dados sintéticos, só sem --db).",
+    )
+    parser.add_argument("--orders", type=int, default=200_000, help="Ordens sintéticas (default: 200000).")
+    parser.add_argument("--symbols", type=int, default=200, help="Símbolos sintéticos (default: 200).")
+    parser.add_argument("--repeat", type=int, default=5, help="Repetições por query (default: 5).")
+    parser.add_argument("--seed", type=int, default=42)
+
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+    conns: Dict[str, sqlite3.Connection] = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.db:
+            # migra (índices incluídos) se a base estiver atrasada
+            db = paper_db.PaperDB(args.db, size=1)
+        else:
+            db = paper_db.PaperDB(os.path.join(tmp, "paper.db"), size=1)
+            _seed_paper(db, args.orders, args.symbols, rng)
+            print(f"paper_db sintética: {args.orders} ordens, {args.symbols} símbolos")
+
+        svc = None
+        if args.broker_db or not args.db:
+            svc = broker.BrokerService(args.broker_db or os.path.join(tmp, "broker.db"))
+            if not args.broker_db:
+                _seed_broker(svc, args.orders, args.symbols, rng)
+            conns["broker"] = svc.conn
+
+        try:
+            with db.connection() as conn:
+                conns["paper"] = conn
+                results = check_plans(conns, repeat=args.repeat)
+        finally:
+            db.close()
+            if svc is not None:
+                svc.conn.close()
+
+    failed = 0
+    for r in results:
+        flag = "OK  " if r["ok"] else "FAIL"
+        print(f"{flag} {r['query']:<32} {r['ms']:9.3f} ms  [{r['index']}]")
+        if not r["ok"]:
+            failed += 1
+            for p in r["plan"]:
+                print(f"       {p}")
+    if failed:
+        print(f"{failed} queries sem o índice esperado.")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
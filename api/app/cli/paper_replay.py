@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.ml.data_manager import DataManager
+from app.services import replay
+
+
+def _parse_list_arg(raw: str) -> List[str]:
+    return [x.strip() for x in raw.split(",") if x.strip()]
+
+
+def _available_symbols(tf: str) -> List[str]:
+    suffix = f"_{tf}_clean.csv"
+    return sorted(f[: -len(suffix)] for f in os.listdir(DataManager().CLEAN_DIR) if f.endswith(suffix))
+
+
+def _synthetic_frames(n_symbols: int, n_bars: int, seed: int) -> Dict[str, pd.DataFrame]:
+    """
+    Random walk horário (GBM) para medir o replay sem depender de dados guardados.
+    """
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range("2024-01-02 14:30", periods=n_bars, freq="h", tz="UTC")
+    out: Dict[str, pd.DataFrame] = {}
+    for i in range(n_symbols):
+        close = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.005, n_bars)))
+        open_ = np.concatenate(([close[0]], close[:-1]))
+        spread = np.abs(rng.normal(0.0, 0.003, n_bars)) * close
+        out[f"SYN{i:03d}"] = pd.DataFrame(
+            {
+                "open": open_,
+                "high": np.maximum(open_, close) + spread,
+                "low": np.minimum(open_, close) - spread,
+                "close": close,
+            },
+            index=idx,
+        )
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Replay histórico do paper trading (relógio simulado, SQLite em memória)."
+    )
+    parser.add_argument(
+        "--symbols",
+        type=str,
+        default="",
+        help="Lista de símbolos (default: todos os CSV limpos do tf).",
+    )
+    parser.add_argument("--tf", type=str, default="1H", help="Timeframe dos CSV limpos (default: 1H).")
+    parser.add_argument("--start", type=str, default=None, help="Data inicial (ex.: 2024-01-01).")
+    parser.add_argument("--end", type=str, default=None, help="Data final.")
+    parser.add_argument(
+        "--strategy",
+        choices=("sma", "none"),
+        default="sma",
+        help="sma: cruzamento de médias long-only; none: só o stream (mede o loop).",
+    )
+    parser.add_argument("--fast", type=int, default=10)
+    parser.add_argument("--slow", type=int, default=30)
+    parser.add_argument("--notional", type=float, default=10_000.0, help="Valor por entrada (default: 10000).")
+    parser.add_argument("--slippage-bps", type=float, default=0.0)
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=0,
+        help="N símbolos sintéticos em vez dos CSV (benchmark).",
+    )
+    parser.add_argument("--bars", type=int, default=252 * 7, help="Barras por símbolo sintético (default: ~1 ano 1h).")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--equity-out", type=str, default=None, help="CSV com a curva de equity.")
+
+    args = parser.parse_args(argv)
+
+    if args.synthetic:
+        frames = _synthetic_frames(args.synthetic, args.bars, args.seed)
+    else:
+        symbols = _parse_list_arg(args.symbols) or _available_symbols(args.tf)
+        if not symbols:
+            print("Sem símbolos: passar --symbols ou gerar CSV limpos.")
+            return 1
+        frames = replay.load_frames(symbols, tf=args.tf, start=args.start, end=args.end)
+
+    strategy = None
+    if args.strategy == "sma":
+        strategy = replay.sma_cross_strategy(frames, fast=args.fast, slow=args.slow, notional=args.notional)
+
+    tf = "1d" if args.tf.lower() in ("1d", "d") else "1h"
+    session = replay.ReplaySession(frames, tf=tf, slippage_bps=args.slippage_bps)
+    try:
+        res = session.run(strategy)
+        if args.equity_out:
+            pd.DataFrame(
+                {"equity": session.equity},
+                index=pd.to_datetime(session.equity_time, unit="s", utc=True),
+            ).to_csv(args.equity_out, index_label="time")
+    finally:
+        session.close()
+
+    print(json.dumps(res, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
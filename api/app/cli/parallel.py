@@ -0,0 +1,183 @@
+from __future__ import annotations
+
+import multiprocessing as mp
+import os
+import time
+import traceback
+from contextlib import contextmanager
+from multiprocessing.connection import wait
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app import runtime
+
+# Cada tarefa corre num processo próprio (spawn): um crash (segfault, OOM,
+# exceção não tratada) ou um timeout só afeta essa tarefa.
+_CTX = mp.get_context("spawn")
+
+
+def _child_main(fn: Callable[..., Dict[str, Any]], kwargs: Dict[str, Any], conn) -> None:
+    # papel/nº de processos herdados do pai via ML_RUNTIME_ROLE / ML_TRAIN_PROCS
+    runtime.configure()
+    try:
+        res = fn(**kwargs)
+        conn.send(("ok", res))
+    except BaseException as exc:  # reportar tudo ao pai (inclui SystemExit)
+        conn.send(("error", f"{type(exc).__name__}: {exc}\n{traceback.format_exc(limit=5)}"))
+    finally:
+        conn.close()
+
+
+def _drain(st: Dict[str, Any]) -> None:
+    conn = st["conn"]
+    if st["msg"] is not None:
+        return
+    try:
+        if conn.poll():
+            st["msg"] = conn.recv()
+    except (EOFError, OSError):
+        st["msg"] = ("crash", None)
+
+
+@contextmanager
+def _scoped_env(env: Dict[str, str]) -> Iterator[None]:
+    saved = {k: os.environ.get(k) for k in env}
+    os.environ.update(env)
+    try:
+        yield
+    finally:
+        for k, v in saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+
+
+def threads_per_job(jobs: int) -> int:
+    return runtime.plan("train", procs=jobs)["torch_threads"]
+
+
+def run_tasks(
+    fn: Callable[..., Dict[str, Any]],
+    tasks: List[Dict[str, Any]],
+    *,
+    jobs: int = 1,
+    timeout: Optional[float] = None,
+    on_done: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Executa fn(**task) para cada tarefa com até `jobs` processos em paralelo.
+
+    Devolve uma linha por tarefa, na ordem original:
+        {"status": "ok"|"error"|"crash"|"timeout", "result": ..., "error": ..., "seconds": ...}
+
+    fn tem de ser importável ao nível do módulo (requisito do spawn).
+    `on_done(task, row)` é chamado no processo pai à medida que as tarefas terminam.
+    """
+    jobs = max(1, int(jobs))
+
+    # Evitar oversubscription: cada filho fica com cores / jobs threads
+    # (env herdado pelos filhos spawn antes de importarem numpy/torch;
+    # o env e o runtime do pai ficam como estavam)
+    with _scoped_env(runtime.child_env("train", jobs)):
+        return _run(fn, tasks, jobs, timeout, on_done)
+
+
+def _run(
+    fn: Callable[..., Dict[str, Any]],
+    tasks: List[Dict[str, Any]],
+    jobs: int,
+    timeout: Optional[float],
+    on_done: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]],
+) -> List[Dict[str, Any]]:
+    rows: List[Optional[Dict[str, Any]]] = [None] * len(tasks)
+    pending = list(range(len(tasks)))
+    pending.reverse()
+    running: Dict[int, Dict[str, Any]] = {}
+
+    def _finish(i: int, row: Dict[str, Any]) -> None:
+        rows[i] = row
+        if on_done is not None:
+            on_done(tasks[i], row)
+
+    while pending or running:
+        # lançar novas tarefas até ao limite de jobs
+        while pending and len(running) < jobs:
+            i = pending.pop()
+            parent_conn, child_conn = _CTX.Pipe(duplex=False)
+            proc = _CTX.Process(target=_child_main, args=(fn, tasks[i], child_conn), daemon=True)
+            proc.start()
+            child_conn.close()
+            running[i] = {"proc": proc, "conn": parent_conn, "start": time.monotonic(), "msg": None}
+
+        waitables = []
+        for st in running.values():
+            waitables.append(st["proc"].sentinel)
+            if st["msg"] is None:
+                waitables.append(st["conn"])
+        wait(waitables, timeout=0.5)
+
+        now = time.monotonic()
+        for i, st in list(running.items()):
+            proc, conn = st["proc"], st["conn"]
+
+            # ler o resultado assim que chega (evita bloquear o filho no pipe)
+            _drain(st)
+
+            elapsed = now - st["start"]
+
+            if not proc.is_alive():
+                proc.join()
+                _drain(st)
+                conn.close()
+                kind, payload = st["msg"] or ("crash", None)
+                row: Dict[str, Any] = {"status": kind, "result": None, "error": None, "seconds": round(elapsed, 2)}
+                if kind == "ok":
+                    row["result"] = payload
+                elif kind == "error":
+                    row["error"] = payload
+                else:
+                    row["status"] = "crash"
+                    row["error"] = f"processo terminou com exitcode={proc.exitcode}"
+                del running[i]
+                _finish(i, row)
+
+            elif timeout and elapsed > timeout:
+                proc.terminate()
+                proc.join(5)
+                if proc.is_alive():
+                    proc.kill()
+                    proc.join()
+                conn.close()
+                del running[i]
+                _finish(i, {
+                    "status": "timeout",
+                    "result": None,
+                    "error": f"timeout após {timeout:.0f}s",
+                    "seconds": round(elapsed, 2),
+                })
+
+    return [r for r in rows if r is not None]
+
+
+def run_serial(
+    fn: Callable[..., Dict[str, Any]],
+    tasks: List[Dict[str, Any]],
+    *,
+    on_done: Optional[Callable[[Dict[str, Any], Dict[str, Any]], None]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Modo --jobs 1: corre no próprio processo (sem isolamento nem timeout).
+    """
+    rows: List[Dict[str, Any]] = []
+    for task in tasks:
+        start = time.monotonic()
+        row: Dict[str, Any]
+        try:
+            row = {"status": "ok", "result": fn(**task), "error": None}
+        except Exception as exc:
+            row = {"status": "error", "result": None, "error": f"{type(exc).__name__}: {exc}"}
+        row["seconds"] = round(time.monotonic() - start, 2)
+        rows.append(row)
+        if on_done is not None:
+            on_done(task, row)
+    return rows
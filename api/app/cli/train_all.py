@@ -1,10 +1,17 @@
 from __future__ import annotations
 
 import argparse
+import os
 import sys
-from typing import List
+from pathlib import Path
+from typing import Any, Dict, List
 
-from app.ml.engine_train import train_model
+import pandas as pd
+
+from app import runtime
+from app.cli.parallel import run_serial, run_tasks
+from app.ml.data_manager import DataManager
+from app.ml_core.config_core import CHECKPOINTS_DIR, META_DIR, MODELS_DIR
 
 
 def _parse_list_arg(raw: str) -> List[str]:
@@ -15,9 +22,66 @@ def _parse_list_arg(raw: str) -> List[str]:
     return [x.strip() for x in raw.split(",") if x.strip()]
 
 
+def _clean_path(symbol: str, tf: str) -> str:
+    return os.path.join(DataManager().CLEAN_DIR, f"{symbol}_{tf}_clean.csv")
+
+
+def _is_up_to_date(symbol: str, tf: str) -> bool:
+    """
+    Par atualizado = modelo + meta existem e são mais recentes que o CSV limpo,
+    sem checkpoint pendente (treino interrompido).
+    """
+    model = os.path.join(MODELS_DIR, f"{symbol}_{tf}_model.pt")
+    meta = os.path.join(META_DIR, f"{symbol}_{tf}_meta.json")
+    clean = _clean_path(symbol, tf)
+
+    if not (os.path.exists(model) and os.path.exists(meta) and os.path.exists(clean)):
+        return False
+    if os.path.exists(os.path.join(CHECKPOINTS_DIR, f"{symbol}_{tf}_ckpt.pt")):
+        return False
+    return os.path.getmtime(model) >= os.path.getmtime(clean)
+
+
+def train_pair(symbol: str, tf: str, resume: bool = True) -> Dict[str, Any]:
+    """
+    Treino completo de um par (corre no processo filho com --jobs > 1).
+    Imports pesados (torch) ficam aqui para não pesar no processo pai.
+    """
+    from app.ml_core.dataset_builder_core import DatasetBuilderCore
+    from app.ml_core.feature_cache_core import FeatureCacheCore
+    from app.ml_core.trainer_core import TrainerCore
+
+    df_fe = FeatureCacheCore(tf).load(symbol)
+    X, y = DatasetBuilderCore().build(df_fe)
+
+    trainer = TrainerCore(symbol)
+    resumed = resume and trainer.resume(last_bar_time=df_fe.index[-1])
+    trainer.load_data(X, y, last_bar_time=df_fe.index[-1])
+    summary = trainer.train()
+
+    return {"mode": "full", "resumed": bool(resumed), "samples": int(len(X)), **summary}
+
+
+def finetune_pair(symbol: str, tf: str, resume: bool = True) -> Dict[str, Any]:
+    """
+    Fine-tune incremental (warm start) de um par; sem modelo faz treino completo.
+    """
+    from app.ml_core.pipeline_core import finetune_symbol
+
+    summary = finetune_symbol(symbol, resume=resume)
+    summary.pop("symbol", None)
+    return summary
+
+
+def train_global_model(symbols: List[str]) -> Dict[str, Any]:
+    from app.ml_core.pipeline_core import train_global
+
+    return train_global(symbols)
+
+
 def main(argv: list[str] | None = None) -> int:
     parser = argparse.ArgumentParser(
-        description="Treino em batch de modelos ML_TRADE para vários símbolos/timeframes."
+        description="Treino em batch de modelos ML_TRADE (PatchTST) para vários símbolos/timeframes."
     )
     parser.add_argument(
         "--symbols",
@@ -28,25 +92,52 @@ def main(argv: list[str] | None = None) -> int:
     parser.add_argument(
         "--tfs",
         type=str,
-        default="1d",
-        help="Lista de timeframes separada por vírgulas, ex.: '1d,1h'. Default: '1d'.",
+        default="1H",
+        help="Lista de timeframes separada por vírgulas. Default: '1H' (único suportado pelo MLCore).",
     )
     parser.add_argument(
-        "--limit",
+        "--jobs",
         type=int,
-        default=1200,
-        help="Número máximo de barras a carregar para treino (default: 1200).",
+        default=1,
+        help="Número de processos em paralelo (default: 1 = sequencial no próprio processo).",
     )
     parser.add_argument(
-        "--eps",
+        "--timeout",
         type=float,
-        default=0.002,
-        help="Zona morta para labels (ex.: 0.002 = 0.2%%). Default: 0.002.",
+        default=0.0,
+        help="Timeout por par em segundos, só com --jobs > 1 (default: 0 = sem limite).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-treinar mesmo os pares cujo modelo já está atualizado.",
+    )
+    parser.add_argument(
+        "--no-resume",
+        action="store_true",
+        help="Ignorar checkpoints de treinos interrompidos (por defeito são retomados).",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Fine-tune a partir do modelo existente só nas janelas recentes (refresh diário).",
+    )
+    parser.add_argument(
+        "--global-model",
+        action="store_true",
+        help="Treinar UM modelo global (embedding por símbolo) com todos os símbolos, em vez de um por par.",
+    )
+    parser.add_argument(
+        "--out-dir",
+        type=str,
+        default="train_out",
+        help="Diretório onde gravar a tabela de resultados (default: 'train_out').",
     )
 
     args = parser.parse_args(argv)
+    runtime.configure("train")
 
-    symbols = _parse_list_arg(args.symbols)
+    symbols = [s.upper() for s in _parse_list_arg(args.symbols)]
     tfs = _parse_list_arg(args.tfs)
 
     if not symbols:
@@ -55,45 +146,88 @@ def main(argv: list[str] | None = None) -> int:
     if not tfs:
         print("ERRO: sem timeframes válidos em --tfs", file=sys.stderr)
         return 1
+    # TrainerCore grava sempre <SYMBOL>_1H_*: outro tf reescreveria o modelo 1H
+    # com features de outro timeframe
+    unsupported = [tf for tf in tfs if tf != "1H"]
+    if unsupported:
+        print(f"ERRO: timeframes não suportados pelo MLCore: {unsupported} (só 1H)", file=sys.stderr)
+        return 1
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
 
     print("=== ML_TRADE :: TRAIN_ALL ===")
     print(f"Symbols   : {symbols}")
     print(f"Timeframes: {tfs}")
-    print(f"Limit     : {args.limit}")
-    print(f"Eps       : {args.eps}")
+    print(f"Mode      : {'incremental' if args.incremental else 'full'}")
+    print(f"Jobs      : {args.jobs}")
+    print(f"Timeout   : {args.timeout or '-'}")
     print("-" * 60)
 
-    n_ok = 0
-    n_err = 0
+    if args.global_model:
+        try:
+            summary = train_global_model(symbols)
+        except Exception as exc:
+            print(f"[TRAIN] GLOBAL ... ERROR  ({type(exc).__name__}: {exc})")
+            return 2
+        print(f"[TRAIN] GLOBAL ... OK  symbols={summary['symbols']} samples={summary['samples']} "
+              f"best_val={summary['best_val']:.6f} epochs={summary['epochs']}")
+        return 0
+
+    table: List[Dict[str, Any]] = []
+    tasks: List[Dict[str, Any]] = []
 
     for symbol in symbols:
         for tf in tfs:
-            pair = f"{symbol}_{tf}"
-            print(f"[TRAIN] {pair} ...", end=" ", flush=True)
-            try:
-                res = train_model(symbol=symbol, tf=tf, limit=args.limit, eps=args.eps)
-                ok = bool(res.get("ok", True))
-                key = res.get("key", f"{symbol.upper()}_{tf}")
-                meta = res.get("meta", {}) or {}
-                model_name = meta.get("metrics", {}).get("model", "?")
-                cv_acc = meta.get("metrics", {}).get("cv_acc_mean", None)
-
-                if ok:
-                    n_ok += 1
-                    extra = ""
-                    if cv_acc is not None:
-                        extra = f" | cv_acc_mean={cv_acc:.4f}"
-                    print(f"OK  key={key} model={model_name}{extra}")
-                else:
-                    n_err += 1
-                    detail = res.get("detail") or "desconhecido"
-                    print(f"FALHOU  ({detail})")
-            except Exception as exc:
-                n_err += 1
-                print(f"FALHOU  ({exc})")
+            if not args.force and _is_up_to_date(symbol, tf):
+                print(f"[TRAIN] {symbol}_{tf} ... SKIP (modelo atualizado)")
+                table.append({"pair": f"{symbol}_{tf}", "symbol": symbol, "tf": tf, "status": "skipped"})
+                continue
+            tasks.append({"symbol": symbol, "tf": tf, "resume": not args.no_resume})
+
+    def _report(task: Dict[str, Any], row: Dict[str, Any]) -> None:
+        pair = f"{task['symbol']}_{task['tf']}"
+        line: Dict[str, Any] = {
+            "pair": pair,
+            "symbol": task["symbol"],
+            "tf": task["tf"],
+            "status": row["status"],
+            "seconds": row["seconds"],
+        }
+        if row["status"] == "ok":
+            line.update(row["result"] or {})
+            if line.get("skipped"):
+                print(f"[TRAIN] {pair} ... OK  sem barras novas ({row['seconds']}s)")
+            else:
+                print(f"[TRAIN] {pair} ... OK  {line.get('mode')} samples={line.get('samples')} "
+                      f"best_val={line.get('best_val', float('nan')):.6f} ({row['seconds']}s)")
+        else:
+            line["error"] = (row["error"] or "").splitlines()[0] if row["error"] else None
+            print(f"[TRAIN] {pair} ... {row['status'].upper()}  ({line['error']})")
+        table.append(line)
+
+    fn = finetune_pair if args.incremental else train_pair
+
+    if args.jobs > 1:
+        run_tasks(fn, tasks, jobs=args.jobs, timeout=args.timeout or None, on_done=_report)
+    else:
+        run_serial(fn, tasks, on_done=_report)
+
+    df = pd.DataFrame(table)
+    if not df.empty:
+        df = df.sort_values("pair").reset_index(drop=True)
+        results_csv = out_dir / "train_results.csv"
+        df.to_csv(results_csv, index=False)
+        print("-" * 60)
+        print(df.to_string(index=False))
+        print(f"Tabela gravada em: {results_csv}")
+
+    n_ok = int((df["status"] == "ok").sum()) if not df.empty else 0
+    n_skip = int((df["status"] == "skipped").sum()) if not df.empty else 0
+    n_err = len(df) - n_ok - n_skip
 
     print("-" * 60)
-    print(f"Concluído. Sucessos: {n_ok}  Falhas: {n_err}")
+    print(f"Concluído. Sucessos: {n_ok}  Saltados: {n_skip}  Falhas: {n_err}")
     return 0 if n_err == 0 else 2
 
 
@@ -3,16 +3,26 @@
 # FastAPI principal + routers estáveis
 # -------------------------------------------------------------
 
-from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+# Threads (torch/BLAS/sklearn) por worker uvicorn: antes de importar
+# numpy/torch para que as variáveis de ambiente tenham efeito
+# (os imports abaixo ficam depois do configure: noqa E402)
+from app import runtime
+
+runtime.configure("api")
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
 
 # Routers funcionais / não-ML
-from app.routers import quotes, signals, dataset, news
-from app.routers import signals_mtf
+from app.routers import quotes, signals, dataset, news  # noqa: E402
+from app.routers import signals_mtf  # noqa: E402
+from app.routers import health  # noqa: E402
+from app.routers import paper  # noqa: E402
 
 # Nova arquitetura ML
-from app.routers import data_router
-from app.routers import ml_core
+from app.routers import data_router  # noqa: E402
+from app.routers import ml_core  # noqa: E402
+from app.routers import jobs  # noqa: E402
 
 
 # -------------------------------------------------------------
@@ -37,15 +47,18 @@ app.add_middleware(
 # -------------------------------------------------------------
 # INCLUDE ROUTERS (APENAS OS ATUAIS E FUNCIONAIS)
 # -------------------------------------------------------------
+app.include_router(health.router)
 app.include_router(quotes.router)
 app.include_router(signals.router)
 app.include_router(signals_mtf.router)
 app.include_router(dataset.router)
 app.include_router(news.router)
+app.include_router(paper.router)         # Paper trading (ordens, posições, risco)
 
 # --- NOVO PIPELINE MODERNO ---
 app.include_router(data_router.router)   # Download & Clean
 app.include_router(ml_core.router)       # Treino / Inferência / Backtest
+app.include_router(jobs.router)          # Jobs assíncronos (Celery)
 
 # -------------------------------------------------------------
 @app.get("/")
@@ -54,12 +67,15 @@ def root():
         "status": "ok",
         "service": "ML Trade API",
         "active_endpoints": [
+            "/healthz",
             "/quotes/*",
             "/signals/*",
             "/signals/mtf",
             "/dataset/*",
             "/news/*",
+            "/paper/*",
             "/data/*",
             "/ml_core/*",
+            "/jobs/*",
         ],
     }
@@ -3,6 +3,7 @@
 # ============================================================
 
 import os
+import numpy as np
 import pandas as pd
 
 
@@ -87,6 +88,22 @@ class DataManager:
 
         return df
 
+    # ------------------------------------------------------------
+    # LOAD CLEAN — lê o CSV limpo já gerado
+    # ------------------------------------------------------------
+    def load_clean(self, symbol: str, tf: str = "1H") -> pd.DataFrame:
+        file_clean = os.path.join(self.CLEAN_DIR, f"{symbol}_{tf}_clean.csv")
+
+        if not os.path.exists(file_clean):
+            raise FileNotFoundError(f"CLEAN dataset missing: {file_clean}")
+
+        # OHLCV em float32: metade da memória, precisão dos dados de origem
+        dtypes = {c: np.float32 for c in ["open", "high", "low", "close", "volume"]}
+        df = pd.read_csv(file_clean, index_col=0, dtype=dtypes)
+        df.index = pd.to_datetime(df.index)
+
+        return df
+
     # ------------------------------------------------------------
     # CLEAN SYMBOL (mantido igual, baseado em ficheiros .csv)
     # ------------------------------------------------------------
@@ -1,64 +1,145 @@
 # ============================================================
-#  BACKTESTER CORE — V4 (com integração BacktestStorage)
+#  BACKTESTER CORE — V5 (vetorizado, com integração BacktestStorage)
+#  - Recebe um array de posições (-1, 0, 1) alinhado com as barras
+#  - Equity, trades, fees e slippage calculados em NumPy
 # ============================================================
 
 import numpy as np
 
-class BacktesterCore:
-    def __init__(self, symbol, storage=None, tf="1H"):
-        self.symbol = symbol
-        self.storage = storage
-        self.tf = tf
 
-    # --------------------------------------------------------
-    # Estratégia simples baseada no sinal histórico
-    # --------------------------------------------------------
-    def run(self, df_clean):
+# ============================================================
+#  Motor vetorizado
+# ============================================================
+
+def simulate(close, positions, fees_bps=0.0, slippage_bps=0.0, initial=1.0):
+    """
+    Backtest vetorizado sobre arrays.
+
+    positions[i] é a posição decidida no fecho da barra i e detida durante
+    a barra i+1 (sem lookahead). Custos (fees + slippage) são cobrados sobre
+    o turnover |pos[i] - pos[i-1]| na barra em que a posição muda.
+
+    Devolve um dicionário de arrays compactos (equity, retornos, trades).
+    """
+    close = np.asarray(close, dtype=np.float64)
+    pos = np.asarray(positions, dtype=np.float64)
 
-        prices = df_clean["close"].values
-        returns = df_clean["close"].pct_change().fillna(0).values
+    if close.ndim != 1 or pos.shape != close.shape:
+        raise ValueError(
+            f"positions deve ter shape {close.shape}, recebido {pos.shape}"
+        )
 
-        equity = 1.0
-        equity_curve = [equity]
-        position = 0  # -1 short, 1 long, 0 flat
-        trades = []
+    n = close.shape[0]
+    pos = np.nan_to_num(pos, nan=0.0)
 
-        for i in range(1, len(prices)):
+    # retorno da barra i (close[i-1] → close[i]) e posição detida durante ela
+    bar_returns = np.zeros(n)
+    bar_returns[1:] = close[1:] / close[:-1] - 1.0
+    held = np.zeros(n)
+    held[1:] = pos[:-1]
 
-            r = returns[i]
+    cost_rate = (float(fees_bps) + float(slippage_bps)) / 1e4
+    delta = np.diff(pos, prepend=0.0)
+    costs = np.abs(delta) * cost_rate
 
-            # regra simples: se retorno > 0 → long; se < 0 → short
-            signal = 1 if r > 0 else -1
+    gross = held * bar_returns
+    strat_returns = gross - costs
+    equity = float(initial) * np.cumprod(1.0 + strat_returns)
+
+    # --------------------------------------------------------
+    # Trades = segmentos de posição constante != 0
+    # --------------------------------------------------------
+    changes = np.flatnonzero(delta != 0)
+    entry_idx = changes[pos[changes] != 0]
+
+    nxt = np.searchsorted(changes, entry_idx, side="right")
+    is_open = nxt >= changes.shape[0]
+    exit_idx = np.where(is_open, n - 1, changes[np.minimum(nxt, changes.shape[0] - 1)])
+
+    log_growth = np.cumsum(np.log1p(np.maximum(gross, -1.0 + 1e-12)))
+    trade_gross = np.exp(log_growth[exit_idx] - log_growth[entry_idx]) - 1.0
+
+    size = np.abs(pos[entry_idx])
+    entry_cost = 1.0 - size * cost_rate
+    exit_cost = np.where(is_open, 1.0, 1.0 - size * cost_rate)
+    trade_pnl = (1.0 + trade_gross) * entry_cost * exit_cost - 1.0
+
+    return {
+        "equity": equity,
+        "returns": strat_returns,
+        "positions": pos,
+        "costs": costs,
+        "trades": {
+            "entry_idx": entry_idx,
+            "exit_idx": exit_idx,
+            "side": np.sign(pos[entry_idx]).astype(np.int8),
+            "entry_price": close[entry_idx],
+            "exit_price": close[exit_idx],
+            "pnl": trade_pnl,
+            "open": is_open,
+        },
+    }
+
+
+def to_native(obj):
+    """
+    Converte arrays / escalares numpy → tipos nativos (para JSON).
+    """
+    if isinstance(obj, dict):
+        return {k: to_native(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [to_native(v) for v in obj]
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
 
-            if signal != position:
-                # fechar posição anterior
-                if position == 1:
-                    trades.append({"type": "close_long", "price": float(prices[i])})
-                if position == -1:
-                    trades.append({"type": "close_short", "price": float(prices[i])})
 
-                # abrir nova posição
-                if signal == 1:
-                    trades.append({"type": "open_long", "price": float(prices[i])})
-                else:
-                    trades.append({"type": "open_short", "price": float(prices[i])})
+# ============================================================
+#  Backtester
+# ============================================================
+
+class BacktesterCore:
+    def __init__(self, symbol, storage=None, tf="1H", fees_bps=0.0, slippage_bps=0.0):
+        self.symbol = symbol
+        self.storage = storage
+        self.tf = tf
+        self.fees_bps = fees_bps
+        self.slippage_bps = slippage_bps
+
+    # --------------------------------------------------------
+    # Regra de referência (sem modelo): segue o sinal do último retorno
+    # --------------------------------------------------------
+    @staticmethod
+    def momentum_positions(close):
+        close = np.asarray(close, dtype=np.float64)
+        returns = np.zeros_like(close)
+        returns[1:] = close[1:] / close[:-1] - 1.0
+        return np.where(returns > 0, 1.0, -1.0)
+
+    # --------------------------------------------------------
+    # Backtest sobre um array de posições (ex.: SignalEngineCore)
+    # --------------------------------------------------------
+    def run(self, df_clean, positions=None):
 
-                position = signal
+        close = df_clean["close"].to_numpy(dtype=np.float64)
 
-            # atualizar equity
-            equity *= (1 + position * r)
-            equity_curve.append(equity)
+        if positions is None:
+            positions = self.momentum_positions(close)
 
-        final_value = float(equity)
-        num_trades = len(trades)
+        sim = simulate(close, positions, self.fees_bps, self.slippage_bps)
 
         payload = {
             "symbol": self.symbol,
             "tf": self.tf,
-            "final_value": final_value,
-            "num_trades": num_trades,
-            "equity_curve": equity_curve,
-            "trades": trades,
+            "final_value": float(sim["equity"][-1]) if len(close) else 1.0,
+            "num_trades": int(sim["trades"]["pnl"].shape[0]),
+            "fees_bps": float(self.fees_bps),
+            "slippage_bps": float(self.slippage_bps),
+            "equity_curve": sim["equity"],
+            "positions": sim["positions"],
+            "trades": sim["trades"],
         }
 
         # salvar se o storage estiver presente
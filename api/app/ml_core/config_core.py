@@ -16,10 +16,14 @@ BASE_STORAGE = os.path.join(BASE_DIR, "storage")
 MODELS_DIR = os.path.join(BASE_STORAGE, "models")
 SCALERS_DIR = os.path.join(BASE_STORAGE, "scalers")
 META_DIR = os.path.join(BASE_STORAGE, "meta")
+CHECKPOINTS_DIR = os.path.join(BASE_STORAGE, "checkpoints")
+FEATURES_DIR = os.path.join(BASE_STORAGE, "features")
 
 os.makedirs(MODELS_DIR, exist_ok=True)
 os.makedirs(SCALERS_DIR, exist_ok=True)
 os.makedirs(META_DIR, exist_ok=True)
+os.makedirs(CHECKPOINTS_DIR, exist_ok=True)
+os.makedirs(FEATURES_DIR, exist_ok=True)
 
 # ----------------------------------------------------------------
 # Hyperparams centrais
@@ -42,14 +46,67 @@ FEATURE_ORDER = [
 
 assert len(FEATURE_ORDER) == NUM_FEATURES
 
+# Cache de features (FeatureCacheCore)
+# - FEATURE_VERSION: subir para invalidar caches quando o cálculo muda
+#   fora do FeatureEngineerCore (o código deste já entra na chave)
+# - FEATURE_WARMUP: barras recalculadas antes das novas ao estender a
+#   cache (EWMs com alpha ≥ 1/14 esquecem o ponto de partida em ~500 barras)
+FEATURE_VERSION = 1
+FEATURE_WARMUP = 500
+
+# Cálculo das features: auto (numba se instalado, senão numpy) | numpy | numba | pandas
+FEATURE_ENGINE = os.getenv("ML_FEATURE_ENGINE", "auto").lower()
+
 EPOCHS = 25
 LEARNING_RATE = 0.001
 BATCH_SIZE = 64
 SHUFFLE = True
 
+# Modo de treino (TrainerCore)
+# - TRAIN_PRECISION: "fp32" | "bf16" (autocast; cai para fp32 sem suporte nativo)
+# - GRAD_ACCUM_STEPS: batch efetivo = BATCH_SIZE × GRAD_ACCUM_STEPS
+# - TORCH_COMPILE: torch.compile do modelo quando disponível
+TRAIN_PRECISION = os.getenv("ML_TRAIN_PRECISION", "fp32").lower()
+GRAD_ACCUM_STEPS = int(os.getenv("ML_GRAD_ACCUM_STEPS", "1"))
+TORCH_COMPILE = os.getenv("ML_TORCH_COMPILE", "0") == "1"
+
+# Checkpoint completo (modelo, optimizer, época, RNG, scaler) a cada N épocas;
+# apagado no fim do treino, fica só se o treino for interrompido
+CHECKPOINT_EVERY = int(os.getenv("ML_CHECKPOINT_EVERY", "1"))
+
 EARLY_STOPPING_PATIENCE = 5
 EARLY_STOPPING_MIN_DELTA = 1e-5
 
+# Fine-tune incremental (warm start do checkpoint existente)
+# - FINETUNE_WINDOW: nº de amostras mais recentes usadas (inclui as novas)
+# - LR mais baixo e paciência curta: poucas épocas por refresh diário
+FINETUNE_WINDOW = int(os.getenv("ML_FINETUNE_WINDOW", "2000"))
+FINETUNE_EPOCHS = int(os.getenv("ML_FINETUNE_EPOCHS", "5"))
+FINETUNE_LR = 1e-4
+FINETUNE_PATIENCE = 2
+
+# Holdout de validação cronológico; o gap descarta SEQ_LEN amostras entre
+# treino e validação para que nenhuma barra seja partilhada entre janelas
+VAL_FRACTION = 0.10
+PURGE_GAP = SEQ_LEN
+
+# Modelo global (multi-símbolo): artefactos {GLOBAL_MODEL_NAME}_1H_*
+GLOBAL_MODEL_NAME = "GLOBAL"
+
+# Walk-forward (WalkForwardCore)
+WF_N_SPLITS = 5
+WF_EMBARGO = 0
+
 OUTPUT_TYPE = "regression"
 
+# ----------------------------------------------------------------
+# Inferência: backend (auto | eager | torchscript | onnx | int8)
+# auto → onnx se existir artefacto + onnxruntime, senão torchscript, senão eager
+# int8 → quantização dinâmica dos Linear (opt-in, nunca escolhido por auto)
+# ----------------------------------------------------------------
+INFERENCE_BACKEND = os.getenv("ML_INFERENCE_BACKEND", "auto").lower()
+
+# Diferença máxima aceite entre o artefacto exportado e o modelo eager
+EXPORT_TOLERANCE = 1e-4
+
 BASE_THRESHOLD = 0.002
@@ -1,6 +1,9 @@
 # ============================================================
 #  DATASET BUILDER CORE — V4
 #  (Sem scaler! Apenas constrói X, y)
+#  - float32 de ponta a ponta
+#  - X são vistas (sliding window) sobre a matriz de features:
+#    N × F em memória em vez de N × SEQ_LEN × F
 # ============================================================
 
 import numpy as np
@@ -8,6 +11,30 @@ import pandas as pd
 from app.ml_core.config_core import FEATURE_ORDER, SEQ_LEN
 
 
+# ------------------------------------------------------------
+# Janelas [k, k + SEQ_LEN) sobre as linhas, sem cópia
+# (rows_count - SEQ_LEN + 1, SEQ_LEN, F)
+# ------------------------------------------------------------
+def windows(rows, writeable=False):
+    view = np.lib.stride_tricks.sliding_window_view(rows, SEQ_LEN, axis=0, writeable=writeable)
+    return view.transpose(0, 2, 1)
+
+
+# ------------------------------------------------------------
+# Inverso de windows(): linhas únicas de janelas consecutivas
+# (None se as janelas não forem consecutivas com passo 1)
+# ------------------------------------------------------------
+def window_rows(X, block=4096):
+    if len(X) == 0:
+        return None
+    # todos os pares adjacentes, por blocos (memória limitada a block janelas)
+    for a in range(0, len(X) - 1, block):
+        b = min(a + block, len(X) - 1)
+        if not np.array_equal(X[a + 1:b + 1, :-1], X[a:b, 1:]):
+            return None
+    return np.concatenate([X[0], X[1:, -1]])
+
+
 class DatasetBuilderCore:
 
     def __init__(self):
@@ -19,22 +46,33 @@ class DatasetBuilderCore:
         return df.dropna()
 
     # ------------------------------------------------------------
-    def build(self, df_fe):
-        df = df_fe.copy()
+    # Matriz de features + target alinhados (sem janelas)
+    # A amostra i usa as linhas [i - SEQ_LEN, i) e o target targets[i]
+    # ------------------------------------------------------------
+    def build_matrix(self, df_fe):
+        matrix = df_fe[FEATURE_ORDER].to_numpy(dtype=np.float32)
 
-        df = self._build_target(df)
+        # retorno seguinte em float64 (diferença de preços próximos)
+        close = df_fe["close"].to_numpy(dtype=np.float64)
+        targets = np.full(len(close), np.nan)
+        targets[:-1] = close[1:] / close[:-1] - 1
 
-        feature_matrix = df[FEATURE_ORDER].values
-        targets = df["future_return"].values
+        # mesma regra do dropna(): fora linhas com NaN (sempre a última)
+        keep = ~(np.isnan(targets) | np.isnan(matrix).any(axis=1))
+        if keep[:-1].all():
+            return matrix[:-1], targets[:-1].astype(np.float32)
+        return matrix[keep], targets[keep].astype(np.float32)
 
-        X = []
-        y = []
+    # ------------------------------------------------------------
+    def build(self, df_fe):
+        feature_matrix, targets = self.build_matrix(df_fe)
 
-        for i in range(SEQ_LEN, len(feature_matrix)):
-            X.append(feature_matrix[i - SEQ_LEN:i])
-            y.append(targets[i])
+        if len(feature_matrix) <= SEQ_LEN:
+            empty = np.empty((0, SEQ_LEN, len(FEATURE_ORDER)), dtype=np.float32)
+            return empty, np.empty(0, dtype=np.float32)
 
-        X = np.array(X, dtype=np.float32)
-        y = np.array(y, dtype=np.float32)
+        # X[k] = linhas [k, k + SEQ_LEN), y[k] = targets[k + SEQ_LEN]
+        X = windows(feature_matrix)[:-1]
+        y = targets[SEQ_LEN:]
 
         return X, y
@@ -0,0 +1,205 @@
+# ============================================================
+#  ML_Trade V4 — EXPORT CORE
+#  - Exporta o PatchTST treinado para TorchScript (sempre) e
+#    ONNX (se onnx/onnxruntime estiverem instalados)
+#  - Cada artefacto é validado contra o modelo eager
+#  - Quantização dinâmica int8 (opt-in) com relatório de precisão
+#  - Runners com a mesma interface para o InferenceCore
+# ============================================================
+
+import io
+import os
+import warnings
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from .config_core import EXPORT_TOLERANCE, NUM_FEATURES, SEQ_LEN
+
+try:
+    import onnxruntime as ort
+except ImportError:  # opcional
+    ort = None
+
+BACKENDS = ("eager", "torchscript", "onnx", "int8")
+
+
+# ------------------------------------------------------------
+# Batch de referência (determinístico) para validar exports
+# ------------------------------------------------------------
+def reference_batch(batch=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((batch, SEQ_LEN, NUM_FEATURES)).astype(np.float32)
+
+
+def artifact_paths(model_path):
+    base, _ = os.path.splitext(model_path)
+    return {"torchscript": base + ".ts", "onnx": base + ".onnx"}
+
+
+# ============================================================
+#  Runners: np.float32 (B, SEQ_LEN, F) → np.float32 (B,)
+# ============================================================
+
+class EagerRunner:
+    name = "eager"
+
+    def __init__(self, model, device):
+        self.model = model.eval()
+        self.device = device
+
+    def __call__(self, x):
+        with torch.no_grad():
+            return self.model(torch.from_numpy(x).to(self.device)).cpu().numpy()[:, 0]
+
+
+class TorchScriptRunner:
+    name = "torchscript"
+
+    def __init__(self, path, device):
+        module = torch.jit.load(path, map_location=device).eval()
+        # freeze: inline de pesos + fusões para inferência
+        self.module = torch.jit.optimize_for_inference(torch.jit.freeze(module))
+        self.device = device
+
+    def __call__(self, x):
+        with torch.inference_mode():
+            return self.module(torch.from_numpy(x).to(self.device)).cpu().numpy()[:, 0]
+
+
+class OnnxRunner:
+    name = "onnx"
+
+    def __init__(self, path, device=None):
+        if ort is None:
+            raise RuntimeError("onnxruntime não instalado")
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(path, opts, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, x):
+        return self.session.run(None, {self.input_name: np.ascontiguousarray(x)})[0][:, 0]
+
+
+RUNNERS = {"torchscript": TorchScriptRunner, "onnx": OnnxRunner}
+
+
+# ============================================================
+#  Quantização dinâmica int8 (Linear: patch proj, feed-forward, head)
+# ============================================================
+
+def quantize_dynamic(model):
+    """
+    Pesos Linear → int8, ativações quantizadas em runtime.
+    Determinística a partir dos pesos fp32 (não é preciso guardar o artefacto).
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return torch.ao.quantization.quantize_dynamic(
+            model.cpu().eval(), {nn.Linear}, dtype=torch.qint8
+        )
+
+
+class QuantizedRunner(EagerRunner):
+    name = "int8"
+
+    def __init__(self, model, device=None):
+        # kernels quantizados só existem em CPU
+        super().__init__(quantize_dynamic(model), torch.device("cpu"))
+
+
+def state_dict_bytes(model):
+    buf = io.BytesIO()
+    torch.save(model.state_dict(), buf)
+    return buf.tell()
+
+
+def quantization_report(model, X_val, y_val, batch_size=1024):
+    """
+    Delta de precisão int8 vs fp32 nas janelas de validação (já escaladas).
+    """
+    fp32 = EagerRunner(model, torch.device("cpu"))
+    int8 = QuantizedRunner(model)
+
+    X_val = np.asarray(X_val, dtype=np.float32)
+    y_val = np.asarray(y_val, dtype=np.float32).reshape(-1)
+
+    p32 = np.concatenate([fp32(X_val[i:i + batch_size]) for i in range(0, len(X_val), batch_size)])
+    p8 = np.concatenate([int8(X_val[i:i + batch_size]) for i in range(0, len(X_val), batch_size)])
+    delta = np.abs(p8 - p32)
+
+    return {
+        "samples": int(len(y_val)),
+        "val_mse_fp32": float(np.mean((p32 - y_val) ** 2)),
+        "val_mse_int8": float(np.mean((p8 - y_val) ** 2)),
+        "mean_abs_delta": float(delta.mean()),
+        "max_abs_delta": float(delta.max()),
+        "sign_agreement": float(np.mean(np.sign(p8) == np.sign(p32))),
+        "size_fp32_bytes": state_dict_bytes(model),
+        "size_int8_bytes": state_dict_bytes(int8.model),
+    }
+
+
+# ------------------------------------------------------------
+# Correção: diferença máxima vs eager no batch de referência
+# ------------------------------------------------------------
+def max_abs_error(runner, eager):
+    x = reference_batch()
+    return float(np.max(np.abs(runner(x) - eager(x))))
+
+
+# ============================================================
+#  Export
+# ============================================================
+
+def export_model(model, model_path, device):
+    """
+    Gera os artefactos ao lado do .pt e devolve o relatório para o meta:
+        {"torchscript": {"path", "max_abs_err"}, "onnx": {...} | {"error"}}
+    Artefactos que falham a verificação são apagados.
+    """
+    model = model.eval()
+    eager = EagerRunner(model, device)
+    example = torch.from_numpy(reference_batch(batch=2)).to(device)
+    paths = artifact_paths(model_path)
+    report = {}
+
+    # ---- TorchScript (trace: grafo estático, batch dinâmico)
+    try:
+        with torch.no_grad():
+            traced = torch.jit.trace(model, example, check_trace=False)
+        traced.save(paths["torchscript"])
+        report["torchscript"] = _check(paths["torchscript"], "torchscript", eager, device)
+    except Exception as e:
+        report["torchscript"] = {"error": f"{type(e).__name__}: {e}"}
+
+    # ---- ONNX (opcional)
+    if ort is None:
+        report["onnx"] = {"error": "onnxruntime não instalado"}
+    else:
+        try:
+            torch.onnx.export(
+                model,
+                (example,),
+                paths["onnx"],
+                input_names=["x"],
+                output_names=["y"],
+                dynamic_axes={"x": {0: "batch"}, "y": {0: "batch"}},
+                opset_version=17,
+                dynamo=False,
+            )
+            report["onnx"] = _check(paths["onnx"], "onnx", eager, device)
+        except Exception as e:
+            report["onnx"] = {"error": f"{type(e).__name__}: {e}"}
+
+    return report
+
+
+def _check(path, backend, eager, device):
+    err = max_abs_error(RUNNERS[backend](path, device), eager)
+    if err > EXPORT_TOLERANCE:
+        os.remove(path)
+        return {"error": f"max_abs_err={err:.2e} acima da tolerância"}
+    return {"path": os.path.basename(path), "max_abs_err": err}
@@ -0,0 +1,228 @@
+# ============================================================
+#  ML_Trade V4 — FEATURE CACHE CORE
+#  - Matriz FEATURE_ORDER (float32, colunar) por símbolo/timeframe
+#  - Chave: hash do código/config das features + hash dos dados limpos
+#    até à última barra em cache
+#  - CSV limpo inalterado (mtime/tamanho) → lê só a cache
+#  - Barras novas → recalcula apenas a cauda (warm-up + novas)
+# ============================================================
+
+import hashlib
+import inspect
+import json
+import os
+from typing import Any, Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.ml.data_manager import DataManager
+
+from .config_core import FEATURES_DIR, FEATURE_ORDER, FEATURE_VERSION, FEATURE_WARMUP
+from . import feature_kernels_core
+from .feature_engineer_core import FeatureEngineerCore
+from .io_core import atomic_write
+
+OHLCV = ["open", "high", "low", "close", "volume"]
+
+# cópia em memória por processo: {(symbol, tf): (meta, frame)}
+_MEMORY: Dict[Tuple[str, str], Tuple[Dict[str, Any], pd.DataFrame]] = {}
+
+
+# ------------------------------------------------------------
+# Hashes
+# ------------------------------------------------------------
+def feature_config_hash():
+    payload = json.dumps({"order": FEATURE_ORDER, "version": FEATURE_VERSION})
+    payload += inspect.getsource(FeatureEngineerCore)
+    payload += inspect.getsource(feature_kernels_core)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def data_hash(df_clean):
+    h = hashlib.sha1(np.ascontiguousarray(df_clean.index.as_unit("ns").asi8).tobytes())
+    h.update(np.ascontiguousarray(df_clean[OHLCV].to_numpy(np.float64)).tobytes())
+    return h.hexdigest()
+
+
+# ============================================================
+#  FEATURE CACHE CORE
+# ============================================================
+
+class FeatureCacheCore:
+
+    def __init__(self, tf="1H", cache_dir=FEATURES_DIR, warmup=FEATURE_WARMUP):
+        self.tf = tf
+        self.cache_dir = cache_dir
+        self.warmup = warmup
+        self.engineer = FeatureEngineerCore()
+
+        # último resultado: "memory" | "hit" | "extend" | "rebuild"
+        self.status = None
+
+    # ------------------------------------------------------------
+    # Caminhos
+    # ------------------------------------------------------------
+    def _path(self, symbol, kind):
+        ext = "json" if kind == "meta" else "npy"
+        return os.path.join(self.cache_dir, f"{symbol}_{self.tf}_{kind}.{ext}")
+
+    def _clean_path(self, symbol):
+        return os.path.join(DataManager().CLEAN_DIR, f"{symbol}_{self.tf}_clean.csv")
+
+    # ------------------------------------------------------------
+    # Ler / gravar
+    # ------------------------------------------------------------
+    def _read_meta(self, symbol):
+        path = self._path(symbol, "meta")
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            meta = json.load(f)
+        return meta if meta.get("config_hash") == feature_config_hash() else None
+
+    def _read_frame(self, symbol, meta):
+        matrix = np.load(self._path(symbol, "matrix"))
+        index = np.load(self._path(symbol, "index"))
+        if len(matrix) != meta["rows"] or len(index) != meta["rows"]:
+            return None
+
+        idx = pd.DatetimeIndex(index.view("datetime64[ns]"), name=meta.get("index_name"))
+        if meta.get("tz"):
+            idx = idx.tz_localize("UTC").tz_convert(meta["tz"])
+        return pd.DataFrame(matrix, index=idx, columns=FEATURE_ORDER)
+
+    def _write(self, symbol, frame, meta, arrays=True):
+        if arrays:
+            # F-order: cada feature contígua (colunar), tal como os blocos do pandas
+            matrix = np.asfortranarray(frame[FEATURE_ORDER].to_numpy(np.float32))
+            index = np.ascontiguousarray(frame.index.as_unit("ns").asi8)
+
+            atomic_write(self._path(symbol, "matrix"), lambda f: np.save(f, matrix))
+            atomic_write(self._path(symbol, "index"), lambda f: np.save(f, index))
+        # meta por último: só aponta para matrizes já gravadas
+        atomic_write(self._path(symbol, "meta"), lambda f: json.dump(meta, f, indent=4), mode="w")
+
+    # ------------------------------------------------------------
+    # Features de um símbolo a partir do CSV limpo
+    # ------------------------------------------------------------
+    def load(self, symbol):
+        symbol = symbol.upper()
+        path = self._clean_path(symbol)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"CLEAN dataset missing: {path}")
+
+        st = os.stat(path)
+        stamp = {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+        # CSV inalterado: nem leitura do CSV nem feature engineering
+        cached = _MEMORY.get((symbol, self.tf))
+        if cached is not None and cached[0]["source"].get("stamp") == stamp:
+            self.status = "memory"
+            return cached[1].copy()
+
+        meta = self._read_meta(symbol)
+        if meta is not None and meta["source"].get("stamp") == stamp:
+            frame = self._read_frame(symbol, meta)
+            if frame is not None:
+                self.status = "hit"
+                # cópia privada: o chamador pode alterar o frame devolvido
+                _MEMORY[(symbol, self.tf)] = (meta, frame.copy())
+                return frame
+
+        df_clean = DataManager().load_clean(symbol, self.tf)
+        return self.transform(symbol, df_clean, stamp=stamp)
+
+    def transform(self, symbol, df_clean, stamp=None):
+        """
+        Equivalente a FeatureEngineerCore().transform(df_clean)[FEATURE_ORDER]
+        em float32, reutilizando a cache quando o histórico não mudou.
+        """
+        symbol = symbol.upper()
+        meta = self._read_meta(symbol)
+        frame = None
+
+        if meta is not None:
+            n_cached = meta["source"]["rows"]
+            same_prefix = (
+                len(df_clean) >= n_cached
+                and data_hash(df_clean.iloc[:n_cached]) == meta["source"]["hash"]
+            )
+            cached = self._read_frame(symbol, meta) if same_prefix else None
+
+            if cached is not None and len(df_clean) == n_cached:
+                self.status = "hit"
+                frame, obv_last = cached, meta["obv_last"]
+            elif cached is not None:
+                extended = self._extend(cached, df_clean, meta)
+                if extended is not None:
+                    self.status = "extend"
+                    frame, obv_last = extended
+
+        if frame is None:
+            self.status = "rebuild"
+            full = self.engineer.transform(df_clean, dtype=np.float64)
+            frame = full[FEATURE_ORDER].astype(np.float32)
+            obv_last = float(full["obv"].iloc[-1])
+
+        meta = {
+            "symbol": symbol,
+            "timeframe": self.tf,
+            "config_hash": feature_config_hash(),
+            "rows": int(len(frame)),
+            "last_bar_time": str(frame.index[-1]),
+            "obv_last": obv_last,
+            "tz": str(frame.index.tz) if frame.index.tz is not None else None,
+            "index_name": frame.index.name,
+            "source": {"rows": int(len(df_clean)), "hash": data_hash(df_clean), "stamp": stamp},
+        }
+        if self.status != "hit":
+            self._write(symbol, frame, meta)
+        elif stamp is not None:
+            # mesmos dados, CSV regravado: só atualizar mtime/tamanho
+            self._write(symbol, frame, meta, arrays=False)
+        _MEMORY[(symbol, self.tf)] = (meta, frame.copy())
+        return frame
+
+    # ------------------------------------------------------------
+    # Extensão incremental: FE só nas últimas warmup + novas barras
+    # ------------------------------------------------------------
+    def _extend(self, cached, df_clean, meta):
+        start = meta["source"]["rows"] - self.warmup
+        if start <= 0:
+            return None
+
+        tail = self.engineer.transform(df_clean.iloc[start:], dtype=np.float64)
+        last = pd.Timestamp(meta["last_bar_time"])
+        if last not in tail.index:
+            return None
+
+        # OBV é cumulativo: a cauda começa em 0, alinha-se pelo valor em cache
+        obv = tail["obv"] + (meta["obv_last"] - tail.at[last, "obv"])
+        tail = tail.assign(obv=obv)
+
+        new = tail.loc[tail.index > last, FEATURE_ORDER].astype(np.float32)
+        frame = pd.concat([cached, new])
+        obv_last = float(obv.iloc[-1])
+        return frame, obv_last
+
+    # ------------------------------------------------------------
+    # Diferença máxima (relativa) entre a cache e um recálculo completo
+    # ------------------------------------------------------------
+    def verify(self, symbol):
+        symbol = symbol.upper()
+        cached = self.load(symbol)
+        full = self.engineer.transform(DataManager().load_clean(symbol, self.tf), dtype=np.float64)[FEATURE_ORDER]
+
+        if not cached.index.equals(full.index):
+            return {"symbol": symbol, "index_equal": False}
+
+        a = cached.to_numpy(np.float64)
+        b = full.to_numpy(np.float64)
+        rel = np.abs(a - b) / np.maximum(np.abs(b), 1e-9)
+        return {
+            "symbol": symbol,
+            "index_equal": True,
+            "rows": int(len(full)),
+            "max_rel_err": dict(zip(FEATURE_ORDER, rel.max(axis=0).round(10).tolist())),
+        }
@@ -5,11 +5,21 @@
 import pandas as pd
 import numpy as np
 
+from .config_core import FEATURE_ENGINE
+from .feature_kernels_core import BACKEND as KERNEL_BACKEND, KERNEL_COLUMNS, compute_matrix
+
+ENGINES = ("auto", "pandas", "numpy", "numba")
+
 
 class FeatureEngineerCore:
 
-    def __init__(self):
-        pass
+    def __init__(self, engine=None):
+        # "pandas" = cálculo de referência abaixo; "numpy"/"numba" = kernels
+        # fundidos (feature_kernels_core); "auto" = melhor kernel disponível
+        engine = (engine or FEATURE_ENGINE).lower()
+        if engine not in ENGINES:
+            raise ValueError(f"Engine de features inválido: {engine}. Aceites: {list(ENGINES)}")
+        self.engine = KERNEL_BACKEND if engine == "auto" else engine
 
     # -----------------------------
     # RSI
@@ -82,7 +92,7 @@ class FeatureEngineerCore:
     # -----------------------------
     # MAIN TRANSFORM
     # -----------------------------
-    def transform(self, df_clean):
+    def transform(self, df_clean, dtype=np.float32):
         df = df_clean.copy()
 
         required_cols = ["open", "high", "low", "close", "volume"]
@@ -90,6 +100,48 @@ class FeatureEngineerCore:
             if c not in df.columns:
                 raise ValueError(f"Missing column: {c}")
 
+        if self.engine != "pandas":
+            return self._kernel_transform(df, dtype)
+
+        # barras chegam em float32; cálculo em float64 (EWM/cumsum estáveis)
+        df[required_cols] = df[required_cols].astype(np.float64)
+        df = self._pandas_features(df)
+
+        df = df.replace([np.inf, -np.inf], np.nan).dropna()
+
+        # saída em float32 (dtype=np.float64 mantém a precisão de cálculo)
+        num_cols = df.select_dtypes(include="number").columns
+        df[num_cols] = df[num_cols].astype(dtype)
+
+        return df
+
+    # -----------------------------
+    # Kernels: matriz única, máscara de NaN/inf em NumPy e um só
+    # DataFrame no fim (mesmas colunas e linhas que o caminho pandas)
+    # -----------------------------
+    def _kernel_transform(self, df, dtype):
+        matrix = compute_matrix(*(df[c].to_numpy() for c in KERNEL_COLUMNS[:5]), backend=self.engine)
+
+        extra = [c for c in df.columns if c not in KERNEL_COLUMNS]
+        keep = np.isfinite(matrix).all(axis=1) & df[extra].notna().all(axis=1).to_numpy()
+
+        features = pd.DataFrame(
+            matrix[keep].astype(dtype, copy=False),
+            index=df.index[keep],
+            columns=list(KERNEL_COLUMNS),
+        )
+        out = pd.concat([features, df.loc[keep, extra]], axis=1)
+        out = out[[c for c in df.columns if c in KERNEL_COLUMNS or c in extra] + list(KERNEL_COLUMNS[5:])]
+
+        num_extra = out[extra].select_dtypes(include="number").columns
+        if len(num_extra):
+            out[num_extra] = out[num_extra].astype(dtype)
+        return out
+
+    # -----------------------------
+    # Referência pandas (um indicador de cada vez)
+    # -----------------------------
+    def _pandas_features(self, df):
         df["rsi"] = self.compute_rsi(df["close"])
         df["macd"], df["macd_signal"], df["macd_hist"] = self.compute_macd(df["close"])
         df["sma_fast"] = df["close"].rolling(20).mean()
@@ -104,7 +156,34 @@ class FeatureEngineerCore:
         df["obv"] = self.compute_obv(df)
         df["returns"] = df["close"].pct_change().replace([np.inf, -np.inf], 0)
         df["volatility"] = df["returns"].rolling(30).std().replace([np.inf, -np.inf], 0)
+        return df
 
-        df = df.replace([np.inf, -np.inf], np.nan).dropna()
 
-        return df
+# ------------------------------------------------------------
+# Validação dos kernels contra a referência pandas
+# ------------------------------------------------------------
+def compare_engines(df_clean, engines=None):
+    """
+    Erro máximo (absoluto e relativo) por coluna de cada engine face ao
+    pandas, em float64. engines: default = kernels disponíveis.
+    """
+    engines = engines or (["numpy", "numba"] if KERNEL_BACKEND == "numba" else ["numpy"])
+    ref = FeatureEngineerCore("pandas").transform(df_clean, dtype=np.float64)[list(KERNEL_COLUMNS)]
+
+    report = {}
+    for engine in engines:
+        out = FeatureEngineerCore(engine).transform(df_clean, dtype=np.float64)[list(KERNEL_COLUMNS)]
+        if not out.index.equals(ref.index):
+            report[engine] = {"index_equal": False, "rows": len(out), "rows_pandas": len(ref)}
+            continue
+
+        a, b = out.to_numpy(), ref.to_numpy()
+        abs_err = np.abs(a - b)
+        rel_err = abs_err / np.maximum(np.abs(b), 1e-12)
+        report[engine] = {
+            "index_equal": True,
+            "rows": len(out),
+            "max_abs_err": dict(zip(KERNEL_COLUMNS, abs_err.max(axis=0).tolist())),
+            "max_rel_err": dict(zip(KERNEL_COLUMNS, rel_err.max(axis=0).tolist())),
+        }
+    return report
@@ -0,0 +1,359 @@
+# ============================================================
+#  ML_Trade V4 — FEATURE KERNELS CORE
+#  - Os 22 indicadores do FeatureEngineerCore sobre arrays contíguos
+#  - Numba (opcional): um único loop fundido com o estado partilhado
+#    (EWMs, janelas min/max de 14, médias móveis)
+#  - Sem Numba: NumPy vetorizado (janelas sem cópia) + scipy lfilter
+#    para as EWMs
+#  - Mesma semântica do cálculo pandas (NaN no aquecimento de cada
+#    indicador); validação em feature_engineer_core.compare_engines
+# ============================================================
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # opcional
+    njit = None  # type: ignore[assignment]
+
+try:
+    from scipy.signal import lfilter
+except ImportError:  # opcional (o scikit-learn já o instala)
+    lfilter = None
+
+# ordem das colunas devolvidas pelos kernels
+KERNEL_COLUMNS = (
+    "open", "high", "low", "close", "volume",
+    "rsi", "macd", "macd_signal", "macd_hist",
+    "sma_fast", "sma_slow", "ema_fast", "ema_slow",
+    "stoch_k", "stoch_d", "williams_r", "roc", "cci",
+    "atr", "obv", "returns", "volatility",
+)
+
+# períodos (iguais aos defaults do FeatureEngineerCore)
+RSI_PERIOD = 14
+MACD_FAST, MACD_SLOW, MACD_SIGNAL = 12, 26, 9
+SMA_FAST, SMA_SLOW = 20, 50
+EMA_FAST, EMA_SLOW = 12, 26
+STOCH_PERIOD, STOCH_SMOOTH_K, STOCH_SMOOTH_D = 14, 3, 3
+ROC_PERIOD = 12
+CCI_PERIOD = 20
+ATR_PERIOD = 14
+VOL_PERIOD = 30
+
+ZERO_DENOM = 1e-9
+
+
+# ============================================================
+#  NUMPY
+# ============================================================
+
+def _ewm(x, alpha, adjust):
+    """
+    pandas .ewm(alpha, adjust).mean() para séries sem NaN após o início.
+    """
+    out = np.full(len(x), np.nan)
+    valid = np.flatnonzero(~np.isnan(x))
+    if len(valid) == 0:
+        return out
+    first = valid[0]
+    xs = x[first:]
+    w = 1.0 - alpha
+
+    if lfilter is not None:
+        if adjust:
+            num = lfilter([1.0], [1.0, -w], xs)
+            den = lfilter([1.0], [1.0, -w], np.ones_like(xs))
+            out[first:] = num / den
+        else:
+            out[first:] = lfilter([alpha], [1.0, -w], xs, zi=[w * xs[0]])[0]
+        return out
+
+    num = den = 0.0
+    y = xs[0]
+    for i, v in enumerate(xs):
+        if adjust:
+            num = v + w * num
+            den = 1.0 + w * den
+            out[first + i] = num / den
+        else:
+            y = v if i == 0 else w * y + alpha * v
+            out[first + i] = y
+    return out
+
+
+def _windows(x, n):
+    # (len(x) - n + 1, n), vista sem cópia
+    return np.lib.stride_tricks.sliding_window_view(x, n)
+
+
+def _pad(values, n_total):
+    out = np.full(n_total, np.nan)
+    out[n_total - len(values):] = values
+    return out
+
+
+def _rolling_mean(x, n):
+    if len(x) < n:
+        return np.full(len(x), np.nan)
+    return _pad(_windows(x, n).mean(axis=1), len(x))
+
+
+def _nonzero(x):
+    return np.where(x == 0, ZERO_DENOM, x)
+
+
+def _numpy_features(o, h, low, c, v):
+    n = len(c)
+    cols = {"open": o, "high": h, "low": low, "close": c, "volume": v}
+
+    prev = np.concatenate([[np.nan], c[:-1]])
+    delta = c - prev
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # RSI (Wilder)
+        up = np.where(delta > 0, delta, 0.0)
+        down = np.where(delta < 0, -delta, 0.0)
+        up[0] = down[0] = np.nan
+        roll_up = _ewm(up, 1.0 / RSI_PERIOD, adjust=False)
+        roll_down = _ewm(down, 1.0 / RSI_PERIOD, adjust=False)
+        cols["rsi"] = 100 - 100 / (1 + roll_up / _nonzero(roll_down))
+
+        # MACD
+        macd = (_ewm(c, 2.0 / (MACD_FAST + 1), adjust=False)
+                - _ewm(c, 2.0 / (MACD_SLOW + 1), adjust=False))
+        signal = _ewm(macd, 2.0 / (MACD_SIGNAL + 1), adjust=False)
+        cols["macd"], cols["macd_signal"], cols["macd_hist"] = macd, signal, macd - signal
+
+        # médias
+        cols["sma_fast"] = _rolling_mean(c, SMA_FAST)
+        cols["sma_slow"] = _rolling_mean(c, SMA_SLOW)
+        cols["ema_fast"] = _ewm(c, 2.0 / (EMA_FAST + 1), adjust=True)
+        cols["ema_slow"] = _ewm(c, 2.0 / (EMA_SLOW + 1), adjust=True)
+
+        # janelas min/max de 14 partilhadas (estocástico + Williams %R)
+        low_min = np.full(n, np.nan)
+        high_max = np.full(n, np.nan)
+        if n >= STOCH_PERIOD:
+            low_min[STOCH_PERIOD - 1:] = _windows(low, STOCH_PERIOD).min(axis=1)
+            high_max[STOCH_PERIOD - 1:] = _windows(h, STOCH_PERIOD).max(axis=1)
+        rng = _nonzero(high_max - low_min)
+
+        stoch_k = _rolling_mean(100 * (c - low_min) / rng, STOCH_SMOOTH_K)
+        cols["stoch_k"] = stoch_k
+        cols["stoch_d"] = _rolling_mean(stoch_k, STOCH_SMOOTH_D)
+        cols["williams_r"] = -100 * (high_max - c) / rng
+
+        # ROC
+        roc = np.full(n, np.nan)
+        roc[ROC_PERIOD:] = c[ROC_PERIOD:] / c[:-ROC_PERIOD] - 1
+        cols["roc"] = roc
+
+        # CCI (média de |tp - ma|, como no cálculo pandas)
+        tp = (h + low + c) / 3
+        ma = _rolling_mean(tp, CCI_PERIOD)
+        md = _nonzero(_rolling_mean(np.abs(tp - ma), CCI_PERIOD))
+        cols["cci"] = (tp - ma) / (0.015 * md)
+
+        # ATR (true range; 1ª barra = high - low)
+        tr = np.fmax(h - low, np.fmax(np.abs(h - prev), np.abs(low - prev)))
+        cols["atr"] = _ewm(tr, 1.0 / ATR_PERIOD, adjust=False)
+
+        # OBV
+        step = np.sign(delta) * v
+        step[0] = 0.0
+        cols["obv"] = np.cumsum(step)
+
+        # retornos + volatilidade
+        returns = c / prev - 1
+        returns[np.isinf(returns)] = 0.0
+        cols["returns"] = returns
+
+        vol = np.full(n, np.nan)
+        if n >= VOL_PERIOD:
+            vol[VOL_PERIOD - 1:] = _windows(returns, VOL_PERIOD).std(axis=1, ddof=1)
+        cols["volatility"] = vol
+
+    return cols
+
+
+# ============================================================
+#  NUMBA — loop fundido
+# ============================================================
+
+def _fused_loop(o, h, low, c, v, out):
+    n = c.shape[0]
+    nan = np.nan
+
+    a_rsi = 1.0 / RSI_PERIOD
+    a_atr = 1.0 / ATR_PERIOD
+    a_mf = 2.0 / (MACD_FAST + 1)
+    a_ms = 2.0 / (MACD_SLOW + 1)
+    a_sig = 2.0 / (MACD_SIGNAL + 1)
+    w_ef = 1.0 - 2.0 / (EMA_FAST + 1)
+    w_es = 1.0 - 2.0 / (EMA_SLOW + 1)
+
+    roll_up = roll_down = 0.0
+    e_fast = e_slow = signal = 0.0
+    num_f = den_f = num_s = den_s = 0.0
+    atr = obv = 0.0
+
+    raw_k = np.full(n, nan)
+    abs_dev = np.full(n, nan)
+    tp = np.empty(n)
+
+    for t in range(n):
+        out[t, 0] = o[t]
+        out[t, 1] = h[t]
+        out[t, 2] = low[t]
+        out[t, 3] = c[t]
+        out[t, 4] = v[t]
+        for j in range(5, 22):
+            out[t, j] = nan
+
+        # --- RSI / OBV / retornos (diferença com a barra anterior)
+        if t > 0:
+            d = c[t] - c[t - 1]
+            up = d if d > 0 else 0.0
+            down = -d if d < 0 else 0.0
+            if t == 1:
+                roll_up, roll_down = up, down
+            else:
+                roll_up = (1 - a_rsi) * roll_up + a_rsi * up
+                roll_down = (1 - a_rsi) * roll_down + a_rsi * down
+            den = roll_down if roll_down != 0 else ZERO_DENOM
+            out[t, 5] = 100 - 100 / (1 + roll_up / den)
+
+            obv += np.sign(d) * v[t]
+
+            r = c[t] / c[t - 1] - 1
+            out[t, 20] = 0.0 if np.isinf(r) else r
+        out[t, 19] = obv
+
+        # --- MACD
+        if t == 0:
+            e_fast = e_slow = c[t]
+        else:
+            e_fast = (1 - a_mf) * e_fast + a_mf * c[t]
+            e_slow = (1 - a_ms) * e_slow + a_ms * c[t]
+        macd = e_fast - e_slow
+        signal = macd if t == 0 else (1 - a_sig) * signal + a_sig * macd
+        out[t, 6] = macd
+        out[t, 7] = signal
+        out[t, 8] = macd - signal
+
+        # --- SMA
+        if t >= SMA_FAST - 1:
+            s = 0.0
+            for i in range(t - SMA_FAST + 1, t + 1):
+                s += c[i]
+            out[t, 9] = s / SMA_FAST
+        if t >= SMA_SLOW - 1:
+            s = 0.0
+            for i in range(t - SMA_SLOW + 1, t + 1):
+                s += c[i]
+            out[t, 10] = s / SMA_SLOW
+
+        # --- EMA (adjust=True)
+        num_f = c[t] + w_ef * num_f
+        den_f = 1.0 + w_ef * den_f
+        num_s = c[t] + w_es * num_s
+        den_s = 1.0 + w_es * den_s
+        out[t, 11] = num_f / den_f
+        out[t, 12] = num_s / den_s
+
+        # --- janela min/max de 14 partilhada: estocástico + Williams
+        if t >= STOCH_PERIOD - 1:
+            lo = low[t]
+            hi = h[t]
+            for i in range(t - STOCH_PERIOD + 1, t):
+                if low[i] < lo:
+                    lo = low[i]
+                if h[i] > hi:
+                    hi = h[i]
+            rng = hi - lo
+            if rng == 0:
+                rng = ZERO_DENOM
+            raw_k[t] = 100 * (c[t] - lo) / rng
+            out[t, 15] = -100 * (hi - c[t]) / rng
+        if t >= STOCH_PERIOD + STOCH_SMOOTH_K - 2:
+            s = 0.0
+            for i in range(t - STOCH_SMOOTH_K + 1, t + 1):
+                s += raw_k[i]
+            out[t, 13] = s / STOCH_SMOOTH_K
+        if t >= STOCH_PERIOD + STOCH_SMOOTH_K + STOCH_SMOOTH_D - 3:
+            s = 0.0
+            for i in range(t - STOCH_SMOOTH_D + 1, t + 1):
+                s += out[i, 13]
+            out[t, 14] = s / STOCH_SMOOTH_D
+
+        # --- ROC
+        if t >= ROC_PERIOD:
+            out[t, 16] = c[t] / c[t - ROC_PERIOD] - 1
+
+        # --- CCI
+        tp[t] = (h[t] + low[t] + c[t]) / 3
+        if t >= CCI_PERIOD - 1:
+            s = 0.0
+            for i in range(t - CCI_PERIOD + 1, t + 1):
+                s += tp[i]
+            ma = s / CCI_PERIOD
+            abs_dev[t] = abs(tp[t] - ma)
+            if t >= 2 * CCI_PERIOD - 2:
+                s = 0.0
+                for i in range(t - CCI_PERIOD + 1, t + 1):
+                    s += abs_dev[i]
+                md = s / CCI_PERIOD
+                if md == 0:
+                    md = ZERO_DENOM
+                out[t, 17] = (tp[t] - ma) / (0.015 * md)
+
+        # --- ATR
+        if t == 0:
+            atr = h[t] - low[t]
+        else:
+            tr = max(h[t] - low[t], abs(h[t] - c[t - 1]), abs(low[t] - c[t - 1]))
+            atr = (1 - a_atr) * atr + a_atr * tr
+        out[t, 18] = atr
+
+        # --- volatilidade (desvio padrão amostral dos retornos)
+        if t >= VOL_PERIOD:
+            s = 0.0
+            for i in range(t - VOL_PERIOD + 1, t + 1):
+                s += out[i, 20]
+            mean = s / VOL_PERIOD
+            s = 0.0
+            for i in range(t - VOL_PERIOD + 1, t + 1):
+                s += (out[i, 20] - mean) ** 2
+            out[t, 21] = np.sqrt(s / (VOL_PERIOD - 1))
+
+
+_fused = njit(cache=True, error_model="numpy")(_fused_loop) if njit is not None else None
+
+BACKEND = "numba" if _fused is not None else "numpy"
+
+
+# ------------------------------------------------------------
+# Entrada: arrays OHLCV → matriz (N, 22) float64 em KERNEL_COLUMNS
+# ------------------------------------------------------------
+def compute_matrix(o, h, low, c, v, backend=None):
+    arrays = [np.ascontiguousarray(x, dtype=np.float64) for x in (o, h, low, c, v)]
+    backend = backend or BACKEND
+
+    if backend == "numba":
+        if _fused is None:
+            raise RuntimeError("numba não está instalado")
+        out = np.empty((len(arrays[3]), len(KERNEL_COLUMNS)))
+        _fused(*arrays, out)
+        return out
+
+    if backend == "numpy":
+        cols = _numpy_features(*arrays)
+        return np.column_stack([cols[name] for name in KERNEL_COLUMNS])
+
+    raise ValueError(f"Backend de kernels inválido: {backend}")
+
+
+def compute_features(o, h, low, c, v, backend=None):
+    out = compute_matrix(o, h, low, c, v, backend)
+    return {name: out[:, i] for i, name in enumerate(KERNEL_COLUMNS)}
@@ -0,0 +1,148 @@
+# ============================================================
+#  ML_Trade V4 — GLOBAL INFERENCE CORE
+#  - Um load (modelo + scalers + vocabulário) serve todos os símbolos
+#  - Previsões em batch que misturam símbolos
+# ============================================================
+
+import os
+import json
+import torch
+import pickle
+import numpy as np
+
+from app import runtime
+
+from .model_core import ModelCore
+from .config_core import (
+    MODELS_DIR,
+    SCALERS_DIR,
+    META_DIR,
+    SEQ_LEN,
+    NUM_FEATURES,
+    GLOBAL_MODEL_NAME,
+)
+
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+# threads torch/BLAS dimensionados pelo papel do processo (app/runtime.py)
+runtime.ensure_configured()
+
+
+class GlobalInferenceCore:
+    def __init__(self, name=GLOBAL_MODEL_NAME):
+        self.name = name.upper()
+        self.tf = "1H"
+
+        self.model_path = os.path.join(MODELS_DIR, f"{self.name}_{self.tf}_model.pt")
+        self.scaler_path = os.path.join(SCALERS_DIR, f"{self.name}_{self.tf}_scalers.pkl")
+        self.meta_path = os.path.join(META_DIR, f"{self.name}_{self.tf}_meta.json")
+
+        for path, what in (
+            (self.model_path, "Modelo"),
+            (self.scaler_path, "Scalers"),
+            (self.meta_path, "Meta"),
+        ):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"{what} global não encontrado: {path}")
+
+        with open(self.meta_path, "r") as f:
+            self.meta = json.load(f)
+
+        with open(self.scaler_path, "rb") as f:
+            self.scalers = pickle.load(f)
+
+        self.symbols = self.meta["symbols"]
+        self.vocab = {s: i for i, s in enumerate(self.symbols)}
+
+        self.model = ModelCore(num_symbols=len(self.symbols)).to(device)
+        self.model.load_state_dict(torch.load(self.model_path, map_location=device))
+        self.model.eval()
+
+    # ------------------------------------------------------------
+    def _symbol_id(self, symbol):
+        symbol = symbol.upper()
+        if symbol not in self.vocab:
+            raise KeyError(f"{symbol} não faz parte do modelo global {self.name}")
+        return symbol, self.vocab[symbol]
+
+    # ------------------------------------------------------------
+    # Forward em batch: janela k = features[starts[k] : starts[k] + SEQ_LEN]
+    # (janelas reunidas por batch, sem materializar N × SEQ_LEN × F)
+    # ------------------------------------------------------------
+    def _run(self, features, starts, ids, batch_size):
+        out = np.empty(len(starts), dtype=np.float32)
+        offsets = np.arange(SEQ_LEN)
+
+        with torch.no_grad():
+            for b in range(0, len(starts), batch_size):
+                s = starts[b:b + batch_size]
+                x = torch.from_numpy(features[s[:, None] + offsets]).to(device)
+                sid = torch.from_numpy(ids[b:b + batch_size]).to(device)
+                out[b:b + batch_size] = self.model(x, sid).cpu().numpy()[:, 0]
+
+        return out
+
+    # ------------------------------------------------------------
+    # Última janela de vários símbolos num único forward
+    # seqs: {symbol: (SEQ_LEN, NUM_FEATURES)} → {symbol: retorno previsto}
+    # ------------------------------------------------------------
+    def predict_latest(self, seqs, batch_size=1024):
+        names, windows, ids = [], [], []
+
+        for symbol, seq in seqs.items():
+            symbol, sid = self._symbol_id(symbol)
+            seq = np.asarray(seq, dtype=np.float32)
+            if seq.shape != (SEQ_LEN, NUM_FEATURES):
+                raise ValueError(
+                    f"{symbol}: esperado shape ({SEQ_LEN}, {NUM_FEATURES}), recebido {seq.shape}"
+                )
+            names.append(symbol)
+            windows.append(self.scalers[symbol].transform(seq).astype(np.float32))
+            ids.append(sid)
+
+        if not names:
+            return {}
+
+        features = np.concatenate(windows)
+        starts = np.arange(len(names)) * SEQ_LEN
+        preds = self._run(features, starts, np.asarray(ids, dtype=np.int64), batch_size)
+        return {s: float(p) for s, p in zip(names, preds)}
+
+    # ------------------------------------------------------------
+    # Séries completas de vários símbolos (batches cruzam símbolos)
+    # matrices: {symbol: feature_matrix} → {symbol: out}, com a convenção
+    # do InferenceCore.predict_series (NaN nas primeiras SEQ_LEN linhas)
+    # ------------------------------------------------------------
+    def predict_many(self, matrices, batch_size=1024):
+        blocks, starts, ids, spans = [], [], [], []
+        offset = 0
+
+        for symbol, fm in matrices.items():
+            symbol, sid = self._symbol_id(symbol)
+            fm = np.asarray(fm, dtype=np.float32)
+            n = fm.shape[0]
+            k = max(n - SEQ_LEN, 0)
+
+            if k:
+                blocks.append(self.scalers[symbol].transform(fm).astype(np.float32))
+                starts.append(offset + np.arange(k))
+                ids.append(np.full(k, sid, dtype=np.int64))
+                offset += n
+            spans.append((symbol, n, k))
+
+        preds = (
+            self._run(np.concatenate(blocks), np.concatenate(starts), np.concatenate(ids), batch_size)
+            if blocks else np.empty(0, dtype=np.float32)
+        )
+
+        out, pos = {}, 0
+        for symbol, n, k in spans:
+            series = np.full(n, np.nan, dtype=np.float32)
+            series[SEQ_LEN:SEQ_LEN + k] = preds[pos:pos + k]
+            out[symbol] = series
+            pos += k
+
+        return out
+
+    def predict_series(self, symbol, feature_matrix, batch_size=1024):
+        return self.predict_many({symbol: feature_matrix}, batch_size)[symbol.upper()]
@@ -0,0 +1,248 @@
+# ============================================================
+#  ML_Trade V4 — GLOBAL TRAINER CORE (PatchTST multi-símbolo)
+#  - Um único modelo para todo o universo de símbolos
+#  - Embedding aprendido por símbolo (ModelCore num_symbols)
+#  - Scaler por símbolo; janelas geradas por batch a partir das
+#    matrizes de features (sem materializar N × SEQ_LEN × F)
+# ============================================================
+
+import os
+import json
+import pickle
+import torch
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+from app import runtime
+
+from .model_core import ModelCore
+from .config_core import (
+    MODELS_DIR,
+    SCALERS_DIR,
+    META_DIR,
+    SEQ_LEN,
+    NUM_FEATURES,
+    EPOCHS,
+    LEARNING_RATE,
+    BATCH_SIZE,
+    SHUFFLE,
+    EARLY_STOPPING_PATIENCE,
+    EARLY_STOPPING_MIN_DELTA,
+    VAL_FRACTION,
+    PURGE_GAP,
+    GLOBAL_MODEL_NAME,
+)
+from .walk_forward_core import purged_holdout
+
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+# threads torch/BLAS dimensionados pelo papel do processo (app/runtime.py)
+runtime.ensure_configured()
+
+
+# ============================================================
+#  GLOBAL TRAINER CORE
+# ============================================================
+
+class GlobalTrainerCore:
+    def __init__(self, symbols, name=GLOBAL_MODEL_NAME):
+        self.symbols = [s.upper() for s in symbols]
+        self.name = name.upper()
+        self.tf = "1H"
+
+        if not self.symbols:
+            raise ValueError("GlobalTrainerCore requer pelo menos um símbolo")
+
+        # vocabulário: símbolo → id do embedding
+        self.vocab = {s: i for i, s in enumerate(self.symbols)}
+
+        self.model = ModelCore(num_symbols=len(self.symbols)).to(device)
+        self.criterion = torch.nn.MSELoss()
+        self.optimizer = torch.optim.Adam(self.model.parameters(), lr=LEARNING_RATE)
+
+        self.scalers = {}
+
+    # ------------------------------------------------------------
+    # Caminhos
+    # ------------------------------------------------------------
+    @property
+    def model_path(self):
+        return os.path.join(MODELS_DIR, f"{self.name}_{self.tf}_model.pt")
+
+    @property
+    def scaler_path(self):
+        return os.path.join(SCALERS_DIR, f"{self.name}_{self.tf}_scalers.pkl")
+
+    @property
+    def meta_path(self):
+        return os.path.join(META_DIR, f"{self.name}_{self.tf}_meta.json")
+
+    # ------------------------------------------------------------
+    # Carregar dados: {symbol: (feature_matrix, targets)}
+    # (DatasetBuilderCore.build_matrix)
+    # ------------------------------------------------------------
+    def load_data(self, matrices):
+        blocks = []
+        train_starts, val_starts = [], []
+        train_ids, val_ids = [], []
+        targets = []
+        offset = 0
+
+        for symbol in self.symbols:
+            if symbol not in matrices:
+                raise KeyError(f"Sem dados para {symbol}")
+
+            features, y = matrices[symbol]
+            n_samples = len(features) - SEQ_LEN
+            if n_samples <= PURGE_GAP + 1:
+                raise ValueError(f"{symbol}: amostras insuficientes ({max(n_samples, 0)})")
+
+            # split purgado por símbolo (mesma regra do TrainerCore)
+            train_idx, val_idx = purged_holdout(n_samples, VAL_FRACTION, PURGE_GAP)
+
+            # scaler ajustado só às linhas vistas pelas janelas de treino
+            scaler = StandardScaler().fit(features[:train_idx[-1] + SEQ_LEN])
+            self.scalers[symbol] = scaler
+            blocks.append(scaler.transform(features).astype(np.float32))
+
+            # amostra k: janela [k, k + SEQ_LEN) na matriz, target y[k + SEQ_LEN]
+            sid = self.vocab[symbol]
+            train_starts.append(offset + train_idx)
+            val_starts.append(offset + val_idx)
+            train_ids.append(np.full(len(train_idx), sid))
+            val_ids.append(np.full(len(val_idx), sid))
+
+            padded = np.full(len(features), np.nan, dtype=np.float32)
+            padded[:n_samples] = y[SEQ_LEN:]
+            targets.append(padded)
+
+            offset += len(features)
+
+        self.features = np.concatenate(blocks)
+        self.targets = np.concatenate(targets)
+
+        self.train_starts = np.concatenate(train_starts)
+        self.train_ids = np.concatenate(train_ids).astype(np.int64)
+        self.val_starts = np.concatenate(val_starts)
+        self.val_ids = np.concatenate(val_ids).astype(np.int64)
+
+        with open(self.scaler_path, "wb") as f:
+            pickle.dump(self.scalers, f)
+
+    # ------------------------------------------------------------
+    # Batches: janelas reunidas por indexação vetorizada
+    # ------------------------------------------------------------
+    def _batches(self, starts, ids, shuffle):
+        order = np.random.permutation(len(starts)) if shuffle else np.arange(len(starts))
+        offsets = np.arange(SEQ_LEN)
+
+        for b in range(0, len(order), BATCH_SIZE):
+            sel = order[b:b + BATCH_SIZE]
+            s = starts[sel]
+            X = self.features[s[:, None] + offsets]         # (B, SEQ_LEN, F)
+            y = self.targets[s][:, None]
+
+            yield (
+                torch.from_numpy(X).to(device),
+                torch.from_numpy(ids[sel]).to(device),
+                torch.from_numpy(y).to(device),
+            )
+
+    # ------------------------------------------------------------
+    # Validação
+    # ------------------------------------------------------------
+    def validate(self):
+        self.model.eval()
+        total, count = 0.0, 0
+
+        with torch.no_grad():
+            for X_batch, id_batch, y_batch in self._batches(self.val_starts, self.val_ids, False):
+                pred = self.model(X_batch, id_batch)
+                total += self.criterion(pred, y_batch).item() * len(y_batch)
+                count += len(y_batch)
+
+        return total / max(count, 1)
+
+    # ------------------------------------------------------------
+    # Treinar
+    # ------------------------------------------------------------
+    def train(self, progress_cb=None, should_stop=None):
+        best_val = float("inf")
+        patience = 0
+        epochs_run = 0
+        cancelled = False
+
+        for epoch in range(EPOCHS):
+            if should_stop is not None and should_stop():
+                cancelled = True
+                print("Treino cancelado.")
+                break
+
+            epochs_run = epoch + 1
+            self.model.train()
+            batch_losses = []
+
+            for X_batch, id_batch, y_batch in self._batches(self.train_starts, self.train_ids, SHUFFLE):
+                self.optimizer.zero_grad()
+                pred = self.model(X_batch, id_batch)
+                loss = self.criterion(pred, y_batch)
+                loss.backward()
+                self.optimizer.step()
+
+                batch_losses.append(loss.item())
+
+            train_loss = float(np.mean(batch_losses))
+            val_loss = self.validate()
+
+            print(f"[Epoch {epoch+1}/{EPOCHS}] "
+                  f"Train={train_loss:.6f}  Val={val_loss:.6f}")
+
+            if val_loss + EARLY_STOPPING_MIN_DELTA < best_val:
+                best_val = val_loss
+                patience = 0
+                self.save()
+            else:
+                patience += 1
+
+            if progress_cb is not None:
+                progress_cb({
+                    "epoch": epoch + 1,
+                    "epochs": EPOCHS,
+                    "train_loss": train_loss,
+                    "val_loss": val_loss,
+                    "best_val": best_val,
+                })
+
+            if patience >= EARLY_STOPPING_PATIENCE:
+                print("Early stopping.")
+                break
+
+        return {
+            "best_val": best_val,
+            "epochs": epochs_run,
+            "cancelled": cancelled,
+            "symbols": len(self.symbols),
+            "samples": int(len(self.train_starts) + len(self.val_starts)),
+        }
+
+    # ------------------------------------------------------------
+    # Guardar modelo + meta (vocabulário incluído)
+    # ------------------------------------------------------------
+    def save(self):
+        torch.save(self.model.state_dict(), self.model_path)
+
+        meta = {
+            "symbol": self.name,
+            "timeframe": self.tf,
+            "seq_len": SEQ_LEN,
+            "num_features": NUM_FEATURES,
+            "model_type": "PatchTST-global",
+            "symbols": self.symbols,
+        }
+
+        with open(self.meta_path, "w") as f:
+            json.dump(meta, f, indent=4)
+
+        print(f"✔ Modelo guardado: {self.model_path}")
+        print(f"✔ Scalers guardados: {self.scaler_path}")
+        print(f"✔ Meta guardado:   {self.meta_path}")
@@ -10,6 +10,9 @@ import json
 import torch
 import pickle
 import numpy as np
+from typing import Optional
+
+from app import runtime
 
 from .model_core import ModelCore
 from .config_core import (
@@ -19,10 +22,24 @@ from .config_core import (
     SEQ_LEN,
     NUM_FEATURES,
     BASE_THRESHOLD,
+    INFERENCE_BACKEND,
+    EXPORT_TOLERANCE,
+)
+from .export_core import (
+    BACKENDS,
+    RUNNERS,
+    EagerRunner,
+    QuantizedRunner,
+    artifact_paths,
+    max_abs_error,
 )
+from .dataset_builder_core import windows
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+# threads torch/BLAS dimensionados pelo papel do processo (app/runtime.py)
+runtime.ensure_configured()
+
 
 # ============================================================
 #  Signal Engine (versão achatada)
@@ -49,7 +66,7 @@ class SignalEngineCore:
 # ============================================================
 
 class InferenceCore:
-    def __init__(self, symbol: str):
+    def __init__(self, symbol: str, backend: Optional[str] = None):
         self.symbol = symbol.upper()
         self.tf = "1H"
 
@@ -81,9 +98,59 @@ class InferenceCore:
         self.model.load_state_dict(torch.load(self.model_path, map_location=device))
         self.model.eval()
 
+        # Backend de execução (eager | torchscript | onnx | int8)
+        self.backend_error = None
+        self.quant_report = None
+        self.runner = self._select_runner((backend or INFERENCE_BACKEND).lower())
+        self.backend = self.runner.name
+
         # Engine de sinal
         self.signals = SignalEngineCore()
 
+    # ------------------------------------------------------------
+    # Seleção do backend + verificação contra o modelo eager
+    # ------------------------------------------------------------
+    def _select_runner(self, backend):
+        eager = EagerRunner(self.model, device)
+
+        if backend not in BACKENDS + ("auto",):
+            raise ValueError(f"Backend inválido: {backend}. Aceites: {list(BACKENDS) + ['auto']}")
+        if backend == "eager":
+            return eager
+
+        # int8 é opt-in (nunca escolhido por "auto"); o delta vs fp32 nas
+        # janelas de validação fica em meta["quantization"]
+        if backend == "int8":
+            self.quant_report = self.meta.get("quantization")
+            runner = QuantizedRunner(self.model)
+            # o modelo fp32 deixa de ser necessário: menos memória por símbolo
+            self.model = runner.model
+            return runner
+
+        # só artefactos registados no meta (gerados a partir deste .pt)
+        exported = self.meta.get("exports", {})
+        candidates = ["onnx", "torchscript"] if backend == "auto" else [backend]
+        paths = artifact_paths(self.model_path)
+
+        for name in candidates:
+            if "path" not in exported.get(name, {}) or not os.path.exists(paths[name]):
+                self.backend_error = f"{name}: artefacto não disponível"
+                continue
+            try:
+                runner = RUNNERS[name](paths[name], device)
+                err = max_abs_error(runner, eager)
+            except Exception as e:
+                self.backend_error = f"{name}: {type(e).__name__}: {e}"
+                continue
+            if err > EXPORT_TOLERANCE:
+                self.backend_error = f"{name}: max_abs_err={err:.2e} vs eager"
+                continue
+            return runner
+
+        if backend != "auto":
+            print(f"⚠ Backend {backend} indisponível ({self.backend_error}); a usar eager.")
+        return eager
+
     # ------------------------------------------------------------
     # Preparação da sequência
     # ------------------------------------------------------------
@@ -99,18 +166,56 @@ class InferenceCore:
         seq_scaled = self.scaler.transform(seq_array)
         seq_scaled = np.expand_dims(seq_scaled, axis=0)  # batch = 1
 
-        return torch.tensor(seq_scaled, dtype=torch.float32).to(device)
+        return seq_scaled.astype(np.float32)
 
     # ------------------------------------------------------------
     # Previsão pura
     # ------------------------------------------------------------
     def predict(self, seq_array):
         x = self._prepare_sequence(seq_array)
+        return float(self.runner(x)[0])
+
+    # ------------------------------------------------------------
+    # Previsão em batch (N, SEQ_LEN, NUM_FEATURES) → (N,)
+    # ------------------------------------------------------------
+    def predict_batch(self, seq_arrays, batch_size=1024):
+        seq_arrays = np.asarray(seq_arrays, dtype=np.float32)
+        n = seq_arrays.shape[0]
+
+        scaled = self.scaler.transform(seq_arrays.reshape(-1, NUM_FEATURES))
+        scaled = scaled.reshape(n, SEQ_LEN, NUM_FEATURES).astype(np.float32)
+
+        out = np.empty(n, dtype=np.float32)
+        for start in range(0, n, batch_size):
+            out[start:start + batch_size] = self.runner(scaled[start:start + batch_size])
+
+        return out
+
+    # ------------------------------------------------------------
+    # Previsões alinhadas com as linhas da matriz de features
+    # ------------------------------------------------------------
+    def predict_series(self, feature_matrix, batch_size=1024):
+        """
+        out[i] = previsão da janela [i - SEQ_LEN, i) (mesma convenção do
+        DatasetBuilderCore); NaN nas primeiras SEQ_LEN linhas.
+        """
+        feature_matrix = np.asarray(feature_matrix, dtype=np.float32)
+        n = feature_matrix.shape[0]
+
+        out = np.full(n, np.nan, dtype=np.float32)
+        if n <= SEQ_LEN:
+            return out
+
+        scaled = self.scaler.transform(feature_matrix).astype(np.float32, copy=False)
+
+        # janelas sem cópia: (n - SEQ_LEN, SEQ_LEN, NUM_FEATURES)
+        views = windows(scaled)[:-1]
 
-        with torch.no_grad():
-            pred = self.model(x)
+        for start in range(0, views.shape[0], batch_size):
+            chunk = np.ascontiguousarray(views[start:start + batch_size])
+            out[SEQ_LEN + start:SEQ_LEN + start + chunk.shape[0]] = self.runner(chunk)
 
-        return float(pred.cpu().numpy()[0, 0])
+        return out
 
     # ------------------------------------------------------------
     # Previsão + Sinal → formato achatado
@@ -0,0 +1,19 @@
+# ============================================================
+#  ML_Trade V4 — IO CORE
+#  Escrita atómica dos artefactos em storage/
+# ============================================================
+
+import os
+
+
+# ------------------------------------------------------------
+# Ficheiro temporário + os.replace: um processo morto a meio
+# nunca deixa um artefacto truncado
+# ------------------------------------------------------------
+def atomic_write(path, write_fn, mode="wb"):
+    tmp = f"{path}.tmp"
+    with open(tmp, mode) as f:
+        write_fn(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
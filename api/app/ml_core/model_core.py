@@ -107,11 +107,17 @@ class ModelCore(nn.Module):
         heads=4,
         ff_hidden=256,
         dropout=0.1,
+        num_symbols=0,
     ):
         super().__init__()
 
         self.patch_embed = PatchEmbedding(seq_len, num_features, patch_size, dim)
 
+        # Modelo global: embedding aprendido por símbolo, somado a cada patch
+        # (num_symbols=0 → modelo por símbolo, state_dict igual ao original)
+        self.num_symbols = num_symbols
+        self.symbol_embed = nn.Embedding(num_symbols, dim) if num_symbols > 0 else None
+
         self.encoder_layers = nn.ModuleList([
             EncoderLayer(dim, heads, ff_hidden, dropout)
             for _ in range(depth)
@@ -136,17 +142,25 @@ class ModelCore(nn.Module):
                 nn.init.xavier_uniform_(m.weight)
                 if m.bias is not None:
                     nn.init.zeros_(m.bias)
+            elif isinstance(m, nn.Embedding):
+                nn.init.normal_(m.weight, std=0.02)
 
     # ------------------------------------------------------------
     # Forward Pass
     # ------------------------------------------------------------
-    def forward(self, x):
+    def forward(self, x, symbol_ids=None):
         """
-        x: (batch, SEQ_LEN, NUM_FEATURES)
+        x:          (batch, SEQ_LEN, NUM_FEATURES)
+        symbol_ids: (batch,) int64 — só no modelo global
         """
 
         x = self.patch_embed(x)          # (B, num_patches, dim)
 
+        if self.symbol_embed is not None:
+            if symbol_ids is None:
+                raise ValueError("Modelo global requer symbol_ids")
+            x = x + self.symbol_embed(symbol_ids)[:, None, :]
+
         for layer in self.encoder_layers:
             x = layer(x)
 
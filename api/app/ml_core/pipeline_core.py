@@ -0,0 +1,180 @@
+# ============================================================
+#  PIPELINE CORE — passos do pipeline MLCore reutilizáveis
+#  Download → Clean → Train → Backtest
+#  (usados pelos endpoints síncronos e pelas tasks Celery)
+# ============================================================
+
+import pandas as pd
+
+from app.ml.data_downloader import download_1h
+from app.ml.data_manager import DataManager
+
+from .backtester_core import BacktesterCore, to_native
+from .config_core import (
+    FEATURE_ORDER,
+    FINETUNE_EPOCHS,
+    FINETUNE_PATIENCE,
+    FINETUNE_WINDOW,
+    PURGE_GAP,
+    VAL_FRACTION,
+    WF_EMBARGO,
+    WF_N_SPLITS,
+)
+from .dataset_builder_core import DatasetBuilderCore
+from .feature_cache_core import FeatureCacheCore
+from .inference_core import InferenceCore
+from .report_core import ReportCore
+from .signal_engine_core import SignalEngineCore
+from .walk_forward_core import WalkForwardCore, purged_holdout_before
+
+
+# ------------------------------------------------------------
+# Dados
+# ------------------------------------------------------------
+def download_symbol(symbol):
+    symbol = symbol.upper()
+    df = download_1h(symbol)
+    return {"symbol": symbol, "rows": int(len(df))}
+
+
+def clean_symbol(symbol):
+    symbol = symbol.upper()
+    df = DataManager().clean_symbol(symbol, tf="1H")
+    return {"symbol": symbol, "rows": int(len(df))}
+
+
+def load_features(symbol, tf="1H"):
+    """
+    Matriz FEATURE_ORDER (float32) via FeatureCacheCore: com o CSV limpo
+    inalterado não há feature engineering; com barras novas só a cauda.
+    """
+    return FeatureCacheCore(tf).load(symbol)
+
+
+# ------------------------------------------------------------
+# Treino
+# ------------------------------------------------------------
+def train_symbol(symbol, progress_cb=None, should_stop=None, resume=True):
+    """
+    resume=True: se um treino anterior foi interrompido (checkpoint com os
+    mesmos dados), continua a partir da última época guardada.
+    """
+    # import local: torch só é carregado quando há treino
+    from .trainer_core import TrainerCore
+
+    symbol = symbol.upper()
+    df_fe = load_features(symbol)
+    X, y = DatasetBuilderCore().build(df_fe)
+
+    trainer = TrainerCore(symbol)
+    resumed = resume and trainer.resume(last_bar_time=df_fe.index[-1])
+    trainer.load_data(X, y, last_bar_time=df_fe.index[-1])
+    summary = trainer.train(progress_cb=progress_cb, should_stop=should_stop)
+
+    return {"symbol": symbol, "mode": "full", "resumed": bool(resumed), "samples": int(len(X)), **summary}
+
+
+def finetune_symbol(symbol, window=None, epochs=None, update_scaler=False,
+                    progress_cb=None, should_stop=None, resume=True):
+    """
+    Fine-tune incremental: parte do modelo existente e treina só nas
+    FINETUNE_WINDOW amostras mais recentes. Sem modelo (ou sem a
+    última barra no meta) → treino completo.
+    """
+    from .trainer_core import TrainerCore
+
+    symbol = symbol.upper()
+    trainer = TrainerCore(symbol)
+    last_bar = (trainer.read_meta() or {}).get("last_bar_time")
+    if not trainer.has_artifacts() or last_bar is None:
+        return train_symbol(symbol, progress_cb=progress_cb, should_stop=should_stop, resume=resume)
+
+    df_fe = load_features(symbol)
+    trainer.load_pretrained()
+
+    # fine-tune interrompido: o meta já pode ter a última barra nova
+    resumed = resume and trainer.resume(last_bar_time=df_fe.index[-1])
+    if resumed:
+        n_new = trainer.checkpoint_extra.get("new_bars", 0)
+    else:
+        # cada barra nova acrescenta uma amostra (o seu retorno é o último target)
+        n_new = int((df_fe.index > pd.Timestamp(last_bar)).sum())
+        if n_new == 0:
+            return {"symbol": symbol, "mode": "incremental", "skipped": True, "new_bars": 0}
+        trainer.checkpoint_extra = {"new_bars": n_new}
+
+    X, y = DatasetBuilderCore().build(df_fe)
+    window = max(window or FINETUNE_WINDOW, 2 * n_new)
+
+    # as barras novas ficam no treino; validação = bloco anterior à janela
+    # (sem histórico suficiente: holdout normal dentro da janela)
+    _, val_idx = purged_holdout_before(len(X), window, VAL_FRACTION, PURGE_GAP)
+    X_val = y_val = None
+    if len(val_idx):
+        X_val, y_val = X[val_idx[0]:val_idx[-1] + 1], y[val_idx[0]:val_idx[-1] + 1]
+    X, y = X[-window:], y[-window:]
+
+    trainer.load_data(X, y, X_val=X_val, y_val=y_val, fit_scaler=False,
+                      n_new=n_new if update_scaler else 0, last_bar_time=df_fe.index[-1])
+    summary = trainer.train(progress_cb=progress_cb, should_stop=should_stop,
+                            epochs=epochs or FINETUNE_EPOCHS, patience_limit=FINETUNE_PATIENCE)
+
+    return {"symbol": symbol, "mode": "incremental", "resumed": bool(resumed), "samples": int(len(X)),
+            "new_bars": n_new, **summary}
+
+
+def train_global(symbols, progress_cb=None, should_stop=None):
+    """
+    Um único PatchTST para todos os símbolos (embedding por símbolo).
+    """
+    from .global_trainer_core import GlobalTrainerCore
+
+    symbols = [s.upper() for s in symbols]
+    builder = DatasetBuilderCore()
+    matrices = {s: builder.build_matrix(load_features(s)) for s in symbols}
+
+    trainer = GlobalTrainerCore(symbols)
+    trainer.load_data(matrices)
+    return trainer.train(progress_cb=progress_cb, should_stop=should_stop)
+
+
+# ------------------------------------------------------------
+# Backtest dirigido pelas previsões do modelo
+# ------------------------------------------------------------
+def model_backtest(symbol, df_fe, mode="moderate", fees_bps=0.0, slippage_bps=0.0):
+    infer = InferenceCore(symbol)
+    preds = infer.predict_series(df_fe[FEATURE_ORDER].values)
+    positions = SignalEngineCore(mode).generate_array(preds)
+
+    bt = BacktesterCore(symbol, fees_bps=fees_bps, slippage_bps=slippage_bps)
+    result = bt.run(df_fe, positions)
+    report = ReportCore().generate(result, df_fe)
+
+    return {**to_native(result), "stats": report["stats"]}
+
+
+def backtest_symbol(symbol, mode="moderate", fees_bps=0.0, slippage_bps=0.0):
+    symbol = symbol.upper()
+    result = model_backtest(symbol, load_features(symbol), mode, fees_bps, slippage_bps)
+    return {"symbol": symbol, **result}
+
+
+# ------------------------------------------------------------
+# Walk-forward (out-of-sample com purge/embargo)
+# Features da barra t → direção do retorno seguinte
+# ------------------------------------------------------------
+def walk_forward_symbol(symbol, n_splits=WF_N_SPLITS, embargo=WF_EMBARGO, jobs=1):
+    symbol = symbol.upper()
+    df_t = DatasetBuilderCore()._build_target(load_features(symbol).copy())
+
+    X = df_t[FEATURE_ORDER].values
+    y = (df_t["future_return"].values > 0).astype(int)
+
+    wf = WalkForwardCore(n_splits=n_splits, purge=1, embargo=embargo, jobs=jobs)
+    result = wf.evaluate(X, y)
+
+    families = {
+        name: {k: v for k, v in fam.items() if not k.startswith("oos_")}
+        for name, fam in result["families"].items()
+    }
+    return to_native({"symbol": symbol, "samples": int(len(X)), **result, "families": families})
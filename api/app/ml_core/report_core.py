@@ -12,15 +12,18 @@ class ReportCore:
     def generate(self, backtest_result: dict, df_clean: pd.DataFrame):
         """
         Gera um dicionário de métricas e estatísticas baseado no resultado
-        do BacktesterCore.
+        do BacktesterCore. Aceita trades como lista de dicts ou como
+        dicionário de arrays (formato vetorizado).
         """
 
         equity = backtest_result.get("equity_curve", [])
         trades = backtest_result.get("trades", [])
         final_value = backtest_result.get("final_value", 10000.0)
 
-        # Garantir arrays numpy
+        # Garantir arrays numpy (e trades vetorizados em listas serializáveis)
         equity = np.array(equity, dtype=float)
+        if isinstance(trades, dict):
+            trades = {k: np.asarray(v).tolist() for k, v in trades.items()}
 
         # Se não tiver equity, devolver relatório vazio mas estruturado
         if len(equity) < 2:
@@ -63,11 +66,15 @@ class ReportCore:
         max_drawdown = dd.min()
 
         # Trades
-        num_trades = len(trades)
+        if isinstance(trades, dict):
+            pnl = np.asarray(trades.get("pnl", []), dtype=float)
+        else:
+            pnl = np.array([t["pnl"] for t in trades], dtype=float)
+
+        num_trades = len(pnl)
         if num_trades > 0:
-            wins = [t for t in trades if t["pnl"] > 0]
-            winrate = len(wins) / num_trades
-            avg_pnl = np.mean([t["pnl"] for t in trades])
+            winrate = float(np.count_nonzero(pnl > 0)) / num_trades
+            avg_pnl = pnl.mean()
         else:
             winrate = 0.0
             avg_pnl = 0.0
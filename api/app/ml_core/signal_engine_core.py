@@ -2,6 +2,9 @@
 # SIGNAL ENGINE CORE — versão moderna, alinhada com MLCore
 # ============================================================
 
+import numpy as np
+
+
 class SignalEngineCore:
 
     def __init__(self, mode: str = "moderate"):
@@ -44,3 +47,19 @@ class SignalEngineCore:
             "strength": float(strength),
             "predicted_return": float(predicted_return)
         }
+
+    # ------------------------------------------------------------
+    # Versão vetorizada → array de posições (-1, 0, 1)
+    # ------------------------------------------------------------
+    def generate_array(self, predicted_returns):
+        """
+        Converte uma série de predicted_return em posições para o
+        BacktesterCore. Valores NaN (sem previsão) ficam flat.
+        """
+        pred = np.asarray(predicted_returns, dtype=np.float64)
+
+        positions = np.zeros(pred.shape, dtype=np.float64)
+        positions[pred > self.long_th] = 1.0
+        positions[pred < -self.short_th] = -1.0
+
+        return positions
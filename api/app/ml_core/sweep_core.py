@@ -0,0 +1,264 @@
+# ============================================================
+#  SWEEP CORE — varrimento vetorizado de thresholds / fees
+#  - Uma série de preços + uma série de previsões
+#  - Matriz de posições (thresholds × barras) avaliada de uma vez
+# ============================================================
+
+import numpy as np
+
+# Assume barras horárias 24/7 (mesma convenção do ReportCore)
+PERIODS_PER_YEAR = 365 * 24
+
+# Limite de elementos por bloco (thresholds × barras) para controlar memória
+MAX_BLOCK_ELEMENTS = 4_000_000
+
+# Limite de thresholds por pedido (API)
+MAX_SWEEP_THRESHOLDS = 2_000
+
+METRICS = (
+    "total_return",
+    "sharpe",
+    "max_drawdown",
+    "num_trades",
+    "win_rate",
+    "expectancy",
+    "profit_factor",
+    "exposure",
+    "final_equity",
+)
+
+
+class SweepCore:
+
+    def __init__(self, close, scores, mode="symmetric"):
+        """
+        close:  preços de fecho (N,)
+        scores: previsão por barra (N,), ex.: InferenceCore.predict_series
+                (NaN = sem previsão → flat)
+        mode:   "symmetric" → long se score > th, short se score < -th
+                "long_only" → long se score >= th, senão cash (probabilidades)
+        """
+        self.close = np.asarray(close, dtype=np.float64)
+        self.scores = np.asarray(scores, dtype=np.float64)
+
+        if self.scores.shape != self.close.shape:
+            raise ValueError(
+                f"scores deve ter shape {self.close.shape}, recebido {self.scores.shape}"
+            )
+        if mode not in ("symmetric", "long_only"):
+            raise ValueError(f"mode inválido: {mode}")
+
+        self.mode = mode
+
+        n = self.close.shape[0]
+        self.bar_returns = np.zeros(n)
+        self.bar_returns[1:] = self.close[1:] / self.close[:-1] - 1.0
+
+    # ------------------------------------------------------------
+    # Matriz de posições (T, N) em int8
+    # ------------------------------------------------------------
+    def positions(self, thresholds):
+        th = np.asarray(thresholds, dtype=np.float64)[:, None]
+        s = self.scores[None, :]
+
+        if self.mode == "long_only":
+            return (s >= th).astype(np.int8)
+
+        return (s > th).astype(np.int8) - (s < -th).astype(np.int8)
+
+    # ------------------------------------------------------------
+    # Termos independentes dos custos (calculados uma vez por bloco)
+    # Custos só actuam nas barras de mudança de posição: tudo o que
+    # depende da fee é calculado sobre esses pontos (esparsos)
+    # ------------------------------------------------------------
+    def _prepare_block(self, pos):
+        T, n = pos.shape
+        ret = self.bar_returns
+
+        # mudanças de posição (ordem linha a linha) → turnover e trades
+        delta = np.diff(pos, axis=1, prepend=0)
+        rows, cols = np.nonzero(delta)
+        turn = np.abs(delta[rows, cols]).astype(np.float64)
+        del delta
+
+        # posição detida na barra j = pos[j-1]
+        held = pos[:, :-1]
+        held_chg = np.where(cols > 0, pos[rows, np.maximum(cols - 1, 0)], 0).astype(np.float64)
+        g_chg = held_chg * ret[cols]
+
+        # log-crescimento bruto: log1p(±r) pré-calculado por barra
+        lp = np.log1p(np.maximum(ret, -1.0 + 1e-12))
+        ln = np.log1p(np.maximum(-ret, -1.0 + 1e-12))
+        log_growth = np.zeros((T, n))
+        np.multiply(held, 0.5 * (lp - ln)[1:], out=log_growth[:, 1:])
+        log_growth[:, 1:] += (held != 0) * (0.5 * (lp + ln)[1:])
+        np.cumsum(log_growth, axis=1, out=log_growth)
+
+        # somas para média/variância dos retornos (barra 0 excluída, como no ReportCore)
+        tail = cols > 0
+        sums = {
+            "g": held @ ret[1:],
+            "g2": np.abs(held) @ (ret[1:] ** 2),
+            "t": np.bincount(rows[tail], weights=turn[tail], minlength=T),
+            "t2": np.bincount(rows[tail], weights=turn[tail] ** 2, minlength=T),
+            "gt": np.bincount(rows[tail], weights=(g_chg * turn)[tail], minlength=T),
+        }
+
+        return {
+            "shape": (T, n),
+            "log_growth": log_growth,
+            "changes": (rows, cols, turn, g_chg),
+            "sums": sums,
+            "trades": self._trade_segments(pos, rows, cols),
+            "exposure": np.count_nonzero(pos, axis=1) / n,
+        }
+
+    # ------------------------------------------------------------
+    # Métricas para um bloco de thresholds e um nível de custos
+    # ------------------------------------------------------------
+    def _evaluate_block(self, blk, cost_rate):
+        T, n = blk["shape"]
+        log_growth = blk["log_growth"]
+        rows, cols, turn, g_chg = blk["changes"]
+
+        # correcção de log-equity nas barras de mudança: log1p(g - c·t) - log1p(g)
+        corr = (
+            np.log1p(np.maximum(g_chg - turn * cost_rate, -1.0 + 1e-12))
+            - np.log1p(np.maximum(g_chg, -1.0 + 1e-12))
+        )
+
+        final_log = log_growth[:, -1] + np.bincount(rows, weights=corr, minlength=T)
+        first_log = log_growth[:, 0] + np.bincount(rows, weights=np.where(cols == 0, corr, 0.0), minlength=T)
+        final_equity = np.exp(final_log)
+        total_return = np.expm1(final_log - first_log)
+
+        if cost_rate == 0.0:
+            log_eq = log_growth
+        else:
+            # degraus acumulados dos custos sobre a curva bruta
+            log_eq = np.zeros((T, n))
+            log_eq[rows, cols] = corr
+            np.cumsum(log_eq, axis=1, out=log_eq)
+            log_eq += log_growth
+        peak = np.maximum.accumulate(log_eq, axis=1)
+        np.subtract(log_eq, peak, out=peak)
+        max_drawdown = np.expm1(peak.min(axis=1))
+        del peak
+
+        # Sharpe a partir das somas: strat = g - c·t
+        m = n - 1
+        if m > 1:
+            sm = blk["sums"]
+            s1 = sm["g"] - cost_rate * sm["t"]
+            s2 = sm["g2"] - 2.0 * cost_rate * sm["gt"] + cost_rate ** 2 * sm["t2"]
+            mean = s1 / m
+            var = np.maximum(s2 - m * mean ** 2, 0.0) / (m - 1)
+            vol = np.sqrt(var) * np.sqrt(PERIODS_PER_YEAR)
+            sharpe = mean * PERIODS_PER_YEAR / (vol + 1e-12)
+        else:
+            sharpe = np.zeros(T)
+
+        # trades: PnL bruto do segmento × custos de entrada/saída
+        t_rows, entry, exit_, size, is_open = blk["trades"]
+        trade_pnl = np.exp(log_growth[t_rows, exit_] - log_growth[t_rows, entry])
+        trade_pnl *= 1.0 - size * cost_rate
+        trade_pnl *= np.where(is_open, 1.0, 1.0 - size * cost_rate)
+        trade_pnl -= 1.0
+
+        num_trades = np.bincount(t_rows, minlength=T)
+        wins = np.bincount(t_rows, weights=(trade_pnl > 0), minlength=T)
+        pnl_sum = np.bincount(t_rows, weights=trade_pnl, minlength=T)
+        gains = np.bincount(t_rows, weights=np.maximum(trade_pnl, 0.0), minlength=T)
+        losses = np.bincount(t_rows, weights=np.maximum(-trade_pnl, 0.0), minlength=T)
+
+        safe_n = np.maximum(num_trades, 1)
+        win_rate = np.where(num_trades > 0, wins / safe_n, 0.0)
+        expectancy = np.where(num_trades > 0, pnl_sum / safe_n, 0.0)
+        profit_factor = np.where(
+            losses > 0, gains / np.where(losses > 0, losses, 1.0),
+            np.where(gains > 0, np.inf, 0.0),
+        )
+
+        return {
+            "total_return": total_return,
+            "sharpe": sharpe,
+            "max_drawdown": max_drawdown,
+            "num_trades": num_trades,
+            "win_rate": win_rate,
+            "expectancy": expectancy,
+            "profit_factor": profit_factor,
+            "exposure": blk["exposure"],
+            "final_equity": final_equity,
+        }
+
+    # ------------------------------------------------------------
+    # Segmentos de posição constante != 0 a partir das mudanças
+    # (rows, cols em ordem linha a linha: a saída é a mudança seguinte)
+    # ------------------------------------------------------------
+    @staticmethod
+    def _trade_segments(pos, rows, cols):
+        n = pos.shape[1]
+
+        is_entry = pos[rows, cols] != 0
+        idx = np.flatnonzero(is_entry)
+        nxt = idx + 1
+
+        closed = nxt < rows.shape[0]
+        closed[closed] = rows[nxt[closed]] == rows[idx[closed]]
+        exit_ = np.full(idx.shape, n - 1, dtype=cols.dtype)
+        exit_[closed] = cols[nxt[closed]]
+
+        t_rows = rows[idx]
+        entry = cols[idx]
+        return t_rows, entry, exit_, np.abs(pos[t_rows, entry]), ~closed
+
+    # ------------------------------------------------------------
+    # Sweep completo: thresholds × fees numa passagem vetorizada
+    # ------------------------------------------------------------
+    def run(self, thresholds, fees_bps=(0.0,), slippage_bps=0.0, metric="expectancy"):
+        thresholds = np.atleast_1d(np.asarray(thresholds, dtype=np.float64))
+        fees = np.atleast_1d(np.asarray(fees_bps, dtype=np.float64))
+
+        if metric not in METRICS:
+            raise ValueError(f"metric inválida: {metric}. Aceites: {list(METRICS)}")
+
+        n = self.close.shape[0]
+        if n < 2 or thresholds.size == 0:
+            return {"rows": [], "best_row": None, "metric": metric}
+
+        block = max(1, MAX_BLOCK_ELEMENTS // n)
+        columns = {m: np.empty((fees.size, thresholds.size)) for m in METRICS}
+
+        for start in range(0, thresholds.size, block):
+            th = thresholds[start:start + block]
+            blk = self._prepare_block(self.positions(th))
+
+            # posições, trades e retornos brutos são partilhados por todos os custos
+            for k, fee in enumerate(fees):
+                cost_rate = (fee + float(slippage_bps)) / 1e4
+                out = self._evaluate_block(blk, cost_rate)
+                for m in METRICS:
+                    columns[m][k, start:start + th.size] = out[m]
+
+        rows = []
+        for k, fee in enumerate(fees):
+            for j, th in enumerate(thresholds):
+                row = {
+                    "threshold": float(th),
+                    "fees_bps": float(fee),
+                    "slippage_bps": float(slippage_bps),
+                }
+                for m in METRICS:
+                    v = columns[m][k, j]
+                    if m == "num_trades":
+                        row[m] = int(v)
+                    else:
+                        # inf (profit_factor sem perdas) não é serializável em JSON
+                        row[m] = float(v) if np.isfinite(v) else None
+                rows.append(row)
+
+        score = columns[metric].ravel()
+        score = np.where(np.isnan(score), -np.inf, score)
+        best_row = rows[int(np.argmax(score))]
+
+        return {"rows": rows, "best_row": best_row, "metric": metric}
@@ -5,16 +5,21 @@
 import os
 import json
 import pickle
+import random
 import torch
 import numpy as np
+from typing import Any, Callable, Dict
 from sklearn.preprocessing import StandardScaler
 from torch.utils.data import DataLoader, TensorDataset
 
+from app import runtime
+
 from .model_core import ModelCore
 from .config_core import (
     MODELS_DIR,
     SCALERS_DIR,
     META_DIR,
+    CHECKPOINTS_DIR,
     SEQ_LEN,
     NUM_FEATURES,
     EPOCHS,
@@ -23,23 +28,100 @@ from .config_core import (
     SHUFFLE,
     EARLY_STOPPING_PATIENCE,
     EARLY_STOPPING_MIN_DELTA,
+    VAL_FRACTION,
+    PURGE_GAP,
+    TRAIN_PRECISION,
+    GRAD_ACCUM_STEPS,
+    TORCH_COMPILE,
+    FINETUNE_LR,
+    CHECKPOINT_EVERY,
 )
+from .dataset_builder_core import window_rows, windows
+from .walk_forward_core import purged_holdout
+from .export_core import export_model, quantization_report
+from .io_core import atomic_write
 
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
+# threads torch/BLAS dimensionados pelo papel do processo (app/runtime.py)
+runtime.ensure_configured()
+
+
+# ------------------------------------------------------------
+# bf16 nativo: GPU com suporte ou CPU com AVX512-BF16 / AMX
+# (sem isso o autocast bf16 é emulado e mais lento que fp32)
+# ------------------------------------------------------------
+def bf16_supported():
+    if device.type == "cuda":
+        return torch.cuda.is_bf16_supported()
+    try:
+        with open("/proc/cpuinfo") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def _take(a, idx):
+    # índices contíguos → fatia (vista); senão indexação normal
+    if len(idx) and idx[-1] - idx[0] + 1 == len(idx):
+        return a[idx[0]:idx[-1] + 1]
+    return a[idx]
+
+
+def _rng_state():
+    state = {
+        "python": random.getstate(),
+        "numpy": np.random.get_state(),
+        "torch": torch.get_rng_state(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def _set_rng_state(state):
+    random.setstate(state["python"])
+    np.random.set_state(state["numpy"])
+    torch.set_rng_state(state["torch"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
 
 # ============================================================
 #  TRAINER CORE (PatchTST)
 # ============================================================
 
 class TrainerCore:
-    def __init__(self, symbol: str):
+    def __init__(self, symbol: str, precision=None, accum_steps=None, compile_model=None, persist=True):
         self.symbol = symbol.upper()
         self.tf = "1H"
 
+        # persist=False: não grava scaler/modelo/meta (benchmarks)
+        self.persist = persist
+
         # PatchTST model
         self.model = ModelCore().to(device)
 
+        # Modo de treino: precisão, acumulação de gradiente, compile
+        precision = (precision or TRAIN_PRECISION).lower()
+        if precision not in ("fp32", "bf16"):
+            raise ValueError(f"Precisão inválida: {precision}")
+        if precision == "bf16" and not bf16_supported():
+            print("⚠ bf16 sem suporte nativo neste CPU; a treinar em fp32.")
+            precision = "fp32"
+        self.precision = precision
+        self.accum_steps = max(1, int(accum_steps or GRAD_ACCUM_STEPS))
+
+        self.compiled = False
+        self.forward_model: Callable[..., Any] = self.model
+        if (TORCH_COMPILE if compile_model is None else compile_model) and hasattr(torch, "compile"):
+            try:
+                self.forward_model = torch.compile(self.model)
+                self.compiled = True
+            except Exception as e:
+                print(f"⚠ torch.compile indisponível ({e}); a usar eager.")
+
         # Loss & Optimizer
         self.criterion = torch.nn.MSELoss()
         self.optimizer = torch.optim.Adam(self.model.parameters(), lr=LEARNING_RATE)
@@ -47,6 +129,15 @@ class TrainerCore:
         # Scaler para features
         self.scaler = StandardScaler()
 
+        # warm start (load_pretrained) e última barra vista no treino
+        self.warm_start = False
+        self.last_bar_time = None
+
+        # estado do ciclo de treino vindo de resume(); extra = dados do
+        # chamador guardados no checkpoint (ex.: nº de barras novas)
+        self.resume_state = None
+        self.checkpoint_extra: Dict[str, Any] = {}
+
     # ------------------------------------------------------------
     # Caminhos
     # ------------------------------------------------------------
@@ -62,41 +153,139 @@ class TrainerCore:
     def meta_path(self):
         return os.path.join(META_DIR, f"{self.symbol}_{self.tf}_meta.json")
 
+    @property
+    def checkpoint_path(self):
+        return os.path.join(CHECKPOINTS_DIR, f"{self.symbol}_{self.tf}_ckpt.pt")
+
+    def has_artifacts(self):
+        return all(os.path.exists(p) for p in (self.model_path, self.scaler_path, self.meta_path))
+
+    def read_meta(self):
+        if not os.path.exists(self.meta_path):
+            return None
+        with open(self.meta_path, "r") as f:
+            return json.load(f)
+
+    # ------------------------------------------------------------
+    # Warm start: pesos + scaler do modelo existente, LR de fine-tune
+    # ------------------------------------------------------------
+    def load_pretrained(self, lr=FINETUNE_LR):
+        if not self.has_artifacts():
+            raise FileNotFoundError(f"Sem modelo treinado para {self.symbol}: {self.model_path}")
+
+        self.model.load_state_dict(torch.load(self.model_path, map_location=device))
+        with open(self.scaler_path, "rb") as f:
+            self.scaler = pickle.load(f)
+
+        for group in self.optimizer.param_groups:
+            group["lr"] = lr
+
+        self.warm_start = True
+        self.last_bar_time = (self.read_meta() or {}).get("last_bar_time")
+
+    # ------------------------------------------------------------
+    # Checkpoint completo para retomar treinos interrompidos
+    # ------------------------------------------------------------
+    def save_checkpoint(self, loop_state):
+        ckpt = {
+            "symbol": self.symbol,
+            "timeframe": self.tf,
+            "last_bar_time": self.last_bar_time,
+            "warm_start": self.warm_start,
+            "model": self.model.state_dict(),
+            "optimizer": self.optimizer.state_dict(),
+            "scaler": self.scaler,
+            "rng": _rng_state(),
+            "extra": self.checkpoint_extra,
+            **loop_state,
+        }
+        atomic_write(self.checkpoint_path, lambda f: torch.save(ckpt, f))
+
+    def checkpoint_info(self):
+        if not os.path.exists(self.checkpoint_path):
+            return None
+        ckpt = torch.load(self.checkpoint_path, map_location="cpu", weights_only=False)
+        return {
+            k: ckpt.get(k)
+            for k in ("symbol", "timeframe", "last_bar_time", "warm_start", "epoch", "best_val", "patience")
+        }
+
+    def clear_checkpoint(self):
+        if os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def resume(self, last_bar_time=None):
+        """
+        Restaura modelo, optimizer, scaler, RNG e estado do ciclo a partir do
+        checkpoint. Chamar antes de load_data (o scaler restaurado é mantido).
+        Checkpoint de outros dados (last_bar_time diferente) é descartado.
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return False
+
+        ckpt = torch.load(self.checkpoint_path, map_location=device, weights_only=False)
+        if last_bar_time is not None and ckpt.get("last_bar_time") != str(last_bar_time):
+            print(f"⚠ Checkpoint de {self.symbol} é de outros dados; a treinar de raiz.")
+            self.clear_checkpoint()
+            return False
+
+        self.model.load_state_dict(ckpt["model"])
+        self.optimizer.load_state_dict(ckpt["optimizer"])
+        self.scaler = ckpt["scaler"]
+        self.warm_start = ckpt["warm_start"]
+        self.last_bar_time = ckpt["last_bar_time"]
+        self.checkpoint_extra = ckpt.get("extra", {})
+        _set_rng_state(ckpt["rng"])
+
+        self.resume_state = {
+            k: ckpt[k] for k in ("epoch", "best_val", "initial_val", "improved", "patience")
+        }
+        print(f"↻ Retomar {self.symbol} após época {ckpt['epoch']} (best_val={ckpt['best_val']:.6f})")
+        return True
+
     # ------------------------------------------------------------
     # Carregar dados + aplicar scaler
     # ------------------------------------------------------------
-    def load_data(self, X, y, X_val=None, y_val=None):
-        # Se não existir validação, usar simples split 90/10
+    def load_data(self, X, y, X_val=None, y_val=None, fit_scaler=True, n_new=0, last_bar_time=None):
+        """
+        fit_scaler=False mantém o scaler do modelo existente; com n_new > 0 as
+        barras novas que caem no treino atualizam-no (partial_fit).
+        """
+        # Se não existir validação: holdout cronológico 90/10 com purge
+        # (índices contíguos → fatias, as janelas continuam vistas sem cópia)
         if X_val is None:
-            size = int(len(X) * 0.90)
-            X_train, X_val = X[:size], X[size:]
-            y_train, y_val = y[:size], y[size:]
+            train_idx, val_idx = purged_holdout(len(X), VAL_FRACTION, PURGE_GAP)
+            X_train, X_val = _take(X, train_idx), _take(X, val_idx)
+            y_train, y_val = _take(y, train_idx), _take(y, val_idx)
         else:
             X_train, y_train = X, y
 
-        # Fit scaler apenas no treino
-        self.scaler.fit(X_train.reshape(-1, NUM_FEATURES))
+        if last_bar_time is not None:
+            self.last_bar_time = str(last_bar_time)
+
+        if self.resume_state is not None:
+            # scaler restaurado do checkpoint: já inclui o fit / partial_fit
+            fit_scaler, n_new = False, 0
+        elif fit_scaler:
+            # Fit scaler apenas no treino (cada barra conta uma vez)
+            rows = window_rows(X_train)
+            self.scaler.fit(rows if rows is not None else X_train.reshape(-1, NUM_FEATURES))
+        elif n_new > 0:
+            # última linha de cada janela de treino nova = uma barra nova
+            fresh = min(len(X_train), max(0, n_new - (len(X) - len(X_train))))
+            if fresh > 0:
+                self.scaler.partial_fit(X_train[-fresh:, -1, :])
 
         # Guardar scaler
-        with open(self.scaler_path, "wb") as f:
-            pickle.dump(self.scaler, f)
-
-        # Transform datasets
-        X_train_s = np.zeros_like(X_train)
-        X_val_s = np.zeros_like(X_val)
-
-        for i in range(X_train.shape[0]):
-            X_train_s[i] = self.scaler.transform(X_train[i])
+        if self.persist and (fit_scaler or n_new > 0):
+            atomic_write(self.scaler_path, lambda f: pickle.dump(self.scaler, f))
 
-        for i in range(X_val.shape[0]):
-            X_val_s[i] = self.scaler.transform(X_val[i])
+        # Torch tensors a partilhar memória com os arrays float32
+        self.X_train = torch.from_numpy(self._scale_windows(X_train))
+        self.y_train = torch.from_numpy(np.asarray(y_train, dtype=np.float32)).unsqueeze(1)
 
-        # Torch tensors
-        self.X_train = torch.tensor(X_train_s, dtype=torch.float32)
-        self.y_train = torch.tensor(y_train, dtype=torch.float32).unsqueeze(1)
-
-        self.X_val = torch.tensor(X_val_s, dtype=torch.float32)
-        self.y_val = torch.tensor(y_val, dtype=torch.float32).unsqueeze(1)
+        self.X_val = torch.from_numpy(self._scale_windows(X_val))
+        self.y_val = torch.from_numpy(np.asarray(y_val, dtype=np.float32)).unsqueeze(1)
 
         # DataLoaders
         self.train_loader = DataLoader(
@@ -111,6 +300,19 @@ class TrainerCore:
             shuffle=False
         )
 
+    # ------------------------------------------------------------
+    # Scaler aplicado às linhas únicas e re-janelado (uma passagem,
+    # sem materializar N × SEQ_LEN × F); janelas soltas: cópia escalada
+    # ------------------------------------------------------------
+    def _scale_windows(self, X):
+        rows = window_rows(X)
+        if rows is None:
+            flat = self.scaler.transform(X.reshape(-1, NUM_FEATURES))
+            return flat.astype(np.float32, copy=False).reshape(X.shape)
+
+        scaled = self.scaler.transform(rows).astype(np.float32, copy=False)
+        return windows(scaled, writeable=True)
+
     # ------------------------------------------------------------
     # Forward pass de validação
     # ------------------------------------------------------------
@@ -128,49 +330,132 @@ class TrainerCore:
         return float(np.mean(losses))
 
     # ------------------------------------------------------------
-    # Treinar PatchTST
+    # Uma época: autocast bf16 opcional + acumulação de gradiente
     # ------------------------------------------------------------
-    def train(self):
-        best_val = float("inf")
-        patience = 0
+    def train_epoch(self):
+        self.model.train()
+        self.optimizer.zero_grad()
+        batch_losses = []
+        n_batches = len(self.train_loader)
 
-        for epoch in range(EPOCHS):
-            self.model.train()
-            batch_losses = []
+        for step, (X_batch, y_batch) in enumerate(self.train_loader, start=1):
+            X_batch, y_batch = X_batch.to(device), y_batch.to(device)
 
-            for X_batch, y_batch in self.train_loader:
-                X_batch, y_batch = X_batch.to(device), y_batch.to(device)
+            with torch.autocast(device.type, dtype=torch.bfloat16, enabled=self.precision == "bf16"):
+                pred = self.forward_model(X_batch)
+            loss = self.criterion(pred.float(), y_batch)
 
-                self.optimizer.zero_grad()
-                pred = self.model(X_batch)
-                loss = self.criterion(pred, y_batch)
-                loss.backward()
+            # média sobre os batches do grupo (o último pode ser menor)
+            group_start = (step - 1) // self.accum_steps * self.accum_steps
+            (loss / min(self.accum_steps, n_batches - group_start)).backward()
+
+            # passo a cada accum_steps batches (e no último, se sobrar)
+            if step % self.accum_steps == 0 or step == n_batches:
                 self.optimizer.step()
+                self.optimizer.zero_grad()
+
+            batch_losses.append(loss.item())
 
-                batch_losses.append(loss.item())
+        return float(np.mean(batch_losses))
+
+    # ------------------------------------------------------------
+    # Treinar PatchTST
+    # ------------------------------------------------------------
+    def train(self, progress_cb=None, should_stop=None, epochs=None, patience_limit=None):
+        """
+        progress_cb(dict): chamado no fim de cada época (epoch, losses)
+        should_stop():     cancelamento cooperativo, verificado por época
+        Em warm start a referência é a val loss do modelo carregado:
+        só se grava se o fine-tune a melhorar.
+        Com resume() o ciclo continua na época seguinte à do checkpoint.
+        """
+        epochs = epochs or EPOCHS
+        patience_limit = patience_limit or EARLY_STOPPING_PATIENCE
+
+        if self.resume_state is not None:
+            state = self.resume_state
+            best_val, initial_val = state["best_val"], state["initial_val"]
+            improved, patience = state["improved"], state["patience"]
+            start_epoch = state["epoch"]
+        else:
+            best_val = self.validate() if self.warm_start else float("inf")
+            initial_val = best_val
+            improved = False
+            patience = 0
+            start_epoch = 0
+
+        epochs_run = start_epoch
+        cancelled = False
+
+        if self.warm_start and self.resume_state is None:
+            print(f"[Warm start] Val inicial={initial_val:.6f}")
+
+        def loop_state(epoch):
+            return {"epoch": epoch, "best_val": best_val, "initial_val": initial_val,
+                    "improved": improved, "patience": patience}
+
+        for epoch in range(start_epoch, epochs):
+            if should_stop is not None and should_stop():
+                cancelled = True
+                print("Treino cancelado.")
+                # retomável: guarda o estado após a última época completa
+                if self.persist:
+                    self.save_checkpoint(loop_state(epoch))
+                break
 
+            epochs_run = epoch + 1
+            train_loss = self.train_epoch()
             val_loss = self.validate()
 
-            print(f"[Epoch {epoch+1}/{EPOCHS}] "
-                  f"Train={np.mean(batch_losses):.6f}  Val={val_loss:.6f}")
+            print(f"[Epoch {epoch+1}/{epochs}] "
+                  f"Train={train_loss:.6f}  Val={val_loss:.6f}")
 
             # Early stopping
             if val_loss + EARLY_STOPPING_MIN_DELTA < best_val:
                 best_val = val_loss
+                improved = True
                 patience = 0
-                self.save()
+                if self.persist:
+                    self.save()
             else:
                 patience += 1
 
-            if patience >= EARLY_STOPPING_PATIENCE:
+            if progress_cb is not None:
+                progress_cb({
+                    "epoch": epoch + 1,
+                    "epochs": epochs,
+                    "train_loss": train_loss,
+                    "val_loss": val_loss,
+                    "best_val": best_val,
+                })
+
+            if patience >= patience_limit:
                 print("Early stopping.")
                 break
 
+            if self.persist and (epoch + 1) % CHECKPOINT_EVERY == 0:
+                self.save_checkpoint(loop_state(epoch + 1))
+
+        if self.persist and not cancelled:
+            self.clear_checkpoint()
+
+        exports = self.export() if self.persist and improved else {}
+
+        # sem melhoria o modelo fica, mas as barras novas já foram vistas
+        if self.persist and self.warm_start and not improved and not cancelled:
+            self._update_meta(last_bar_time=self.last_bar_time)
+
+        summary = {"best_val": best_val, "epochs": epochs_run, "cancelled": cancelled, "exports": exports}
+        if self.warm_start:
+            summary.update(initial_val=initial_val, improved=improved)
+        return summary
+
     # ------------------------------------------------------------
     # Guardar modelo + meta
     # ------------------------------------------------------------
     def save(self):
-        torch.save(self.model.state_dict(), self.model_path)
+        state = self.model.state_dict()
+        atomic_write(self.model_path, lambda f: torch.save(state, f))
 
         meta = {
             "symbol": self.symbol,
@@ -178,11 +463,46 @@ class TrainerCore:
             "seq_len": SEQ_LEN,
             "num_features": NUM_FEATURES,
             "model_type": "PatchTST",
+            "last_bar_time": self.last_bar_time,
+            "training": {
+                "mode": "incremental" if self.warm_start else "full",
+                "precision": self.precision,
+                "accum_steps": self.accum_steps,
+                "effective_batch": BATCH_SIZE * self.accum_steps,
+                "compiled": self.compiled,
+            },
         }
 
-        with open(self.meta_path, "w") as f:
-            json.dump(meta, f, indent=4)
+        atomic_write(self.meta_path, lambda f: json.dump(meta, f, indent=4), mode="w")
 
         print(f"✔ Modelo guardado: {self.model_path}")
         print(f"✔ Scaler guardado: {self.scaler_path}")
         print(f"✔ Meta guardado:   {self.meta_path}")
+
+    def _update_meta(self, **fields):
+        with open(self.meta_path, "r") as f:
+            meta = json.load(f)
+        meta.update(fields)
+        atomic_write(self.meta_path, lambda f: json.dump(meta, f, indent=4), mode="w")
+
+    # ------------------------------------------------------------
+    # Export para inferência (TorchScript / ONNX) do melhor checkpoint
+    # ------------------------------------------------------------
+    def export(self):
+        best = ModelCore().to(device)
+        best.load_state_dict(torch.load(self.model_path, map_location=device))
+
+        exports = export_model(best, self.model_path, device)
+        quant = quantization_report(best, self.X_val.numpy(), self.y_val.numpy())
+
+        self._update_meta(exports=exports, quantization=quant)
+
+        for backend, info in exports.items():
+            if "path" in info:
+                print(f"✔ Export {backend}: {info['path']} (max_abs_err={info['max_abs_err']:.2e})")
+            else:
+                print(f"✖ Export {backend}: {info['error']}")
+        print(f"✔ int8 vs fp32 (validação): mse {quant['val_mse_fp32']:.6f} → {quant['val_mse_int8']:.6f}, "
+              f"max_abs_delta={quant['max_abs_delta']:.2e}")
+
+        return exports
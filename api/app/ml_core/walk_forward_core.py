@@ -0,0 +1,279 @@
+# ============================================================
+#  WALK-FORWARD CORE — validação out-of-sample honesta
+#  - Splits walk-forward com purge / embargo (sem fuga de labels)
+#  - Folds avaliados em paralelo (process pool)
+#  - Matrizes pré-processadas por fold calculadas uma vez e
+#    partilhadas por todas as famílias de modelos
+# ============================================================
+
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.base import clone
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+from threadpoolctl import threadpool_limits
+
+from app import runtime
+
+from .config_core import WF_EMBARGO, WF_N_SPLITS
+
+
+# ============================================================
+#  Splits
+# ============================================================
+
+def purged_holdout(n_samples, val_frac=0.10, gap=0):
+    """
+    Split treino/validação cronológico com `gap` amostras descartadas
+    entre os dois blocos (janelas/labels do treino não tocam na validação).
+    """
+    n_val = max(1, int(round(n_samples * val_frac)))
+    val_start = n_samples - n_val
+    train_end = max(0, val_start - int(gap))
+    return np.arange(train_end), np.arange(val_start, n_samples)
+
+
+def purged_holdout_before(n_samples, n_train, val_frac=0.10, gap=0):
+    """
+    Treino = as `n_train` amostras mais recentes; validação = bloco
+    imediatamente anterior, `gap` amostras antes (fine-tune: as barras
+    novas ficam no treino). Sem amostras anteriores a validação vem vazia.
+    """
+    n_train = min(int(n_train), n_samples)
+    train_start = n_samples - n_train
+    val_end = max(0, train_start - int(gap))
+    n_val = min(val_end, max(1, int(round(n_train * val_frac))))
+    return np.arange(train_start, n_samples), np.arange(val_end - n_val, val_end)
+
+
+def walk_forward_splits(n_samples, n_splits=WF_N_SPLITS, purge=1, embargo=WF_EMBARGO,
+                        test_size=None, max_train=None):
+    """
+    Gera (train_idx, test_idx) em janela expansiva (ou rolante com max_train).
+
+    purge:   amostras removidas do fim do treino antes de cada fold de teste
+             (horizonte do label + lookback das janelas).
+    embargo: amostras após cada fold de teste que não entram no treino
+             dos folds seguintes.
+    """
+    n_splits = int(n_splits)
+    test_size = int(test_size or n_samples // (n_splits + 1))
+    if n_splits < 1 or test_size < 1:
+        raise ValueError("n_splits / test_size inválidos")
+
+    first_test = n_samples - n_splits * test_size
+    if first_test - purge < 1:
+        raise ValueError(
+            f"Amostras insuficientes ({n_samples}) para {n_splits} folds com purge={purge}"
+        )
+
+    excluded = np.zeros(n_samples, dtype=bool)
+
+    for k in range(n_splits):
+        test_start = first_test + k * test_size
+        test_end = test_start + test_size
+
+        train_end = test_start - int(purge)
+        train_mask = ~excluded[:train_end]
+        train_idx = np.flatnonzero(train_mask)
+        if max_train:
+            train_idx = train_idx[-int(max_train):]
+
+        yield train_idx, np.arange(test_start, test_end)
+
+        # embargo: barras logo após o teste ficam fora dos treinos seguintes
+        excluded[test_end:test_end + int(embargo)] = True
+
+
+# ============================================================
+#  Famílias de modelos (pré-processamento fica no cache por fold)
+# ============================================================
+
+def default_families(n_jobs=1):
+    return {
+        "logreg": LogisticRegression(max_iter=2000, class_weight="balanced"),
+        "rf": RandomForestClassifier(
+            n_estimators=300,
+            max_depth=6,
+            min_samples_leaf=3,
+            class_weight="balanced_subsample",
+            n_jobs=n_jobs,
+            random_state=42,
+        ),
+        "gbrt": GradientBoostingClassifier(
+            n_estimators=400,
+            learning_rate=0.03,
+            max_depth=2,
+            random_state=42,
+        ),
+    }
+
+
+def make_preprocessor():
+    """
+    Imputação + standardização. Árvores são invariantes a transformações
+    monótonas por coluna, por isso a mesma matriz serve todas as famílias.
+    """
+    return Pipeline([
+        ("imputer", SimpleImputer(strategy="median")),
+        ("scaler", StandardScaler()),
+    ])
+
+
+def make_pipeline(estimator):
+    return Pipeline(make_preprocessor().steps + [("clf", estimator)])
+
+
+# ============================================================
+#  Worker (processo do pool)
+# ============================================================
+
+_FOLDS = None
+
+
+def _init_worker(folds, n_threads):
+    # cache dos folds: enviado uma vez por processo, não por tarefa
+    global _FOLDS
+    _FOLDS = folds
+    # BLAS/OpenMP já carregados no import: limitar via threadpoolctl
+    threadpool_limits(n_threads)
+
+
+def _fit_fold(name, estimator, k, scorer):
+    return _score_fold(name, estimator, k, _FOLDS[k], scorer)
+
+
+def _score_fold(name, estimator, k, fold, scorer):
+    Xtr, ytr, Xte, yte = fold
+    est = clone(estimator).fit(Xtr, ytr)
+    pred = est.predict(Xte)
+
+    proba = None
+    if hasattr(est, "predict_proba") and len(getattr(est, "classes_", [])) == 2:
+        proba = est.predict_proba(Xte)[:, 1]
+
+    return name, k, float(scorer(yte, pred)), pred, proba
+
+
+# ============================================================
+#  WalkForwardCore
+# ============================================================
+
+class WalkForwardCore:
+
+    def __init__(self, n_splits=WF_N_SPLITS, purge=1, embargo=WF_EMBARGO,
+                 test_size=None, max_train=None, jobs=None, scorer=accuracy_score):
+        self.n_splits = n_splits
+        self.purge = purge
+        self.embargo = embargo
+        self.test_size = test_size
+        self.max_train = max_train
+        self.jobs = jobs
+        self.scorer = scorer
+
+    # ------------------------------------------------------------
+    def splits(self, n_samples):
+        return list(walk_forward_splits(
+            n_samples,
+            n_splits=self.n_splits,
+            purge=self.purge,
+            embargo=self.embargo,
+            test_size=self.test_size,
+            max_train=self.max_train,
+        ))
+
+    # ------------------------------------------------------------
+    # Cache: pré-processamento ajustado só no treino de cada fold
+    # ------------------------------------------------------------
+    def build_folds(self, X, y):
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y)
+
+        folds = []
+        for train_idx, test_idx in self.splits(X.shape[0]):
+            prep = make_preprocessor().fit(X[train_idx])
+            folds.append((
+                prep.transform(X[train_idx]),
+                y[train_idx],
+                prep.transform(X[test_idx]),
+                y[test_idx],
+            ))
+        return folds
+
+    # ------------------------------------------------------------
+    # Avaliação: famílias × folds em paralelo
+    # ------------------------------------------------------------
+    def evaluate(self, X, y, families=None):
+        families = families or default_families()
+        splits = self.splits(len(X))
+        folds = self.build_folds(X, y)
+        tasks = [(name, k) for name in families for k in range(len(folds))]
+
+        jobs = self.jobs or runtime.cpu_count()
+        jobs = max(1, min(int(jobs), len(tasks)))
+
+        if jobs == 1:
+            outputs = [
+                _score_fold(name, families[name], k, folds[k], self.scorer)
+                for name, k in tasks
+            ]
+        else:
+            # cada processo fica com cores/jobs threads (evita oversubscription)
+            n_threads = max(1, runtime.cpu_count() // jobs)
+            with ProcessPoolExecutor(
+                max_workers=jobs,
+                mp_context=mp.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(folds, n_threads),
+            ) as pool:
+                futures = [
+                    pool.submit(_fit_fold, name, families[name], k, self.scorer)
+                    for name, k in tasks
+                ]
+                outputs = [f.result() for f in futures]
+
+        return self._summarize(outputs, splits, families, len(X))
+
+    # ------------------------------------------------------------
+    def _summarize(self, outputs, splits, families, n_samples):
+        report = {}
+        for name in families:
+            scores = np.full(len(splits), np.nan)
+            oos_pred = np.full(n_samples, np.nan)
+            oos_proba = np.full(n_samples, np.nan)
+
+            for fam, k, score, pred, proba in outputs:
+                if fam != name:
+                    continue
+                test_idx = splits[k][1]
+                scores[k] = score
+                oos_pred[test_idx] = pred
+                if proba is not None:
+                    oos_proba[test_idx] = proba
+
+            report[name] = {
+                "fold_scores": scores.tolist(),
+                "mean": float(np.nanmean(scores)),
+                "std": float(np.nanstd(scores)),
+                "oos_pred": oos_pred,
+                "oos_proba": oos_proba,
+            }
+
+        best = max(report, key=lambda n: report[n]["mean"])
+
+        return {
+            "best": best,
+            "families": report,
+            "folds": [
+                {"train": int(len(tr)), "test_start": int(te[0]), "test_end": int(te[-1]) + 1}
+                for tr, te in splits
+            ],
+            "purge": int(self.purge),
+            "embargo": int(self.embargo),
+        }
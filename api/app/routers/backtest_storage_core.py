@@ -56,9 +56,11 @@ class BacktestStorageCore:
         if isinstance(obj, list):
             return [self._sanitize(v) for v in obj]
 
-        # numpy scalars
+        # numpy arrays / scalars
         try:
             import numpy as np
+            if isinstance(obj, np.ndarray):
+                return self._sanitize(obj.tolist())
             if isinstance(obj, (np.integer, np.int32, np.int64)):
                 return int(obj)
             if isinstance(obj, (np.floating, np.float32, np.float64)):
@@ -2,6 +2,8 @@ from fastapi import APIRouter
 import os
 import time
 
+from app import runtime
+
 router = APIRouter()
 
 START_TS = time.time()
@@ -17,7 +19,8 @@ def healthz():
             "YF_RANGE_60M": os.getenv("YF_RANGE_60M", "7d"),
             "YF_RANGE_SUBH": os.getenv("YF_RANGE_SUBH", "5d"),
             "INTRADAY_CACHE_TTL": int(os.getenv("INTRADAY_CACHE_TTL", "90")),
-        }
+        },
+        "runtime": runtime.report(),
     }
 
 @router.get("/readyz")
@@ -0,0 +1,104 @@
+# ============================================================
+# JOBS ROUTER — pipeline ML assíncrono nos workers Celery
+# (a API responde logo com o job_id; o treino corre no worker)
+# ============================================================
+
+from typing import Any, Dict
+
+from fastapi import APIRouter, HTTPException
+from pydantic import BaseModel, Field
+
+from app.services import jobs
+
+router = APIRouter(prefix="/jobs", tags=["JOBS"])
+
+# walk-forward: cada fold é um treino completo de cada família
+WF_MAX_SPLITS = 20
+
+
+# ------------------------------------------------------------
+# Request Models
+# ------------------------------------------------------------
+class JobRequest(BaseModel):
+    symbol: str = ""
+    symbols: list[str] | None = None
+    mode: str = "moderate"
+    fees_bps: float = 0.0
+    slippage_bps: float = 0.0
+    resume: bool = True
+    window: int | None = None
+    epochs: int | None = None
+    update_scaler: bool = False
+    n_splits: int = Field(default=5, ge=1, le=WF_MAX_SPLITS)
+    embargo: int = Field(default=0, ge=0)
+
+
+def job_kwargs(kind: str, req: JobRequest) -> Dict[str, Any]:
+    """
+    Argumentos da task Celery para cada tipo de job.
+    """
+    if kind == "train_global":
+        symbols = [s.strip().upper() for s in (req.symbols or []) if s.strip()]
+        if not symbols:
+            raise HTTPException(status_code=400, detail="train_global exige 'symbols'")
+        return {"symbols": symbols}
+
+    if not req.symbol.strip():
+        raise HTTPException(status_code=400, detail=f"{kind} exige 'symbol'")
+
+    kwargs: Dict[str, Any] = {"symbol": req.symbol.strip().upper()}
+    if kind in ("train", "full_pipeline"):
+        kwargs.update(resume=req.resume)
+    if kind == "finetune":
+        kwargs.update(window=req.window, epochs=req.epochs,
+                      update_scaler=req.update_scaler, resume=req.resume)
+    if kind in ("backtest", "full_pipeline"):
+        kwargs.update(mode=req.mode, fees_bps=req.fees_bps, slippage_bps=req.slippage_bps)
+    if kind == "walk_forward":
+        kwargs.update(n_splits=req.n_splits, embargo=req.embargo)
+    return kwargs
+
+
+def enqueue(kind: str, req: JobRequest) -> Dict[str, Any]:
+    job_id = jobs.submit(kind, **job_kwargs(kind, req))
+    return {"ok": True, "job_id": job_id, "kind": kind, **jobs.status(job_id)}
+
+
+# ------------------------------------------------------------
+# POST /jobs/{kind} — submete download | clean | train | finetune | train_global | backtest | walk_forward | full_pipeline
+# ------------------------------------------------------------
+@router.post("/{kind}")
+def submit_job(kind: str, req: JobRequest):
+    if kind not in jobs.JOB_KINDS:
+        raise HTTPException(status_code=404, detail=f"Tipo de job desconhecido: {kind}")
+
+    return enqueue(kind, req)
+
+
+# ------------------------------------------------------------
+# GET /jobs/{job_id} — estado + progresso (época, loss)
+# ------------------------------------------------------------
+@router.get("/{job_id}")
+def job_status(job_id: str):
+    return jobs.status(job_id)
+
+
+# ------------------------------------------------------------
+# GET /jobs/{job_id}/result
+# ------------------------------------------------------------
+@router.get("/{job_id}/result")
+def job_result(job_id: str):
+    st = jobs.status(job_id)
+    if st["state"] == "FAILURE":
+        raise HTTPException(status_code=500, detail=st["error"])
+    if st["state"] != "SUCCESS":
+        raise HTTPException(status_code=409, detail=f"Job ainda não terminou (estado: {st['state']})")
+    return {"ok": True, "job_id": job_id, "result": jobs.result(job_id)}
+
+
+# ------------------------------------------------------------
+# POST /jobs/{job_id}/cancel
+# ------------------------------------------------------------
+@router.post("/{job_id}/cancel")
+def cancel_job(job_id: str):
+    return jobs.cancel(job_id)
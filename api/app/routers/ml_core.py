@@ -4,23 +4,26 @@
 # ============================================================
 
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-import pandas as pd
+from pydantic import BaseModel, Field
+import numpy as np
 import os
 import traceback
 
-# DATA
-from app.routers.data_router import download_raw, clean_symbol
+# Jobs assíncronos (Celery)
+from app.routers.jobs import WF_MAX_SPLITS, JobRequest, enqueue
 
 # ML Core modules
-from app.ml_core.feature_engineer_core import FeatureEngineerCore
-from app.ml_core.dataset_builder_core import DatasetBuilderCore
 from app.ml_core.trainer_core import TrainerCore
-from app.ml_core.inference_core import InferenceCore
-from app.ml_core.backtester_core import BacktesterCore
+from app.ml_core.inference_core import InferenceCore, SignalEngineCore
+from app.ml_core.sweep_core import SweepCore, METRICS, MAX_SWEEP_THRESHOLDS
+from app.ml_core.pipeline_core import (
+    model_backtest as _model_backtest,
+    load_features,
+)
+from app.ml_core.global_inference_core import GlobalInferenceCore
 
 # Config
-from app.ml_core.config_core import SEQ_LEN, FEATURE_ORDER
+from app.ml_core.config_core import SEQ_LEN, FEATURE_ORDER, WF_EMBARGO, WF_N_SPLITS
 
 
 # ============================================================
@@ -44,6 +47,25 @@ os.makedirs(CLEAN_DIR, exist_ok=True)
 # ============================================================
 class TrainRequest(BaseModel):
     symbol: str
+    resume: bool = True
+
+
+class FinetuneRequest(BaseModel):
+    symbol: str
+    window: int | None = None
+    epochs: int | None = None
+    update_scaler: bool = False
+    resume: bool = True
+
+
+class GlobalTrainRequest(BaseModel):
+    symbols: list[str]
+
+
+class WalkForwardRequest(BaseModel):
+    symbol: str
+    n_splits: int = Field(default=WF_N_SPLITS, ge=1, le=WF_MAX_SPLITS)
+    embargo: int = Field(default=WF_EMBARGO, ge=0)
 
 
 # ============================================================
@@ -52,39 +74,53 @@ class TrainRequest(BaseModel):
 def _safe(name, fn):
     try:
         return fn()
+    except HTTPException:
+        raise
     except Exception as e:
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"{name} failed: {str(e)}")
 
 
+# ============================================================
+#  JOBS — treino corre nos workers Celery; a resposta traz o
+#  job_id (progresso / resultado / cancelamento em /jobs/{job_id})
+# ============================================================
+def _enqueue(kind, req: JobRequest):
+    return _safe(kind, lambda: enqueue(kind, req))
+
+
 # ============================================================
 #  TRAIN
 # ============================================================
 @router.post("/train")
 def train_model(req: TrainRequest):
-    def run():
-        symbol = req.symbol.upper()
-        clean_file = os.path.join(CLEAN_DIR, f"{symbol}_1H_clean.csv")
-
-        if not os.path.exists(clean_file):
-            raise FileNotFoundError(f"CLEAN dataset missing: {clean_file}")
+    return _enqueue("train", JobRequest(symbol=req.symbol, resume=req.resume))
 
-        df = pd.read_csv(clean_file, index_col=0)
-        df.index = pd.to_datetime(df.index)
 
-        fe = FeatureEngineerCore()
-        df_fe = fe.transform(df)
-
-        ds = DatasetBuilderCore()
-        X, y = ds.build(df_fe)
+# ============================================================
+#  CHECKPOINT (treino interrompido e retomável)
+# ============================================================
+@router.get("/checkpoint")
+def checkpoint(symbol: str):
+    def run():
+        info = TrainerCore(symbol.upper(), persist=False).checkpoint_info()
+        return {"ok": True, "symbol": symbol.upper(), "resumable": info is not None, "checkpoint": info}
 
-        trainer = TrainerCore(symbol)
-        trainer.load_data(X, y, X, y)
-        trainer.train()
+    return _safe("checkpoint", run)
 
-        return {"ok": True, "symbol": symbol, "samples": len(X)}
 
-    return _safe("train", run)
+# ============================================================
+#  FINE-TUNE INCREMENTAL (warm start do checkpoint existente)
+# ============================================================
+@router.post("/finetune")
+def finetune_model(req: FinetuneRequest):
+    return _enqueue("finetune", JobRequest(
+        symbol=req.symbol,
+        window=req.window,
+        epochs=req.epochs,
+        update_scaler=req.update_scaler,
+        resume=req.resume,
+    ))
 
 
 # ============================================================
@@ -94,16 +130,7 @@ def train_model(req: TrainRequest):
 def predict_model(symbol: str):
     def run():
         symbol_u = symbol.upper()
-        clean_file = os.path.join(CLEAN_DIR, f"{symbol_u}_1H_clean.csv")
-
-        if not os.path.exists(clean_file):
-            raise FileNotFoundError(f"CLEAN dataset missing: {clean_file}")
-
-        df = pd.read_csv(clean_file, index_col=0)
-        df.index = pd.to_datetime(df.index)
-
-        fe = FeatureEngineerCore()
-        df_fe = fe.transform(df)
+        df_fe = load_features(symbol_u)
 
         arr = df_fe[FEATURE_ORDER].values
         if len(arr) < SEQ_LEN:
@@ -114,83 +141,134 @@ def predict_model(symbol: str):
         infer = InferenceCore(symbol_u)
         out = infer.predict_with_signal(seq)
 
-        return {"ok": True, "symbol": symbol_u, **out}
+        return {"ok": True, "symbol": symbol_u, "backend": infer.backend, **out}
 
     return _safe("predict", run)
 
 
 # ============================================================
-#  BACKTEST
+#  MODELO GLOBAL (multi-símbolo, embedding por símbolo)
 # ============================================================
-@router.get("/backtest")
-def backtest(symbol: str):
+@router.post("/train_global")
+def train_global_model(req: GlobalTrainRequest):
+    return _enqueue("train_global", JobRequest(symbols=req.symbols))
+
+
+@router.get("/predict_global")
+def predict_global(symbols: str):
+    """
+    Previsão da última janela de cada símbolo num único forward.
+    """
     def run():
-        symbol_u = symbol.upper()
-        clean_file = os.path.join(CLEAN_DIR, f"{symbol_u}_1H_clean.csv")
+        names = [s.strip().upper() for s in symbols.split(",") if s.strip()]
+        seqs = {}
 
-        if not os.path.exists(clean_file):
-            raise FileNotFoundError(f"CLEAN dataset missing: {clean_file}")
+        for name in names:
+            arr = load_features(name)[FEATURE_ORDER].values
+            if len(arr) < SEQ_LEN:
+                raise ValueError(f"Not enough data for {name}.")
+            seqs[name] = arr[-SEQ_LEN:]
 
-        df = pd.read_csv(clean_file, index_col=0)
-        df.index = pd.to_datetime(df.index)
+        infer = GlobalInferenceCore()
+        preds = infer.predict_latest(seqs)
+        engine = SignalEngineCore()
 
-        bt = BacktesterCore(symbol_u)
-        result = bt.run(df)
+        out = {}
+        for name, value in preds.items():
+            signal, strength = engine.generate(value)
+            out[name] = {"predicted_return": value, "signal": signal, "signal_strength": strength}
 
-        return {"ok": True, "symbol": symbol_u, **result}
+        return {"ok": True, "model": infer.name, "predictions": out}
 
-    return _safe("backtest", run)
+    return _safe("predict_global", run)
 
 
 # ============================================================
-#  FULL PIPELINE
-#  Download → Clean → Train → Predict → Backtest
+#  BACKTEST (model-driven, vetorizado)
 # ============================================================
-@router.post("/full_pipeline")
-def full_pipeline(req: TrainRequest):
+@router.get("/backtest")
+def backtest(
+    symbol: str,
+    mode: str = "moderate",
+    fees_bps: float = 0.0,
+    slippage_bps: float = 0.0,
+):
     def run():
-        symbol = req.symbol.upper()
+        symbol_u = symbol.upper()
+        df_fe = load_features(symbol_u)
 
-        # 1) DOWNLOAD RAW
-        download_raw(req)
+        result = _model_backtest(symbol_u, df_fe, mode, fees_bps, slippage_bps)
 
-        # 2) CLEAN
-        clean_symbol(req)
+        return {"ok": True, "symbol": symbol_u, **result}
+
+    return _safe("backtest", run)
+
+
+# ============================================================
+#  SWEEP — thresholds × fees numa única passagem vetorizada
+#  (1 leitura de dados + 1 série de previsões)
+# ============================================================
+@router.get("/sweep")
+def sweep(
+    symbol: str,
+    thresholds: str = "0.0005:0.005:0.0005",
+    fees_bps: str = "0",
+    slippage_bps: float = 0.0,
+    metric: str = "expectancy",
+):
+    try:
+        t0, t1, step = [float(x) for x in thresholds.split(":")]
+        fee_list = [float(x) for x in fees_bps.split(",") if x.strip()]
+    except Exception:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Formato inválido: thresholds='{thresholds}' (esperado 'ini:fim:step'), "
+                   f"fees_bps='{fees_bps}' (esperado '0,5,10').",
+        )
+
+    if not (np.isfinite([t0, t1, step]).all() and step > 0 and t1 >= t0):
+        raise HTTPException(
+            status_code=400,
+            detail=f"thresholds='{thresholds}': valores finitos, step > 0 e fim >= ini.",
+        )
+    n_thr = int((t1 - t0) // step) + 1
+    if n_thr > MAX_SWEEP_THRESHOLDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"thresholds='{thresholds}' gera {n_thr} valores (máximo {MAX_SWEEP_THRESHOLDS}).",
+        )
+    if metric not in METRICS:
+        raise HTTPException(status_code=400, detail=f"metric inválida: {metric}. Aceites: {list(METRICS)}")
 
-        clean_file = os.path.join(CLEAN_DIR, f"{symbol}_1H_clean.csv")
-        if not os.path.exists(clean_file):
-            raise FileNotFoundError("CLEAN data not generated.")
+    def run():
+        symbol_u = symbol.upper()
+        df_fe = load_features(symbol_u)
 
-        df = pd.read_csv(clean_file, index_col=0)
-        df.index = pd.to_datetime(df.index)
+        infer = InferenceCore(symbol_u)
+        preds = infer.predict_series(df_fe[FEATURE_ORDER].values)
 
-        # 3) FEATURE ENGINEERING
-        fe = FeatureEngineerCore()
-        df_fe = fe.transform(df)
+        thr = np.arange(t0, t1 + 1e-12, step)
+        sc = SweepCore(df_fe["close"].values, preds)
+        result = sc.run(thr, fees_bps=fee_list or [0.0], slippage_bps=slippage_bps, metric=metric)
 
-        # 4) DATASET
-        ds = DatasetBuilderCore()
-        X, y = ds.build(df_fe)
+        return {"ok": True, "symbol": symbol_u, **result}
 
-        # 5) TRAIN
-        trainer = TrainerCore(symbol)
-        trainer.load_data(X, y, X, y)
-        trainer.train()
+    return _safe("sweep", run)
 
-        # 6) PREDICT snapshot
-        seq = df_fe[FEATURE_ORDER].values[-SEQ_LEN:]
-        infer = InferenceCore(symbol)
-        snapshot = infer.predict_with_signal(seq)
 
-        # 7) BACKTEST
-        bt = BacktesterCore(symbol)
-        backtest_result = bt.run(df)
+# ============================================================
+#  WALK-FORWARD (avaliação out-of-sample com purge/embargo)
+#  Features da barra t → direção do retorno seguinte (job Celery)
+# ============================================================
+@router.post("/walk_forward")
+def walk_forward(req: WalkForwardRequest):
+    return _enqueue("walk_forward", JobRequest(symbol=req.symbol, n_splits=req.n_splits, embargo=req.embargo))
 
-        return {
-            "ok": True,
-            "symbol": symbol,
-            "snapshot": snapshot,
-            "backtest": backtest_result
-        }
 
-    return _safe("full_pipeline", run)
+# ============================================================
+#  FULL PIPELINE
+#  Download → Clean → Train → Backtest (job Celery)
+# ============================================================
+@router.post("/full_pipeline")
+def full_pipeline(req: TrainRequest):
+    return _enqueue("full_pipeline", JobRequest(symbol=req.symbol, resume=req.resume))
@@ -1,6 +1,6 @@
 import logging
 import os
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from fastapi import APIRouter, HTTPException, Query
 from pydantic import BaseModel, Field, validator
@@ -14,15 +14,20 @@ from app.services.paper_db import (
     list_orders,
     list_positions,
     place_order,
+    place_orders,
     portfolio,
     reset_all,
     trigger_open_orders,
 )
-from app.services.policy import check_new_order, current_policy
+from app.services.policy import RiskEngine, check_new_order, current_policy, get_config, reload_config
+from app.services.last_price import get_bars
+from app.services import order_book  # noqa: F401  (matching das ordens abertas a cada quote)
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/paper", tags=["paper"])
 
+BATCH_MAX_ORDERS = int(os.getenv("PAPER_BATCH_MAX_ORDERS", "500"))
+
 # --------- Models ---------
 
 class NewOrder(BaseModel):
@@ -55,6 +60,10 @@ class NewOrder(BaseModel):
         return v
 
 
+class BatchOrders(BaseModel):
+    orders: List[NewOrder]
+
+
 class CancelResponse(BaseModel):
     ok: bool
     reason: Optional[str] = None
@@ -122,6 +131,52 @@ def create_order(body: NewOrder) -> Dict[str, Any]:
         raise HTTPException(status_code=500, detail={"error": "internal", "message": str(ex)})
 
 
+@router.post("/orders/batch")
+def create_orders_batch(body: BatchOrders) -> Dict[str, Any]:
+    """
+    Várias ordens num só pedido (ex.: rebalance): mesmas regras de /orders,
+    validadas contra um só snapshot de posições/preços e executadas numa
+    só transação. Resultado por ordem (results[i].index = posição no pedido).
+    """
+    if not body.orders:
+        raise HTTPException(status_code=422, detail={"error": "invalid", "message": "orders must not be empty"})
+    if len(body.orders) > BATCH_MAX_ORDERS:
+        raise HTTPException(
+            status_code=422,
+            detail={"error": "invalid", "message": f"at most {BATCH_MAX_ORDERS} orders per batch"},
+        )
+
+    try:
+        # resolve cada símbolo uma vez
+        resolved: Dict[Tuple[str, Optional[str], str], str] = {}
+        orders = []
+        for o in body.orders:
+            key = (o.symbol, o.exchange, o.provider or "yahoo")
+            if key not in resolved:
+                resolved[key] = resolve_symbol(*key)
+            orders.append({
+                "symbol": resolved[key],
+                "exchange": o.exchange,
+                "side": o.side,
+                "qty": o.qty,
+                "otype": o.type,
+                "price": o.price,
+                "limit_price": o.limit_price,
+                "stop_price": o.stop_price,
+            })
+
+        # um só snapshot de posições/preços; as ordens executadas atualizam-no
+        return place_orders(orders, risk=RiskEngine(get_config()))
+
+    except HTTPException:
+        raise
+    except ValueError as ve:
+        raise HTTPException(status_code=422, detail={"error": "invalid", "message": str(ve)})
+    except Exception as ex:
+        logger.exception("batch-order-failed")
+        raise HTTPException(status_code=500, detail={"error": "internal", "message": str(ex)})
+
+
 @router.get("/orders")
 def get_orders(status: Optional[str] = Query(default=None), limit: int = 50):
     if status and status not in ("open", "filled", "cancelled"):
@@ -162,9 +217,18 @@ def portfolio_view(mark_to_market: bool = True) -> Dict[str, Any]:
     return portfolio(mark_to_market=mark_to_market)
 
 
+@router.get("/prices")
+def prices(symbols: str = Query(..., description="Lista: ex. AAPL,MSFT")) -> Dict[str, Any]:
+    """Último preço por símbolo (cache em processo) com idade/staleness."""
+    syms = [x.strip() for x in symbols.split(",") if x.strip()]
+    return {"prices": get_bars(syms)}
+
+
 @router.get("/policy")
-def policy_view() -> Dict[str, Any]:
-    """Ver política atual (deriva do ambiente)."""
+def policy_view(reload: bool = False) -> Dict[str, Any]:
+    """Ver política atual (deriva do ambiente; reload=true relê as variáveis)."""
+    if reload:
+        reload_config()
     return {"policy": current_policy()}
 
 
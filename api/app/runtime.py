@@ -0,0 +1,202 @@
+# api/app/runtime.py
+# -------------------------------------------------------------
+# Gestão central de threads (torch, BLAS/OpenMP, sklearn)
+#
+# Cada processo fica com ~cores / nº de processos do seu papel:
+#   api    → uvicorn workers (WEB_CONCURRENCY)
+#   train  → CLIs de treino/backtest (1 processo, ou --jobs)
+#   worker → workers Celery (ML_WORKER_CONCURRENCY)
+#
+# API: o nº de workers tem de vir de WEB_CONCURRENCY (o uvicorn/gunicorn
+# também o lê como default de --workers). Com `--workers N` sem a
+# variável, cada worker assume que é o único e fica com todos os cores.
+#
+# Overrides: ML_TORCH_THREADS, ML_TORCH_INTEROP_THREADS, ML_SKLEARN_JOBS.
+# OMP_NUM_THREADS & cia. definidos pelo operador são respeitados.
+# -------------------------------------------------------------
+
+from __future__ import annotations
+
+import os
+import sys
+from typing import Any, Dict, List, Optional
+
+ROLES = ("api", "train", "worker")
+
+# env lido pelas libs nativas no arranque (só tem efeito antes do import)
+_THREAD_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+)
+
+# variáveis acima escritas por configure() (as restantes são do operador);
+# herdado pelos processos filhos
+_THREAD_ENV_MARK = "ML_RUNTIME_THREAD_ENV"
+
+_PROCS_ENV = {"api": "WEB_CONCURRENCY", "train": "ML_TRAIN_PROCS", "worker": "ML_WORKER_CONCURRENCY"}
+
+_STATE: Dict[str, Any] = {}
+
+
+def cpu_count() -> int:
+    """
+    Cores realmente disponíveis: afinidade do processo e quota do cgroup
+    (containers em nós partilhados), não os cores da máquina.
+    """
+    try:
+        n = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        n = os.cpu_count() or 1
+
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            n = min(n, max(1, int(int(quota) // int(period))))
+    except (OSError, ValueError):
+        pass
+
+    return max(1, n)
+
+
+def _env_int(name: str) -> Optional[int]:
+    raw = os.getenv(name, "").strip()
+    return int(raw) if raw.isdigit() and int(raw) > 0 else None
+
+
+def _own_thread_vars() -> List[str]:
+    return [v for v in os.getenv(_THREAD_ENV_MARK, "").split(",") if v]
+
+
+def _operator_blas_threads() -> Optional[int]:
+    # OMP_NUM_THREADS escrito por um configure() anterior não conta
+    if "OMP_NUM_THREADS" in _own_thread_vars():
+        return None
+    return _env_int("OMP_NUM_THREADS")
+
+
+def plan(role: Optional[str] = None, procs: Optional[int] = None) -> Dict[str, Any]:
+    name = (role or os.getenv("ML_RUNTIME_ROLE") or "api").lower()
+    if name not in ROLES:
+        raise ValueError(f"Papel inválido: {name}. Aceites: {list(ROLES)}")
+
+    cores = cpu_count()
+    procs = max(1, int(procs or _env_int(_PROCS_ENV[name]) or 1))
+    threads = _env_int("ML_TORCH_THREADS") or max(1, cores // procs)
+
+    # API: pedidos pequenos, paralelismo vem dos workers uvicorn → 1 interop
+    interop = _env_int("ML_TORCH_INTEROP_THREADS") or (1 if name == "api" else min(4, threads))
+
+    return {
+        "role": name,
+        "cores": cores,
+        "procs": procs,
+        "torch_threads": threads,
+        "torch_interop_threads": interop,
+        "blas_threads": _operator_blas_threads() or threads,
+        "sklearn_n_jobs": _env_int("ML_SKLEARN_JOBS") or threads,
+    }
+
+
+def configure(role: Optional[str] = None, procs: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Aplica o plano ao processo atual. Pode ser chamado de novo (ex.: processo
+    filho com outro nº de procs); o interop do torch só é aplicado uma vez.
+    """
+    cfg = plan(role, procs)
+    os.environ.update(_thread_env(cfg))
+
+    # BLAS/OpenMP já carregados (numpy, sklearn): limitar em runtime
+    try:
+        from threadpoolctl import threadpool_limits
+
+        _STATE["limiter"] = threadpool_limits(cfg["blas_threads"])
+    except ImportError:
+        pass
+
+    # torch só é configurado se já estiver carregado ou for carregado agora
+    # pelo chamador (evita importar torch em processos que não o usam)
+    if "torch" in sys.modules:
+        _configure_torch(cfg)
+
+    _STATE["plan"] = cfg
+    return cfg
+
+
+def _thread_env(cfg: Dict[str, Any]) -> Dict[str, str]:
+    n = str(cfg["blas_threads"])
+    env = {"ML_RUNTIME_ROLE": cfg["role"]}
+    # só as variáveis que não vêm do operador (as nossas são recalculadas)
+    own = _own_thread_vars()
+    for var in _THREAD_ENV_VARS:
+        if var in own or var not in os.environ:
+            env[var] = n
+            own.append(var)
+    env[_THREAD_ENV_MARK] = ",".join(sorted(set(own)))
+    return env
+
+
+def child_env(role: str, procs: int) -> Dict[str, str]:
+    """
+    Env para processos filhos (spawn) com o plano role/procs, sem alterar o
+    processo atual: lido pelas libs nativas do filho e pelo seu configure().
+    """
+    cfg = plan(role, procs)
+    env = _thread_env(cfg)
+    env[_PROCS_ENV[cfg["role"]]] = str(cfg["procs"])
+    return env
+
+
+def _configure_torch(cfg: Dict[str, Any]) -> None:
+    import torch
+
+    torch.set_num_threads(cfg["torch_threads"])
+    if not _STATE.get("interop_set"):
+        try:
+            torch.set_num_interop_threads(cfg["torch_interop_threads"])
+            _STATE["interop_set"] = True
+        except RuntimeError:
+            # já houve trabalho paralelo neste processo: não pode mudar
+            pass
+
+
+def ensure_configured() -> Dict[str, Any]:
+    """
+    Chamado pelos módulos que usam torch: aplica o plano do papel atual
+    (ML_RUNTIME_ROLE) se o processo ainda não foi configurado.
+    """
+    if "plan" not in _STATE:
+        return configure()
+    _configure_torch(_STATE["plan"])
+    return _STATE["plan"]
+
+
+def sklearn_n_jobs() -> int:
+    return (_STATE.get("plan") or plan())["sklearn_n_jobs"]
+
+
+def report() -> Dict[str, Any]:
+    cfg = dict(_STATE.get("plan") or plan())
+    cfg["configured"] = "plan" in _STATE
+
+    torch = sys.modules.get("torch")
+    if torch is not None:
+        cfg["torch_actual"] = {
+            "num_threads": torch.get_num_threads(),
+            "num_interop_threads": torch.get_num_interop_threads(),
+        }
+
+    try:
+        from threadpoolctl import threadpool_info
+
+        cfg["blas_actual"] = [
+            {"api": p.get("internal_api"), "num_threads": p.get("num_threads")}
+            for p in threadpool_info()
+        ]
+    except ImportError:
+        pass
+
+    return cfg
@@ -0,0 +1,318 @@
+# api/app/services/last_price.py
+from __future__ import annotations
+
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+from app.providers.prices import _INTRADAY_CACHE
+from app.services.dataset import _epoch, _normalize_ohlcv, _tf_to_yf
+
+# Último preço para o paper trading, em processo (sem HTTP ao próprio /dataset).
+# Ordem: cache local (TTL) -> cache de quotes intraday -> Yahoo (1h, depois 1d).
+
+# -------------------------------
+# Config
+# -------------------------------
+
+LAST_PRICE_TTL = float(os.getenv("LAST_PRICE_TTL", "60"))  # segundos
+
+# período curto: só interessa a última barra
+FETCH_PERIOD = {"1h": "5d", "1d": "1mo"}
+
+# barra mais antiga do que isto => stale (fins de semana/feriados incluídos)
+STALE_AFTER = {
+    "1h": float(os.getenv("LAST_PRICE_STALE_1H", str(6 * 3600))),
+    "1d": float(os.getenv("LAST_PRICE_STALE_1D", str(4 * 86400))),
+}
+
+TFS = ("1h", "1d")
+
+_LOCK = threading.Lock()
+# {(SYMBOL, tf): bar}; bar = {"symbol","tf","time","open","high","low","close","source","fetched_at"}
+_CACHE: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+# callbacks (symbol, bar) chamados a cada barra nova (ex.: order_book)
+_LISTENERS: List[Callable[[str, Dict[str, Any]], None]] = []
+
+# -------------------------------
+# Helpers
+# -------------------------------
+
+def symbol_key(symbol: str) -> str:
+    """
+    Símbolo normalizado: chave dos dicts devolvidos por get_bars/get_last_prices.
+    """
+    return symbol.strip().upper()
+
+def _tfs(tf: Optional[str]) -> Tuple[str, ...]:
+    # None: 1h com fallback para 1d
+    if tf is None:
+        return TFS
+    t = tf.lower()
+    return ("1h",) if t in ("1h", "60m") else (t,)
+
+def _with_staleness(bar: Dict[str, Any], now: Optional[float] = None) -> Dict[str, Any]:
+    now = time.time() if now is None else now
+    age = max(0.0, now - float(bar["time"]))
+    return {
+        **bar,
+        "age_s": age,
+        "cache_age_s": max(0.0, now - float(bar["fetched_at"])),
+        "stale": age > STALE_AFTER.get(bar["tf"], STALE_AFTER["1h"]),
+    }
+
+def _from_quote_cache(symbol: str) -> Optional[Dict[str, Any]]:
+    """
+    Reaproveita candles 1h já em memória (providers.prices), se frescos.
+    """
+    hit = _INTRADAY_CACHE.get(symbol, "1h")
+    if not hit:
+        return None
+    candles, src = hit
+    if not candles:
+        return None
+    c = candles[-1]
+    return {
+        "symbol": symbol_key(symbol),
+        "tf": "1h",
+        "time": int(c["time"]),
+        "open": float(c["open"]),
+        "high": float(c["high"]),
+        "low": float(c["low"]),
+        "close": float(c["close"]),
+        "source": src,
+        "fetched_at": time.time(),
+    }
+
+def _bar_from_frame(symbol: str, tf: str, df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+    if df is None or df.empty:
+        return None
+    df = _normalize_ohlcv(df)
+    if "close" not in df.columns:
+        return None
+    df = df.dropna(subset=["close"])
+    if df.empty:
+        return None
+
+    ts = df.index[-1]
+    row = df.iloc[-1]
+    close = float(row["close"])
+
+    def _px(col: str) -> float:
+        v = row.get(col)
+        return close if v is None or pd.isna(v) else float(v)
+
+    return {
+        "symbol": symbol_key(symbol),
+        "tf": tf,
+        "time": _epoch(ts),
+        "open": _px("open"),
+        "high": _px("high"),
+        "low": _px("low"),
+        "close": close,
+        "source": "yahoo",
+        "fetched_at": time.time(),
+    }
+
+def _fetch_yahoo(symbols: List[str], tf: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Uma única chamada multi-ticker ao Yahoo para todos os símbolos.
+    """
+    interval, _period = _tf_to_yf(tf)
+    try:
+        df = yf.download(
+            tickers=symbols,
+            period=FETCH_PERIOD.get(tf, "5d"),
+            interval=interval,
+            group_by="ticker",
+            auto_adjust=False,
+            prepost=False,
+            progress=False,
+            threads=False,
+        )
+    except Exception:
+        return {}
+    if df is None or df.empty:
+        return {}
+
+    out: Dict[str, Dict[str, Any]] = {}
+    multi = isinstance(df.columns, pd.MultiIndex)
+    tickers = set(df.columns.get_level_values(0)) if multi else set()
+    for sym in symbols:
+        if multi:
+            if sym not in tickers:
+                continue
+            sub = df[sym]
+        elif len(symbols) == 1:
+            sub = df
+        else:
+            continue
+        bar = _bar_from_frame(sym, tf, sub)
+        if bar is not None:
+            out[sym] = bar
+    return out
+
+def _fetch_many(symbols: List[str], tf: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Misses: cache de quotes intraday, depois um download por tf (1h -> 1d).
+    """
+    tfs = _tfs(tf)
+    found: Dict[str, Dict[str, Any]] = {}
+    if tfs[0] == "1h":
+        for sym in symbols:
+            bar = _from_quote_cache(sym)
+            if bar is not None:
+                found[sym] = bar
+    for t in tfs:
+        todo = [s for s in symbols if s not in found]
+        if not todo:
+            break
+        found.update(_fetch_yahoo(todo, t))
+    return found
+
+def _cached(symbol: str, max_age: float, tf: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    now = time.time()
+    for t in _tfs(tf):
+        bar = _CACHE.get((symbol_key(symbol), t))
+        if bar is not None and now - bar["fetched_at"] <= max_age:
+            return bar
+    return None
+
+def _store(bar: Dict[str, Any]) -> None:
+    key = (bar["symbol"], bar["tf"])
+    with _LOCK:
+        prev = _CACHE.get(key)
+        _CACHE[key] = bar
+    # notifica só barras novas/alteradas (não um simples refresh do TTL)
+    if prev is None or any(prev[k] != bar[k] for k in ("time", "high", "low", "close")):
+        for fn in list(_LISTENERS):
+            fn(bar["symbol"], bar)
+
+# -------------------------------
+# API
+# -------------------------------
+
+def get_bar(symbol: str, tf: Optional[str] = None, max_age: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """
+    Última barra conhecida (time/open/high/low/close) com metadados de staleness:
+    age_s (idade da barra), cache_age_s (idade do fetch), stale, tf, source.
+    tf=None: 1h, com fallback para 1d.
+    """
+    max_age = LAST_PRICE_TTL if max_age is None else max_age
+    bar = _cached(symbol, max_age, tf)
+    if bar is None:
+        bar = _fetch_many([symbol_key(symbol)], tf).get(symbol_key(symbol))
+        if bar is None:
+            return None
+        _store(bar)
+    return _with_staleness(bar)
+
+def get_bars(symbols: Iterable[str], tf: Optional[str] = None, max_age: Optional[float] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Lookup em lote: hits da cache direto, misses num único download
+    multi-ticker por tf. Devolve {SYMBOL: bar | None}.
+    """
+    max_age = LAST_PRICE_TTL if max_age is None else max_age
+    keys = list(dict.fromkeys(symbol_key(s) for s in symbols))
+    out: Dict[str, Optional[Dict[str, Any]]] = {}
+    misses: List[str] = []
+    for k in keys:
+        bar = _cached(k, max_age, tf)
+        if bar is None:
+            misses.append(k)
+        else:
+            out[k] = bar
+
+    if misses:
+        fetched = _fetch_many(misses, tf)
+        for k in misses:
+            bar = fetched.get(k)
+            if bar is not None:
+                _store(bar)
+            out[k] = bar
+
+    now = time.time()
+    res: Dict[str, Optional[Dict[str, Any]]] = {}
+    for k in keys:
+        bar = out[k]
+        res[k] = None if bar is None else _with_staleness(bar, now)
+    return res
+
+def get_last_price(symbol: str, tf: Optional[str] = None, max_age: Optional[float] = None) -> Tuple[Optional[float], Optional[str]]:
+    """
+    Compatível com paper_db.get_last_price: (preço, tf usada) ou (None, None).
+    """
+    bar = get_bar(symbol, tf=tf, max_age=max_age)
+    if bar is None:
+        return None, None
+    return bar["close"], bar["tf"]
+
+def get_last_prices(symbols: Iterable[str], tf: Optional[str] = None, max_age: Optional[float] = None) -> Dict[str, Tuple[Optional[float], Optional[str]]]:
+    bars = get_bars(symbols, tf=tf, max_age=max_age)
+    return {k: ((b["close"], b["tf"]) if b is not None else (None, None)) for k, b in bars.items()}
+
+def put_bar(symbol: str, bar: Dict[str, Any], tf: str = "1h", source: str = "push") -> Dict[str, Any]:
+    """
+    Injeta uma barra recebida de fora (stream de quotes, replay).
+    bar: dict com time (epoch s) e close; open/high/low opcionais.
+    """
+    close = float(bar["close"])
+    item = {
+        "symbol": symbol_key(symbol),
+        "tf": _tfs(tf)[0],
+        "time": int(bar["time"]),
+        "open": float(bar.get("open", close)),
+        "high": float(bar.get("high", close)),
+        "low": float(bar.get("low", close)),
+        "close": close,
+        "source": source,
+        "fetched_at": time.time(),
+    }
+    _store(item)
+    return _with_staleness(item)
+
+def mark_to_market(
+    positions: List[Dict[str, Any]],
+    tf: Optional[str] = None,
+    max_age: Optional[float] = None,
+) -> Tuple[np.ndarray, List[Optional[str]], np.ndarray]:
+    """
+    MTM em lote: um só lookup de preços para todas as posições e
+    PnL não realizado num passe vetorizado.
+    positions: [{"symbol", "qty", "avg_price"}]
+    Devolve (last[N] (NaN sem preço), tf[N] (None sem preço), unrealized[N] (0 sem preço)).
+    """
+    if not positions:
+        return np.empty(0), [], np.empty(0)
+
+    bars = get_bars([p["symbol"] for p in positions], tf=tf, max_age=max_age)
+    picked = [bars.get(symbol_key(p["symbol"])) for p in positions]
+
+    qty = np.fromiter((float(p["qty"]) for p in positions), dtype=np.float64, count=len(positions))
+    avg = np.fromiter((float(p["avg_price"]) for p in positions), dtype=np.float64, count=len(positions))
+    last = np.fromiter((np.nan if b is None else b["close"] for b in picked), dtype=np.float64, count=len(positions))
+
+    unreal = np.where(np.isnan(last), 0.0, qty * (last - avg))
+    return last, [None if b is None else b["tf"] for b in picked], unreal
+
+def subscribe(fn: Callable[[str, Dict[str, Any]], None]) -> None:
+    if fn not in _LISTENERS:
+        _LISTENERS.append(fn)
+
+def unsubscribe(fn: Callable[[str, Dict[str, Any]], None]) -> None:
+    if fn in _LISTENERS:
+        _LISTENERS.remove(fn)
+
+def invalidate(symbol: Optional[str] = None) -> None:
+    with _LOCK:
+        if symbol is None:
+            _CACHE.clear()
+        else:
+            for k in [k for k in _CACHE if k[0] == symbol_key(symbol)]:
+                _CACHE.pop(k, None)
@@ -0,0 +1,268 @@
+# api/app/services/order_book.py
+from __future__ import annotations
+
+import logging
+import math
+import os
+import sqlite3
+import threading
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services import last_price, paper_db
+
+logger = logging.getLogger(__name__)
+
+# Livro de ordens abertas (limit/stop) do paper_db, por símbolo e por preço.
+# Cada barra/quote só toca nas ordens cujo gatilho foi cruzado pelo low/high:
+# custo proporcional às ordens cruzadas, não ao total de ordens abertas.
+#
+# Sem look-ahead: open/low/high de uma barra só valem para ordens criadas
+# até ao início dela. Uma ordem criada a meio da barra só vê o close
+# (quote obtido depois da ordem) e é executada a esse preço.
+
+# -------------------------------
+# Config
+# -------------------------------
+
+# matching automático a cada barra nova vista por services.last_price
+MATCH_ON_QUOTES = os.getenv("PAPER_MATCH_ON_QUOTES", "1") == "1"
+
+# duração da barra: ordens criadas depois do fecho da barra ignoram-na
+TF_SECONDS = {"1h": 3600, "1d": 86400}
+
+# gatilho "preço desce até X" (low <= X) vs "preço sobe até X" (high >= X)
+LOW_TRIGGERED = ("buy_limit", "sell_stop")
+HIGH_TRIGGERED = ("sell_limit", "buy_stop")
+KINDS = LOW_TRIGGERED + HIGH_TRIGGERED
+
+_SQL_OPEN_SINCE = (
+    "SELECT id, ts, symbol, side, type, limit_price, stop_price FROM orders "
+    "WHERE status='open' AND id > ? ORDER BY id"
+)
+
+# -------------------------------
+# Helpers
+# -------------------------------
+
+def _kind(side: str, otype: str) -> Optional[str]:
+    k = f"{side}_{otype}"
+    return k if k in KINDS else None
+
+def _fill_price(kind: str, trigger: float, bar_open: float) -> float:
+    """
+    Limit: preço limite (ou a abertura, se abriu já melhor).
+    Stop:  preço stop (ou a abertura, se abriu já além do stop — gap).
+    """
+    if kind == "buy_limit":
+        return min(trigger, bar_open)
+    if kind == "sell_limit":
+        return max(trigger, bar_open)
+    if kind == "buy_stop":
+        return max(trigger, bar_open)
+    return min(trigger, bar_open)  # sell_stop
+
+def _close_crossed(kind: str, trigger: float, close: float) -> bool:
+    if kind in LOW_TRIGGERED:
+        return close <= trigger
+    return close >= trigger
+
+# -------------------------------
+# Livro por símbolo
+# -------------------------------
+
+class SymbolBook:
+    """
+    Quatro listas ordenadas [(trigger, order_id)], uma por tipo de gatilho.
+    """
+
+    def __init__(self) -> None:
+        self.levels: Dict[str, List[Tuple[float, int]]] = {k: [] for k in KINDS}
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self.levels.values())
+
+    def add(self, kind: str, trigger: float, order_id: int) -> None:
+        insort(self.levels[kind], (trigger, order_id))
+
+    def remove(self, kind: str, trigger: float, order_id: int) -> None:
+        lst = self.levels[kind]
+        i = bisect_left(lst, (trigger, order_id))
+        if i < len(lst) and lst[i] == (trigger, order_id):
+            del lst[i]
+
+    def crossed(self, low: float, high: float) -> List[Tuple[str, float, int]]:
+        out: List[Tuple[str, float, int]] = []
+        for kind in LOW_TRIGGERED:
+            lst = self.levels[kind]
+            # triggers >= low
+            out.extend((kind, p, oid) for p, oid in lst[bisect_left(lst, (low,)):])
+        for kind in HIGH_TRIGGERED:
+            lst = self.levels[kind]
+            # triggers <= high
+            out.extend((kind, p, oid) for p, oid in lst[:bisect_right(lst, (high, math.inf))])
+        return out
+
+# -------------------------------
+# Livro do processo
+# -------------------------------
+
+class OrderBook:
+    """
+    Índice em memória das ordens 'open' de uma PaperDB.
+    A base continua a ser a fonte de verdade: sync() acrescenta ordens novas
+    (id > último visto, inclusive de outros processos) e o fill revalida o
+    estado na transação (canceladas noutro lado saem do livro nessa altura).
+    """
+
+    def __init__(self, db: paper_db.PaperDB) -> None:
+        self.db = db
+        self.books: Dict[str, SymbolBook] = {}
+        # order_id -> (symbol, kind, trigger, ts)
+        self.orders: Dict[int, Tuple[str, str, float, int]] = {}
+        self.max_id = 0
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.orders)
+
+    def symbols(self) -> List[str]:
+        with self._lock:
+            return [s for s, b in self.books.items() if len(b)]
+
+    def has_orders(self, symbol: str) -> bool:
+        with self._lock:
+            book = self.books.get(last_price.symbol_key(symbol))
+            return book is not None and len(book) > 0
+
+    # ---------- índice ----------
+    def add(self, order: Any) -> None:
+        kind = _kind(order["side"], order["type"])
+        trigger = order["limit_price"] if order["type"] == "limit" else order["stop_price"]
+        oid = int(order["id"])
+        with self._lock:
+            self.max_id = max(self.max_id, oid)
+            if kind is None or trigger is None or oid in self.orders:
+                return
+            symbol = last_price.symbol_key(order["symbol"])
+            self.books.setdefault(symbol, SymbolBook()).add(kind, float(trigger), oid)
+            self.orders[oid] = (symbol, kind, float(trigger), int(order["ts"]))
+
+    def remove(self, order_id: int) -> None:
+        with self._lock:
+            entry = self.orders.pop(int(order_id), None)
+            if entry is not None:
+                symbol, kind, trigger, _ts = entry
+                self.books[symbol].remove(kind, trigger, int(order_id))
+
+    def sync(self, conn: sqlite3.Connection) -> int:
+        rows = conn.execute(_SQL_OPEN_SINCE, (self.max_id,)).fetchall()
+        for r in rows:
+            self.add(r)
+        return len(rows)
+
+    # ---------- matching ----------
+    def candidates(self, symbol: str, bar: Dict[str, Any]) -> List[Tuple[int, float]]:
+        """
+        Ordens cruzadas pela barra: [(order_id, fill_price)] por ordem de chegada.
+        Ordem anterior à barra: low/high, gap pela abertura. Ordem a meio da
+        barra: só o close, se obtido depois da ordem (fetched_at; sem ele,
+        o close conta como visto no fecho da barra).
+        """
+        close = float(bar["close"])
+        low = min(float(bar.get("low", close)), close)
+        high = max(float(bar.get("high", close)), close)
+        bar_open = float(bar.get("open", close))
+        bar_time = int(bar["time"])
+        bar_end = bar_time + TF_SECONDS.get(bar.get("tf", "1h"), 0)
+        seen_at = float(bar.get("fetched_at", bar_end))
+
+        with self._lock:
+            book = self.books.get(last_price.symbol_key(symbol))
+            if book is None:
+                return []
+            hits = []
+            for kind, trigger, oid in book.crossed(low, high):
+                created = self.orders[oid][3]
+                if created <= bar_time:
+                    hits.append((oid, _fill_price(kind, trigger, bar_open)))
+                elif created < bar_end and created <= seen_at and _close_crossed(kind, trigger, close):
+                    hits.append((oid, close))
+        hits.sort()
+        return hits
+
+    def on_bar(self, symbol: str, bar: Dict[str, Any], ts: Optional[int] = None) -> List[int]:
+        """
+        Aplica uma barra/quote: fills das ordens cruzadas numa só transação.
+        ts: relógio dos fills (replay); None => agora.
+        """
+        filled: List[int] = []
+        with self.db.connection() as conn:
+            self.sync(conn)
+        hits = self.candidates(symbol, bar)
+        if not hits:
+            return filled
+
+        # fill revalida o estado de cada ordem dentro da transação
+        with self.db.transaction() as conn:
+            for oid, price in hits:
+                if paper_db._apply_fill(conn, oid, price, ts) is not None:
+                    filled.append(oid)
+        # só depois do COMMIT
+        for oid, _price in hits:
+            self.remove(oid)
+        return filled
+
+    def match(self, bars: Dict[str, Optional[Dict[str, Any]]]) -> List[int]:
+        filled: List[int] = []
+        for symbol, bar in bars.items():
+            if bar is not None:
+                filled.extend(self.on_bar(symbol, bar))
+        return filled
+
+
+_BOOK: Optional[OrderBook] = None
+_BOOK_LOCK = threading.Lock()
+
+def get_book() -> OrderBook:
+    """
+    Livro da PaperDB atual do processo (recarregado das ordens abertas).
+    """
+    global _BOOK
+    db = paper_db.get_db()
+    if _BOOK is None or _BOOK.db is not db:
+        with _BOOK_LOCK:
+            if _BOOK is None or _BOOK.db is not db:
+                book = OrderBook(db)
+                with db.connection() as conn:
+                    book.sync(conn)
+                _BOOK = book
+    return _BOOK
+
+def trigger_open_orders() -> Dict[str, Any]:
+    """
+    Matching manual: última barra (em lote) de cada símbolo com ordens abertas.
+    """
+    book = get_book()
+    with book.db.connection() as conn:
+        book.sync(conn)
+    filled = book.match(last_price.get_bars(book.symbols()))
+    return {"filled": filled, "count": len(filled)}
+
+# -------------------------------
+# Subscrição de quotes
+# -------------------------------
+
+def _on_quote(symbol: str, bar: Dict[str, Any]) -> None:
+    try:
+        book = get_book()
+        if book.has_orders(symbol):
+            book.on_bar(symbol, bar)
+    except Exception:
+        logger.exception("order-book-match-failed")
+
+def subscribe() -> None:
+    last_price.subscribe(_on_quote)
+
+if MATCH_ON_QUOTES:
+    subscribe()
@@ -1,26 +1,133 @@
 import os
+import queue
 import time
 import sqlite3
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Mapping, Optional, Set, Tuple, Union
 
-import requests
+from app.services import last_price
+
+if TYPE_CHECKING:
+    from app.services.policy import RiskEngine
 
 DB_PATH = os.getenv("PAPER_DB_PATH", "/app/data/paper.db")
-INTERNAL_BASE_URL = os.getenv("INTERNAL_BASE_URL", "http://localhost:8000")
 STARTING_CASH = float(os.getenv("PAPER_STARTING_CASH", "100000"))  # cash inicial
+POOL_SIZE = int(os.getenv("PAPER_DB_POOL_SIZE", "4"))  # ligações por processo
+BUSY_TIMEOUT_MS = int(os.getenv("PAPER_DB_BUSY_TIMEOUT_MS", "5000"))
 
 # ----------------------------
-# DB helpers
+# Pool de ligações (por processo)
 # ----------------------------
 
-def _conn() -> sqlite3.Connection:
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH, isolation_level=None)  # autocommit
-    conn.row_factory = sqlite3.Row
-    _ensure_schema(conn)
-    return conn
+class PaperDB:
+    """
+    Pool de ligações SQLite a uma base paper (WAL, migrações na abertura).
+    ":memory:" usa uma única ligação partilhada (simulação / replay).
+    """
+
+    def __init__(self, path: str = DB_PATH, size: int = POOL_SIZE):
+        self.path = path
+        self.memory = path == ":memory:"
+        self.size = 1 if self.memory else max(1, int(size))
+        self.pid = os.getpid()
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+        if not self.memory:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+        # schema/migrações uma única vez, antes de servir ligações
+        conn = self._open()
+        migrate(conn)
+        self._idle.put(conn)
+
+    def _open(self) -> sqlite3.Connection:
+        # autocommit: as transações são explícitas (transaction())
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False, cached_statements=256)
+        conn.row_factory = sqlite3.Row
+        conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        if not self.memory:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        self._created += 1
+        return conn
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                fresh = self._open() if self._created < self.size else None
+            if fresh is not None:
+                conn = fresh
+            else:
+                try:
+                    conn = self._idle.get(timeout=BUSY_TIMEOUT_MS / 1000)
+                except queue.Empty:
+                    raise sqlite3.OperationalError("paper db pool exhausted")
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        BEGIN IMMEDIATE ... COMMIT (ROLLBACK em erro): ordem + posição + caixa atómicos.
+        """
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            conn.execute("COMMIT")
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+        self._created = 0
+
+
+_DB: Optional[PaperDB] = None
+_DB_LOCK = threading.Lock()
+
+def get_db() -> PaperDB:
+    """
+    Pool do processo atual (recriado após fork: workers Celery / uvicorn).
+    """
+    global _DB
+    if _DB is None or _DB.pid != os.getpid():
+        with _DB_LOCK:
+            if _DB is None or _DB.pid != os.getpid():
+                _DB = PaperDB(DB_PATH)
+    return _DB
+
+def init_db(path: Optional[str] = None) -> PaperDB:
+    """
+    Abre (ou troca) a base do processo e corre as migrações pendentes.
+    """
+    global _DB
+    with _DB_LOCK:
+        if _DB is not None and _DB.pid == os.getpid():
+            _DB.close()
+        _DB = PaperDB(path or DB_PATH)
+    return _DB
+
+# ----------------------------
+# Schema / migrações (PRAGMA user_version)
+# ----------------------------
 
-def _ensure_schema(conn: sqlite3.Connection) -> None:
+def _m001_base_schema(conn: sqlite3.Connection) -> None:
     cur = conn.cursor()
 
     # positions
@@ -98,6 +205,7 @@ def _ensure_schema(conn: sqlite3.Connection) -> None:
         )
 
 def _migrate_orders_nullable_price(conn: sqlite3.Connection) -> None:
+    # corre dentro da transação da migração
     cur = conn.cursor()
     cur.execute(
         """
@@ -145,136 +253,188 @@ def _migrate_orders_nullable_price(conn: sqlite3.Connection) -> None:
         FROM orders
         ORDER BY id
     """
-    conn.execute("BEGIN")
-    try:
-        cur.execute(f"INSERT INTO orders_new SELECT * FROM ({select_sql})")
-        cur.execute("DROP TABLE orders")
-        cur.execute("ALTER TABLE orders_new RENAME TO orders")
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
+    cur.execute(f"INSERT INTO orders_new SELECT * FROM ({select_sql})")
+    cur.execute("DROP TABLE orders")
+    cur.execute("ALTER TABLE orders_new RENAME TO orders")
+
+def _m002_symbol_pnl(conn: sqlite3.Connection) -> None:
+    # ledger por símbolo: PnL realizado e custo médio mantidos a cada fill
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS symbol_pnl (
+            symbol TEXT PRIMARY KEY,
+            qty REAL NOT NULL,
+            avg_cost REAL NOT NULL,
+            realized_pnl REAL NOT NULL,
+            fills INTEGER NOT NULL,
+            updated_ts INTEGER NOT NULL
+        )
+        """
+    )
+    # ordem dos fills por símbolo (um limit pode executar depois de ordens mais recentes)
+    cols = {r["name"] for r in conn.execute("PRAGMA table_info(orders)").fetchall()}
+    if "fill_seq" not in cols:
+        conn.execute("ALTER TABLE orders ADD COLUMN fill_seq INTEGER")
+    _write_ledger(conn, replay_ledger(conn), assign_seq=True)
+
+# índices de orders (nomes usados em cli/paper_query_bench para validar os planos)
+ORDER_INDEXES = {
+    # status=? ORDER BY id (o rowid vai no índice): listagem por estado e sync das 'open'
+    "ix_orders_status": "orders(status)",
+    # histórico 'filled' de um símbolo por ts (replay por símbolo)
+    "ix_orders_symbol_status_ts": "orders(symbol, status, ts)",
+    # cobre a listagem de 'filled' por ts (portfolio) sem ir à tabela
+    "ix_orders_status_ts_cover": "orders(status, ts, id, symbol, side, qty, price, value)",
+}
+
+def _m003_order_indexes(conn: sqlite3.Connection) -> None:
+    for name, target in ORDER_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+    # estatísticas para o planner (tabelas grandes, status com poucos valores)
+    conn.execute("ANALYZE orders")
+
+# ordem de aplicação = versão do schema (nunca reordenar, só acrescentar)
+MIGRATIONS: List[Callable[[sqlite3.Connection], None]] = [
+    _m001_base_schema,
+    _m002_symbol_pnl,
+    _m003_order_indexes,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Aplica as migrações em falta, cada uma na sua transação.
+    A versão é relida sob o lock de escrita (vários processos a arrancar).
+    """
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = int(conn.execute("PRAGMA user_version").fetchone()[0])
+            if version >= SCHEMA_VERSION:
+                conn.execute("COMMIT")
+                return version
+            MIGRATIONS[version](conn)
+            conn.execute(f"PRAGMA user_version={version + 1}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.execute("COMMIT")
 
 def reset_all() -> None:
     # Só se DEBUG=1
     if not (os.getenv("DEBUG") in ("1", "true", "True")):
         raise PermissionError("reset requires DEBUG=1")
-    with _conn() as conn:
+    with get_db().transaction() as conn:
         cur = conn.cursor()
         cur.execute("DELETE FROM orders")
         cur.execute("DELETE FROM positions")
+        cur.execute("DELETE FROM symbol_pnl")
         cur.execute(
             "UPDATE portfolio SET cash=?, realized_pnl=0.0 WHERE id=1",
             (STARTING_CASH,),
         )
 
 # ----------------------------
-# Pricing via o próprio /dataset
+# Pricing (em processo, via services.last_price)
 # ----------------------------
 
-def _last_close(symbol: str, tf: str) -> Optional[float]:
-    try:
-        url = f"{INTERNAL_BASE_URL}/dataset/?symbol={symbol}&tf={tf}&columns=time,close&limit=1&dropna=true"
-        r = requests.get(url, timeout=8)
-        r.raise_for_status()
-        data = r.json()
-        rows = data.get("rows") or []
-        if not rows:
-            return None
-        return float(rows[-1]["close"])
-    except Exception:
-        return None
-
 def get_last_price(symbol: str) -> Tuple[Optional[float], Optional[str]]:
-    price = _last_close(symbol, "1h")
-    if price is not None:
-        return price, "1h"
-    price = _last_close(symbol, "1d")
-    if price is not None:
-        return price, "1d"
-    return None, None
+    return last_price.get_last_price(symbol)
 
 # ----------------------------
 # Portfolio helpers
 # ----------------------------
 
+_SQL_PORTFOLIO = "SELECT * FROM portfolio WHERE id=1"
+_SQL_CASH_DELTA = "UPDATE portfolio SET cash=cash+?, realized_pnl=realized_pnl+? WHERE id=1"
+
 def _get_portfolio(conn: sqlite3.Connection) -> sqlite3.Row:
-    return conn.execute("SELECT * FROM portfolio WHERE id=1").fetchone()
+    return conn.execute(_SQL_PORTFOLIO).fetchone()
 
 def _update_cash_and_realized(conn: sqlite3.Connection, side: str, qty: float, exec_price: float, realized: float) -> None:
-    cur = conn.cursor()
-    p = _get_portfolio(conn)
-    cash = float(p["cash"])
-    if side == "buy":
-        cash -= qty * exec_price
-    else:
-        cash += qty * exec_price
-    realized_total = float(p["realized_pnl"]) + float(realized)
-    cur.execute("UPDATE portfolio SET cash=?, realized_pnl=? WHERE id=1", (cash, realized_total))
+    # aritmética no SQL: sem ler-e-regravar o saldo
+    amount = -qty * exec_price if side == "buy" else qty * exec_price
+    conn.execute(_SQL_CASH_DELTA, (amount, float(realized)))
 
 # ----------------------------
 # Positions
 # ----------------------------
 
+_SQL_POSITION = "SELECT symbol, qty, avg_price FROM positions WHERE symbol=?"
+_SQL_SAVE_POSITION = """
+    INSERT INTO positions(symbol, qty, avg_price)
+    VALUES(?,?,?)
+    ON CONFLICT(symbol) DO UPDATE SET
+      qty=excluded.qty,
+      avg_price=excluded.avg_price
+"""
+
 def _load_position(conn: sqlite3.Connection, symbol: str) -> Optional[sqlite3.Row]:
-    cur = conn.cursor()
-    return cur.execute(
-        "SELECT symbol, qty, avg_price FROM positions WHERE symbol=?",
-        (symbol,),
-    ).fetchone()
+    return conn.execute(_SQL_POSITION, (symbol,)).fetchone()
 
 def _save_position(conn: sqlite3.Connection, symbol: str, qty: float, avg_price: float) -> None:
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO positions(symbol, qty, avg_price)
-        VALUES(?,?,?)
-        ON CONFLICT(symbol) DO UPDATE SET
-          qty=excluded.qty,
-          avg_price=excluded.avg_price
-        """,
-        (symbol, qty, avg_price),
-    )
+    conn.execute(_SQL_SAVE_POSITION, (symbol, qty, avg_price))
 
-def list_positions(mark_to_market: bool = False) -> Dict[str, Any]:
-    with _conn() as conn:
-        cur = conn.cursor()
-        rows = cur.execute("SELECT symbol, qty, avg_price FROM positions ORDER BY symbol").fetchall()
-
-    positions = []
-    total_unreal = 0.0
-    for r in rows:
-        item = {"symbol": r["symbol"], "qty": float(r["qty"]), "avg_price": float(r["avg_price"])}
-        if mark_to_market:
-            last, tf = get_last_price(r["symbol"])
-            if last is not None:
-                item["last_price"] = last
-                item["mark_tf"] = tf
-                unreal = (last - item["avg_price"]) * item["qty"]
-                item["unrealized_pnl"] = unreal
-                total_unreal += unreal
-        positions.append(item)
+def _position_dict(conn: sqlite3.Connection, symbol: str) -> Optional[Dict[str, Any]]:
+    r = _load_position(conn, symbol)
+    if r is None:
+        return None
+    return {"symbol": r["symbol"], "qty": float(r["qty"]), "avg_price": float(r["avg_price"])}
 
-    if mark_to_market:
-        return {"positions": positions, "unrealized_pnl_total": total_unreal}
-    return {"positions": positions}
+def list_positions(mark_to_market: bool = False) -> Dict[str, Any]:
+    # ligação devolvida ao pool antes de ir buscar preços
+    with get_db().connection() as conn:
+        rows = conn.execute(
+            """
+            SELECT p.symbol, p.qty, p.avg_price, l.realized_pnl
+            FROM positions p LEFT JOIN symbol_pnl l ON l.symbol = p.symbol
+            ORDER BY p.symbol
+            """
+        ).fetchall()
+
+    positions = [
+        {
+            "symbol": r["symbol"],
+            "qty": float(r["qty"]),
+            "avg_price": float(r["avg_price"]),
+            "realized_pnl": float(r["realized_pnl"] or 0.0),
+        }
+        for r in rows
+    ]
+    if not mark_to_market:
+        return {"positions": positions}
+
+    # um só lookup de preços para todas as posições
+    last, tfs, unreal = last_price.mark_to_market(positions)
+    for i, item in enumerate(positions):
+        if tfs[i] is not None:
+            item["last_price"] = float(last[i])
+            item["mark_tf"] = tfs[i]
+            item["unrealized_pnl"] = float(unreal[i])
+    return {"positions": positions, "unrealized_pnl_total": float(unreal.sum())}
 
 # ----------------------------
 # Orders core
 # ----------------------------
 
+_SQL_ORDER = "SELECT * FROM orders WHERE id=?"
+_SQL_INSERT_ORDER = """
+    INSERT INTO orders(ts, symbol, side, qty, type, status, price, limit_price, stop_price, value, filled_qty, exchange, realized_pnl, fill_seq)
+    VALUES(:ts, :symbol, :side, :qty, :type, :status, :price, :limit_price, :stop_price, :value, :filled_qty, :exchange, :realized_pnl, :fill_seq)
+"""
+_SQL_FILL_ORDER = "UPDATE orders SET status='filled', price=?, value=?, filled_qty=qty, realized_pnl=?, fill_seq=? WHERE id=?"
+
 def _insert_order(conn: sqlite3.Connection, order: Dict[str, Any]) -> int:
-    cur = conn.cursor()
-    cur.execute(
-        """
-        INSERT INTO orders(ts, symbol, side, qty, type, status, price, limit_price, stop_price, value, filled_qty, exchange, realized_pnl)
-        VALUES(:ts, :symbol, :side, :qty, :type, :status, :price, :limit_price, :stop_price, :value, :filled_qty, :exchange, :realized_pnl)
-        """,
-        order,
-    )
-    return cur.lastrowid
+    cur = conn.execute(_SQL_INSERT_ORDER, order)
+    return cur.lastrowid or 0
+
+def _order_dict(conn: sqlite3.Connection, order_id: int) -> Dict[str, Any]:
+    r = conn.execute(_SQL_ORDER, (order_id,)).fetchone()
+    if not r:
+        raise KeyError("order not found")
+    return _row_to_dict(r)
 
-def _fill_position_math(pos: Optional[sqlite3.Row], side: str, qty: float, price: float) -> Tuple[float, float, float]:
+def _fill_position_math(pos: Optional[Union[sqlite3.Row, Mapping[str, Any]]], side: str, qty: float, price: float) -> Tuple[float, float, float]:
     """
     Retorna: new_qty, new_avg, realized_pnl_delta
     """
@@ -309,178 +469,308 @@ def _fill_position_math(pos: Optional[sqlite3.Row], side: str, qty: float, price
             new_avg = cur_avg if new_qty != 0 else cur_avg
             return new_qty, new_avg, realized_pnl
 
-def _apply_fill(conn: sqlite3.Connection, order_id: int, exec_price: float) -> float:
-    cur = conn.cursor()
-    o = cur.execute("SELECT * FROM orders WHERE id=?", (order_id,)).fetchone()
+def _apply_fill(conn: sqlite3.Connection, order_id: int, exec_price: float, ts: Optional[int] = None) -> Optional[float]:
+    """
+    Executa uma ordem 'open' ao preço dado. Retorna o PnL realizado
+    (None se a ordem já não estiver aberta). ts: relógio (replay); None => agora.
+    """
+    o = conn.execute(_SQL_ORDER, (order_id,)).fetchone()
     if not o or o["status"] != "open":
-        return 0.0
+        return None
 
-    pos = _load_position(conn, o["symbol"])
     qty = float(o["qty"])
-    side = o["side"]
-    new_qty, new_avg, realized = _fill_position_math(pos, side, qty, exec_price)
-    _save_position(conn, o["symbol"], new_qty, new_avg)
-
-    value = qty * exec_price
-    cur.execute(
-        "UPDATE orders SET status='filled', price=?, value=?, filled_qty=qty, realized_pnl=? WHERE id=?",
-        (exec_price, value, realized, order_id),
-    )
-
-    _update_cash_and_realized(conn, side, qty, exec_price, realized)
+    realized, seq = _execute_fill(conn, o["symbol"], o["side"], qty, exec_price, ts)
+    conn.execute(_SQL_FILL_ORDER, (exec_price, qty * exec_price, realized, seq, order_id))
     return realized
 
+def _execute_fill(conn: sqlite3.Connection, symbol: str, side: str, qty: float, price: float, ts: Optional[int] = None) -> Tuple[float, int]:
+    """
+    Um fill: posição + caixa/realized + ledger por símbolo (mesma transação).
+    Retorna (realized_pnl, fill_seq do símbolo).
+    """
+    pos = _load_position(conn, symbol)
+    new_qty, new_avg, realized = _fill_position_math(pos, side, qty, price)
+    _save_position(conn, symbol, new_qty, new_avg)
+    _update_cash_and_realized(conn, side, qty, price, realized)
+    conn.execute(_SQL_LEDGER_FILL, (symbol, new_qty, new_avg, realized, int(time.time()) if ts is None else ts))
+    seq = conn.execute(_SQL_LEDGER_SEQ, (symbol,)).fetchone()[0]
+    return realized, int(seq)
+
 def _should_fill_now(side: str, otype: str, last: float, limit_price: Optional[float], stop_price: Optional[float]) -> bool:
     if otype == "limit":
+        if limit_price is None:
+            return False
         if side == "buy":
             return last <= float(limit_price)
         return last >= float(limit_price)
     if otype == "stop":
+        if stop_price is None:
+            return False
         if side == "buy":
             return last >= float(stop_price)
         return last <= float(stop_price)
     return True  # market
 
-def place_order(
+def _place_order(
+    conn: sqlite3.Connection,
     *,
+    ts: int,
     symbol: str,
     exchange: Optional[str],
     side: str,
     qty: float,
-    otype: str = "market",
-    price: Optional[float] = None,
-    limit_price: Optional[float] = None,
-    stop_price: Optional[float] = None,
+    otype: str,
+    price: Optional[float],
+    limit_price: Optional[float],
+    stop_price: Optional[float],
+    last: Optional[float],
 ) -> Dict[str, Any]:
-    ts = int(time.time())
-    with _conn() as conn:
-        if otype == "market":
-            # Preço de execução antes de inserir
-            exec_price = price
-            priced_from_tf = None
-            if exec_price is None:
-                exec_price, priced_from_tf = get_last_price(symbol)
-                if exec_price is None:
-                    raise ValueError("no market price")
-
-            # Atualiza posição
-            pos = _load_position(conn, symbol)
-            new_qty, new_avg, realized = _fill_position_math(pos, side, float(qty), float(exec_price))
-            _save_position(conn, symbol, new_qty, new_avg)
-
-            # Atualiza caixa/realized
-            _update_cash_and_realized(conn, side, float(qty), float(exec_price), float(realized))
-
-            order = {
-                "ts": ts,
-                "symbol": symbol,
-                "side": side,
-                "qty": float(qty),
-                "type": "market",
-                "status": "filled",
-                "price": float(exec_price),
-                "limit_price": None,
-                "stop_price": None,
-                "value": float(qty) * float(exec_price),
-                "filled_qty": float(qty),
-                "exchange": exchange,
-                "realized_pnl": float(realized),
-            }
-            oid = _insert_order(conn, order)
-            o = get_order_by_id(oid)
-            resp = {"order": o, "position": get_position(symbol), "realized_pnl": realized}
-            if priced_from_tf:
-                resp["priced_from_tf"] = priced_from_tf
-            return resp
-
-        # LIMIT / STOP -> open, possível fill imediato se já cruzou
-        order = {
+    """
+    Cria (e executa, se for o caso) uma ordem numa transação já aberta.
+    last: último preço conhecido (obtido fora da transação).
+    """
+    if otype == "market":
+        # Preço de execução antes de inserir
+        exec_price = price if price is not None else last
+        if exec_price is None:
+            raise ValueError("no market price")
+
+        # Atualiza posição, caixa/realized e ledger
+        realized, seq = _execute_fill(conn, symbol, side, float(qty), float(exec_price), ts)
+
+        order: Dict[str, Any] = {
             "ts": ts,
             "symbol": symbol,
             "side": side,
             "qty": float(qty),
-            "type": otype,
-            "status": "open",
-            "price": None,
-            "limit_price": float(limit_price) if limit_price is not None else (float(price) if otype == "limit" and price is not None else None),
-            "stop_price": float(stop_price) if stop_price is not None else (float(price) if otype == "stop" and price is not None else None),
-            "value": None,
-            "filled_qty": 0.0,
+            "type": "market",
+            "status": "filled",
+            "price": float(exec_price),
+            "limit_price": None,
+            "stop_price": None,
+            "value": float(qty) * float(exec_price),
+            "filled_qty": float(qty),
             "exchange": exchange,
-            "realized_pnl": None,
+            "realized_pnl": float(realized),
+            "fill_seq": seq,
         }
+        oid = _insert_order(conn, order)
+        return {"order": _order_dict(conn, oid), "position": _position_dict(conn, symbol), "realized_pnl": realized}
+
+    # LIMIT / STOP -> open, possível fill imediato se já cruzou
+    order = {
+        "ts": ts,
+        "symbol": symbol,
+        "side": side,
+        "qty": float(qty),
+        "type": otype,
+        "status": "open",
+        "price": None,
+        "limit_price": float(limit_price) if limit_price is not None else (float(price) if otype == "limit" and price is not None else None),
+        "stop_price": float(stop_price) if stop_price is not None else (float(price) if otype == "stop" and price is not None else None),
+        "value": None,
+        "filled_qty": 0.0,
+        "exchange": exchange,
+        "realized_pnl": None,
+        "fill_seq": None,
+    }
 
-        if otype == "limit" and order["limit_price"] is None:
-            raise ValueError("limit order requires limit_price")
-        if otype == "stop" and order["stop_price"] is None:
-            raise ValueError("stop order requires stop_price")
+    if otype == "limit" and order["limit_price"] is None:
+        raise ValueError("limit order requires limit_price")
+    if otype == "stop" and order["stop_price"] is None:
+        raise ValueError("stop order requires stop_price")
 
-        oid = _insert_order(conn, order)
+    oid = _insert_order(conn, order)
+
+    if last is not None and _should_fill_now(side, otype, float(last), order["limit_price"], order["stop_price"]):
+        _apply_fill(conn, oid, float(last), ts)
+
+    return {"order": _order_dict(conn, oid), "position": _position_dict(conn, symbol), "realized_pnl": 0.0}
+
+def place_order(
+    *,
+    symbol: str,
+    exchange: Optional[str],
+    side: str,
+    qty: float,
+    otype: str = "market",
+    price: Optional[float] = None,
+    limit_price: Optional[float] = None,
+    stop_price: Optional[float] = None,
+) -> Dict[str, Any]:
+    ts = int(time.time())
+
+    # preço fora da transação: não segurar o lock de escrita durante o pedido
+    last, priced_from_tf = None, None
+    if otype != "market" or price is None:
+        last, priced_from_tf = get_last_price(symbol)
+        if otype == "market" and last is None:
+            raise ValueError("no market price")
+
+    with get_db().transaction() as conn:
+        resp = _place_order(
+            conn,
+            ts=ts,
+            symbol=symbol,
+            exchange=exchange,
+            side=side,
+            qty=qty,
+            otype=otype,
+            price=price,
+            limit_price=limit_price,
+            stop_price=stop_price,
+            last=last,
+        )
+    if otype == "market" and priced_from_tf:
+        resp["priced_from_tf"] = priced_from_tf
+    return resp
+
+def _place_batch(
+    conn: sqlite3.Connection,
+    orders: List[Dict[str, Any]],
+    *,
+    ts: int,
+    last: Mapping[str, float],
+    risk: Optional["RiskEngine"] = None,
+    slippage: float = 0.0,
+) -> List[Dict[str, Any]]:
+    """
+    Núcleo de place_orders e do replay: risco num só check_many contra o
+    snapshot de `risk` e execução de cada ordem num SAVEPOINT (uma ordem
+    rejeitada não desfaz as outras). Ordens de um símbolo já executado no lote
+    são revalidadas com as posições novas; risk.positions fica atualizado.
+    last: {symbol_key: último preço}; slippage: fração sobre o preço de mercado.
+    """
+    checks: List[Optional[Dict[str, Any]]] = [None] * len(orders)
+    if risk is not None:
+        checks = list(risk.check_many(orders))
+
+    results: List[Dict[str, Any]] = []
+    touched: Set[str] = set()
+    for i, o in enumerate(orders):
+        symbol = o["symbol"]
+        key = last_price.symbol_key(symbol)
+        otype = o.get("otype", "market")
+        px = last.get(key)
+        price = o.get("price")
+
+        if otype == "market" and price is None and px is None:
+            results.append({"index": i, "ok": False, "error": "invalid", "rule": None, "message": "no market price"})
+            continue
+
+        pr = checks[i]
+        if risk is not None and key in touched:
+            # posição já mudou neste lote: revalida contra o snapshot atualizado
+            pr = risk.check(**o)
+        if pr is not None and not pr["ok"]:
+            results.append({"index": i, "ok": False, "error": "risk", "rule": pr["rule"], "message": pr["message"]})
+            continue
+
+        if otype == "market" and price is None and px is not None and slippage:
+            price = px * (1.0 + (slippage if o["side"] == "buy" else -slippage))
+
+        conn.execute("SAVEPOINT batch_order")
+        try:
+            resp = _place_order(
+                conn,
+                ts=ts,
+                symbol=symbol,
+                exchange=o.get("exchange"),
+                side=o["side"],
+                qty=float(o["qty"]),
+                otype=otype,
+                price=price,
+                limit_price=o.get("limit_price"),
+                stop_price=o.get("stop_price"),
+                last=px,
+            )
+        except ValueError as ve:
+            conn.execute("ROLLBACK TO batch_order")
+            conn.execute("RELEASE batch_order")
+            results.append({"index": i, "ok": False, "error": "invalid", "rule": None, "message": str(ve)})
+            continue
+        conn.execute("RELEASE batch_order")
+
+        if risk is not None:
+            pos = resp["position"]
+            risk.positions[key] = float(pos["qty"]) if pos else 0.0
+            touched.add(key)
+        item = {"index": i, "ok": True, **resp}
+        if pr is not None and pr.get("checked_price") is not None:
+            item["risk_checked_price"] = pr["checked_price"]
+        results.append(item)
+    return results
+
+def place_orders(orders: List[Dict[str, Any]], risk: Optional["RiskEngine"] = None) -> Dict[str, Any]:
+    """
+    Lote de ordens (ex.: rebalance): um só lookup de preços, posições lidas
+    uma vez dentro de uma só transação, resultado por ordem.
+    orders: [{"symbol", "exchange", "side", "qty", "otype", "price", "limit_price", "stop_price"}]
+    risk: RiskEngine carregado com as posições/preços do lote (ver _place_batch).
+    """
+    ts = int(time.time())
+
+    # preços fora da transação, num só fetch multi-ticker
+    need = [o["symbol"] for o in orders if o.get("otype", "market") != "market" or o.get("price") is None]
+    bars = last_price.get_bars(need) if need else {}
+    last = {k: float(b["close"]) for k, b in bars.items() if b is not None}
+
+    with get_db().transaction() as conn:
+        if risk is not None:
+            risk.set_positions({r["symbol"]: float(r["qty"]) for r in conn.execute("SELECT symbol, qty FROM positions")})
+            risk.set_prices(last)
+        results = _place_batch(conn, orders, ts=ts, last=last, risk=risk)
 
-        last, _tf = get_last_price(symbol)
-        if last is not None and _should_fill_now(side, otype, float(last), order["limit_price"], order["stop_price"]):
-            _apply_fill(conn, oid, float(last))
+    for item in results:
+        o = orders[item["index"]]
+        bar = bars.get(last_price.symbol_key(o["symbol"]))
+        if item["ok"] and o.get("otype", "market") == "market" and o.get("price") is None and bar is not None:
+            item["priced_from_tf"] = bar["tf"]
 
-        o = get_order_by_id(oid)
-        return {"order": o, "position": get_position(symbol), "realized_pnl": 0.0}
+    accepted = sum(1 for r in results if r["ok"])
+    return {"results": results, "count": len(results), "accepted": accepted, "rejected": len(results) - accepted}
 
 def trigger_open_orders() -> Dict[str, Any]:
-    filled: List[int] = []
-    with _conn() as conn:
-        cur = conn.cursor()
-        open_orders = cur.execute("SELECT * FROM orders WHERE status='open' ORDER BY id").fetchall()
-        by_symbol: Dict[str, List[sqlite3.Row]] = {}
-        for o in open_orders:
-            by_symbol.setdefault(o["symbol"], []).append(o)
-
-        for sym, items in by_symbol.items():
-            last, _tf = get_last_price(sym)
-            if last is None:
-                continue
-            for o in items:
-                if _should_fill_now(o["side"], o["type"], float(last), o["limit_price"], o["stop_price"]):
-                    _apply_fill(conn, int(o["id"]), float(last))
-                    filled.append(int(o["id"]))
-
-    return {"filled": filled, "count": len(filled)}
+    """
+    Matching das ordens abertas contra a última barra (low/high) de cada símbolo.
+    """
+    # evita import circular: importa aqui
+    from app.services import order_book
+
+    return order_book.trigger_open_orders()
 
 def cancel_order(order_id: int) -> Dict[str, Any]:
-    with _conn() as conn:
-        cur = conn.cursor()
-        o = cur.execute("SELECT * FROM orders WHERE id=?", (order_id,)).fetchone()
+    with get_db().transaction() as conn:
+        o = conn.execute(_SQL_ORDER, (order_id,)).fetchone()
         if not o:
             return {"ok": False, "reason": "not-found"}
         if o["status"] != "open":
             return {"ok": False, "reason": "not-open"}
-        cur.execute("UPDATE orders SET status='cancelled' WHERE id=?", (order_id,))
-        return {"ok": True}
+        conn.execute("UPDATE orders SET status='cancelled' WHERE id=?", (order_id,))
+
+    from app.services import order_book
+
+    order_book.get_book().remove(order_id)
+    return {"ok": True}
+
+_SQL_LIST_ORDERS = "SELECT * FROM orders ORDER BY id DESC LIMIT ?"
+_SQL_LIST_ORDERS_STATUS = "SELECT * FROM orders WHERE status=? ORDER BY id DESC LIMIT ?"
 
 def list_orders(status: Optional[str] = None, limit: int = 50) -> Dict[str, Any]:
-    with _conn() as conn:
-        cur = conn.cursor()
+    with get_db().connection() as conn:
         if status:
-            rows = cur.execute(
-                "SELECT * FROM orders WHERE status=? ORDER BY id DESC LIMIT ?",
-                (status, int(limit)),
-            ).fetchall()
+            rows = conn.execute(_SQL_LIST_ORDERS_STATUS, (status, int(limit))).fetchall()
         else:
-            rows = cur.execute("SELECT * FROM orders ORDER BY id DESC LIMIT ?", (int(limit),)).fetchall()
+            rows = conn.execute(_SQL_LIST_ORDERS, (int(limit),)).fetchall()
     return {"orders": [_row_to_dict(r) for r in rows]}
 
 def get_order_by_id(order_id: int) -> Dict[str, Any]:
-    with _conn() as conn:
-        cur = conn.cursor()
-        r = cur.execute("SELECT * FROM orders WHERE id=?", (order_id,)).fetchone()
-        if not r:
-            raise KeyError("order not found")
-        return _row_to_dict(r)
+    with get_db().connection() as conn:
+        return _order_dict(conn, order_id)
 
 def get_position(symbol: str) -> Optional[Dict[str, Any]]:
-    with _conn() as conn:
-        r = _load_position(conn, symbol)
-        if r is None:
-            return None
-        return {"symbol": r["symbol"], "qty": float(r["qty"]), "avg_price": float(r["avg_price"])}
+    with get_db().connection() as conn:
+        return _position_dict(conn, symbol)
 
 def _row_to_dict(r: sqlite3.Row) -> Dict[str, Any]:
     return {
@@ -500,12 +790,120 @@ def _row_to_dict(r: sqlite3.Row) -> Dict[str, Any]:
         "realized_pnl": None if r["realized_pnl"] is None else float(r["realized_pnl"]),
     }
 
+# ----------------------------
+# Ledger de PnL realizado por símbolo
+# ----------------------------
+
+_SQL_LEDGER_FILL = """
+    INSERT INTO symbol_pnl(symbol, qty, avg_cost, realized_pnl, fills, updated_ts)
+    VALUES(?,?,?,?,1,?)
+    ON CONFLICT(symbol) DO UPDATE SET
+      qty=excluded.qty,
+      avg_cost=excluded.avg_cost,
+      realized_pnl=realized_pnl+excluded.realized_pnl,
+      fills=fills+1,
+      updated_ts=excluded.updated_ts
+"""
+_SQL_LEDGER_SEQ = "SELECT fills FROM symbol_pnl WHERE symbol=?"
+
+_SQL_REPLAY = """
+    SELECT id, ts, symbol, side, qty, price FROM orders
+    WHERE status='filled' AND price IS NOT NULL
+    ORDER BY symbol, fill_seq IS NOT NULL, fill_seq, ts, id
+"""
+
+def replay_ledger(conn: sqlite3.Connection) -> Dict[str, Dict[str, Any]]:
+    """
+    Reconstrói o ledger repetindo todas as ordens 'filled' (ordem dos fills
+    por símbolo) com _fill_position_math. O(total de ordens): só para
+    verificação/rebuild, nunca no caminho de leitura.
+    """
+    rows = conn.execute(_SQL_REPLAY)
+    ledger: Dict[str, Dict[str, Any]] = {}
+    for o in rows:
+        item = ledger.setdefault(
+            o["symbol"],
+            {"symbol": o["symbol"], "qty": 0.0, "avg_cost": 0.0, "realized_pnl": 0.0, "fills": 0, "updated_ts": 0, "order_ids": []},
+        )
+        pos = {"qty": item["qty"], "avg_price": item["avg_cost"]} if item["fills"] else None
+        new_qty, new_avg, realized = _fill_position_math(pos, o["side"], float(o["qty"]), float(o["price"]))
+        item.update(qty=new_qty, avg_cost=new_avg, fills=item["fills"] + 1, updated_ts=max(item["updated_ts"], int(o["ts"])))
+        item["realized_pnl"] += realized
+        item["order_ids"].append(int(o["id"]))
+    return ledger
+
+def _write_ledger(conn: sqlite3.Connection, ledger: Dict[str, Dict[str, Any]], assign_seq: bool = False) -> None:
+    conn.execute("DELETE FROM symbol_pnl")
+    conn.executemany(
+        "INSERT INTO symbol_pnl(symbol, qty, avg_cost, realized_pnl, fills, updated_ts) VALUES(?,?,?,?,?,?)",
+        [(it["symbol"], it["qty"], it["avg_cost"], it["realized_pnl"], it["fills"], it["updated_ts"]) for it in ledger.values()],
+    )
+    if assign_seq:
+        conn.executemany(
+            "UPDATE orders SET fill_seq=? WHERE id=?",
+            [(i + 1, oid) for it in ledger.values() for i, oid in enumerate(it["order_ids"])],
+        )
+
+def ledger(conn: Optional[sqlite3.Connection] = None) -> Dict[str, Dict[str, Any]]:
+    if conn is None:
+        with get_db().connection() as c:
+            return ledger(c)
+    rows = conn.execute("SELECT * FROM symbol_pnl ORDER BY symbol").fetchall()
+    return {r["symbol"]: dict(r) for r in rows}
+
+def realized_pnl_total(conn: Optional[sqlite3.Connection] = None) -> float:
+    if conn is None:
+        with get_db().connection() as c:
+            return realized_pnl_total(c)
+    return float(conn.execute("SELECT COALESCE(SUM(realized_pnl), 0.0) FROM symbol_pnl").fetchone()[0])
+
+def check_ledger(tol: float = 1e-6) -> Dict[str, Any]:
+    """
+    Compara o ledger incremental com um replay completo das ordens.
+    """
+    with get_db().connection() as conn:
+        stored = ledger(conn)
+        replay = replay_ledger(conn)
+        total = float(_get_portfolio(conn)["realized_pnl"])
+
+    diffs = []
+    for sym in sorted(set(stored) | set(replay)):
+        a, b = stored.get(sym), replay.get(sym)
+        if a is None or b is None:
+            diffs.append({"symbol": sym, "stored": a is not None, "replay": b is not None})
+            continue
+        bad = {
+            k: (float(a[k]), float(b[k]))
+            for k in ("qty", "avg_cost", "realized_pnl", "fills")
+            if abs(float(a[k]) - float(b[k])) > tol * max(1.0, abs(float(b[k])))
+        }
+        if bad:
+            diffs.append({"symbol": sym, **bad})
+
+    replay_total = sum(it["realized_pnl"] for it in replay.values())
+    return {
+        "ok": not diffs,
+        "symbols": len(replay),
+        "realized_pnl_total": replay_total,
+        "portfolio_realized_pnl": total,
+        "diffs": diffs,
+    }
+
+def rebuild_ledger() -> Dict[str, Any]:
+    """
+    Reescreve o ledger (e a ordem dos fills) a partir do histórico de ordens.
+    """
+    with get_db().transaction() as conn:
+        replay = replay_ledger(conn)
+        _write_ledger(conn, replay, assign_seq=True)
+    return {"symbols": len(replay), "realized_pnl_total": sum(it["realized_pnl"] for it in replay.values())}
+
 # ----------------------------
 # Portfolio view
 # ----------------------------
 
 def portfolio(mark_to_market: bool = True) -> Dict[str, Any]:
-    with _conn() as conn:
+    with get_db().connection() as conn:
         p = _get_portfolio(conn)
         cash = float(p["cash"])
         starting_cash = float(p["starting_cash"])
@@ -1,7 +1,11 @@
 ﻿import os
+import threading
 from dataclasses import dataclass
-from typing import Dict, Optional, Tuple
+from typing import Any, Dict, List, Mapping, Optional, Tuple
 
+import numpy as np
+
+from app.services import last_price
 from app.services.paper_db import get_last_price, get_position
 
 
@@ -47,6 +51,27 @@ class RiskConfig:
         }
 
 
+# config em cache: o ambiente só é relido em reload_config()
+_CONFIG: Optional[RiskConfig] = None
+_CONFIG_LOCK = threading.Lock()
+
+
+def get_config() -> RiskConfig:
+    global _CONFIG
+    if _CONFIG is None:
+        with _CONFIG_LOCK:
+            if _CONFIG is None:
+                _CONFIG = RiskConfig.load()
+    return _CONFIG
+
+
+def reload_config() -> RiskConfig:
+    global _CONFIG
+    with _CONFIG_LOCK:
+        _CONFIG = RiskConfig.load()
+    return _CONFIG
+
+
 def _price_for_check(
     otype: str,
     ref_price: Optional[float],
@@ -86,11 +111,13 @@ def check_new_order(
     limit_price: Optional[float] = None,
     stop_price: Optional[float] = None,
     cfg: Optional[RiskConfig] = None,
+    current_qty: Optional[float] = None,
 ) -> Dict:
     """
     Retorna: {"ok": bool, "rule": <str>|None, "message": <str>|None, "checked_price": <float>|None}
+    current_qty: posição já conhecida (snapshot de um lote); None => lê do paper_db.
     """
-    cfg = cfg or RiskConfig.load()
+    cfg = cfg or get_config()
 
     # 1) preço de referência para as validações de valor
     price_for_check, _tf = _price_for_check(otype, ref_price, limit_price, stop_price, symbol)
@@ -99,8 +126,11 @@ def check_new_order(
     # (ordem limit/stop sem preço definido não deve acontecer – validamos no router também)
 
     # 2) posição atual
-    pos = get_position(symbol)
-    cur_qty = float(pos["qty"]) if pos else 0.0
+    if current_qty is None:
+        pos = get_position(symbol)
+        cur_qty = float(pos["qty"]) if pos else 0.0
+    else:
+        cur_qty = float(current_qty)
 
     # 3) SHORT permitido?
     new_qty = _resulting_qty(cur_qty, side, float(qty))
@@ -172,4 +202,161 @@ def check_new_order(
 
 
 def current_policy() -> Dict:
-    return RiskConfig.load().as_dict()
+    return get_config().as_dict()
+
+
+# ---------------------------------------------------------------------------
+# RiskEngine: as mesmas regras de check_new_order, vetorizadas sobre muitas
+# ordens candidatas contra um snapshot em memória (posições + preços).
+# ---------------------------------------------------------------------------
+
+# ordem de avaliação = ordem das regras em check_new_order (a primeira que falha ganha)
+RULES = (
+    "allow_short",
+    "max_symbol_qty",
+    "price_missing",
+    "limit_price_missing",
+    "stop_price_missing",
+    "max_order_value",
+    "max_position_value",
+)
+
+
+class RiskEngine:
+    """
+    Pré-validação de risco sem I/O por ordem.
+    positions/prices: snapshot {SYMBOL: qty} / {SYMBOL: último preço}
+    (chaves last_price.symbol_key).
+    """
+
+    def __init__(
+        self,
+        cfg: Optional[RiskConfig] = None,
+        positions: Optional[Dict[str, float]] = None,
+        prices: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.cfg = cfg or get_config()
+        self.positions: Dict[str, float] = {}
+        self.prices: Dict[str, float] = {}
+        if positions:
+            self.set_positions(positions)
+        if prices:
+            self.set_prices(prices)
+
+    # ---------- snapshot ----------
+    def set_positions(self, positions: Dict[str, float]) -> None:
+        self.positions = {last_price.symbol_key(s): float(q) for s, q in positions.items()}
+
+    def set_prices(self, prices: Mapping[str, Optional[float]]) -> None:
+        for s, p in prices.items():
+            if p is not None:
+                self.prices[last_price.symbol_key(s)] = float(p)
+
+    def reload(self) -> RiskConfig:
+        self.cfg = reload_config()
+        return self.cfg
+
+    # ---------- checks ----------
+    def check_arrays(
+        self,
+        symbols: List[str],
+        side: np.ndarray,
+        qty: np.ndarray,
+        otype: np.ndarray,
+        price: np.ndarray,
+        limit_price: np.ndarray,
+        stop_price: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Núcleo vetorizado. side/otype: arrays de str; preços com NaN = ausente.
+        Devolve (rule_idx[N] (-1 = ok, senão índice em RULES), checked_price[N],
+        cur_qty[N], new_qty[N]). Cada ordem é avaliada contra o snapshot,
+        independentemente das outras candidatas.
+        """
+        cfg = self.cfg
+        # lookups no snapshot só por símbolo distinto
+        uniq, inv = np.unique(np.asarray(symbols, dtype=str), return_inverse=True)
+        keys = [last_price.symbol_key(s) for s in uniq]
+        cur = np.array([self.positions.get(k, 0.0) for k in keys], dtype=np.float64)[inv]
+        snap = np.array([self.prices.get(k, np.nan) for k in keys], dtype=np.float64)[inv]
+
+        is_market = otype == "market"
+        is_limit = otype == "limit"
+        is_stop = otype == "stop"
+        checked = np.where(
+            is_market,
+            np.where(np.isnan(price), snap, price),
+            np.where(is_limit, limit_price, np.where(is_stop, stop_price, np.nan)),
+        )
+        new_qty = np.where(side == "buy", cur + qty, cur - qty)
+        abs_new = np.abs(new_qty)
+        no_price = np.isnan(checked)
+
+        with np.errstate(invalid="ignore"):
+            fails = [
+                (new_qty < 0) & (not cfg.allow_short),
+                abs_new > cfg.max_symbol_qty,
+                no_price & is_market,
+                no_price & is_limit,
+                no_price & is_stop,
+                qty * checked > cfg.max_order_value,
+                abs_new * checked > cfg.max_position_value,
+            ]
+        rule = np.select(fails, np.arange(len(RULES)), default=-1)
+        return rule, checked, cur, new_qty
+
+    def check_many(self, orders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        orders: [{"symbol", "side", "qty", "otype"|"type", "price"|"ref_price", "limit_price", "stop_price"}]
+        Devolve uma lista no formato de check_new_order (mensagens só para as rejeitadas).
+        """
+        if not orders:
+            return []
+
+        symbols = [o["symbol"] for o in orders]
+        side = np.array([o["side"] for o in orders])
+        otype = np.array([o.get("otype") or o.get("type") or "market" for o in orders])
+        # None -> NaN (ausente)
+        qty = np.array([o["qty"] for o in orders], dtype=np.float64)
+        price = np.array([o.get("ref_price", o.get("price")) for o in orders], dtype=np.float64)
+        limit_price = np.array([o.get("limit_price") for o in orders], dtype=np.float64)
+        stop_price = np.array([o.get("stop_price") for o in orders], dtype=np.float64)
+
+        rule, checked, cur, new_qty = self.check_arrays(symbols, side, qty, otype, price, limit_price, stop_price)
+
+        out: List[Dict[str, Any]] = []
+        prices = [None if p != p else p for p in checked.tolist()]
+        for i, r in enumerate(rule.tolist()):
+            px = prices[i]
+            if r < 0:
+                out.append({"ok": True, "rule": None, "message": None, "checked_price": px})
+                continue
+            name = RULES[r]
+            out.append({
+                "ok": False,
+                "rule": name,
+                "message": _message(name, self.cfg, float(cur[i]), str(side[i]), float(qty[i]), float(new_qty[i]), px),
+                "checked_price": None if name.endswith("_missing") else px,
+            })
+        return out
+
+    def check(self, **order: Any) -> Dict[str, Any]:
+        return self.check_many([order])[0]
+
+
+def _message(rule: str, cfg: RiskConfig, cur_qty: float, side: str, qty: float, new_qty: float, price: Optional[float]) -> str:
+    # mesmos textos de check_new_order
+    if rule == "allow_short":
+        return f"Short não permitido. Qty atual {cur_qty}, ordem {side} {qty} => ficaria {new_qty} < 0."
+    if rule == "max_symbol_qty":
+        return f"Limite de quantidade por símbolo excedido. abs({new_qty}) > {cfg.max_symbol_qty}."
+    if rule == "price_missing":
+        return "Sem preço de mercado para validar a ordem."
+    if rule == "limit_price_missing":
+        return "limit_price ausente."
+    if rule == "stop_price_missing":
+        return "stop_price ausente."
+    px = price if price is not None else float("nan")
+    if rule == "max_order_value":
+        return f"Valor da ordem {qty * px:.2f} excede o máximo {cfg.max_order_value:.2f}."
+    return f"Valor da posição resultante {abs(new_qty) * px:.2f} excede o máximo {cfg.max_position_value:.2f}."
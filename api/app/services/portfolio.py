@@ -4,7 +4,8 @@ import time
 import json
 from typing import Dict, Any, List, Tuple, Optional
 from urllib.request import urlopen, Request
-from urllib.error import URLError, HTTPError
+
+from app.services import last_price, paper_db
 
 
 # --- Config -----------------------------------------------------------------
@@ -16,10 +17,9 @@ STARTING_CASH = float(os.getenv("PAPER_STARTING_CASH", "0"))  # por default 0
 
 # --- Helpers ----------------------------------------------------------------
 
-def _conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+def _conn():
+    # ligação do pool do paper_db (schema/migrações já aplicados)
+    return paper_db.get_db().connection()
 
 
 def _now_ts() -> int:
@@ -67,32 +67,12 @@ def _ensure_schema(conn: sqlite3.Connection) -> None:
     conn.commit()
 
 
-def _http_get_json(url: str) -> Any:
-    try:
-        with urlopen(url, timeout=8) as resp:
-            data = resp.read().decode("utf-8")
-            return json.loads(data)
-    except HTTPError as e:
-        raise RuntimeError(f"http {e.code} for {url}")
-    except URLError as e:
-        raise RuntimeError(f"http error for {url}: {e.reason}")
-
-
 def _last_price(symbol: str) -> Tuple[Optional[float], Optional[str]]:
     """
     Tenta 1h, depois 1d. Devolve (preco, tf_usada) ou (None, None) se não houver.
-    Usa o nosso endpoint /dataset.
+    Em processo (services.last_price), sem HTTP ao /dataset.
     """
-    for tf in ("1h", "1d"):
-        url = f"{BASE_URL}/dataset/?symbol={symbol}&tf={tf}&columns=time,close&limit=1"
-        try:
-            data = _http_get_json(url)
-            rows = data.get("rows") or []
-            if rows:
-                return float(rows[-1]["close"]), tf
-        except Exception:
-            continue
-    return None, None
+    return last_price.get_last_price(symbol)
 
 
 # --- Leitura de dados -------------------------------------------------------
@@ -103,14 +83,23 @@ def list_positions(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
     return [dict(r) for r in res]
 
 
+_SQL_FILLED = """
+    SELECT id, ts, symbol, side, qty, price, value
+    FROM orders
+    WHERE status='filled'
+    ORDER BY ts ASC, id ASC
+"""
+_SQL_FILLED_SYMBOLS = "SELECT DISTINCT symbol FROM orders WHERE status='filled'"
+_SQL_FILLED_BY_SYMBOL = """
+    SELECT ts, id, side, qty, price
+    FROM orders
+    WHERE status='filled' AND symbol=?
+    ORDER BY ts ASC, id ASC
+"""
+
 def list_filled_orders(conn: sqlite3.Connection) -> List[sqlite3.Row]:
     cur = conn.cursor()
-    res = cur.execute("""
-        SELECT id, ts, symbol, side, qty, price, value
-        FROM orders
-        WHERE status='filled'
-        ORDER BY ts ASC, id ASC
-    """).fetchall()
+    res = cur.execute(_SQL_FILLED).fetchall()
     return res
 
 
@@ -120,9 +109,11 @@ def compute_realized_pnl_from_orders(conn: sqlite3.Connection) -> float:
     """
     Reconstrói o PnL realizado percorrendo ordens 'filled' por símbolo.
     Long-only (short está bloqueado pelo teu risk engine).
+    O(total de ordens): as leituras usam o ledger (paper_db.realized_pnl_total);
+    isto fica como referência.
     """
     cur = conn.cursor()
-    syms = cur.execute("SELECT DISTINCT symbol FROM orders WHERE status='filled'").fetchall()
+    syms = cur.execute(_SQL_FILLED_SYMBOLS).fetchall()
     total = 0.0
 
     for row in syms:
@@ -130,12 +121,7 @@ def compute_realized_pnl_from_orders(conn: sqlite3.Connection) -> float:
         # posição virtual para reconstrução
         v_qty = 0.0
         v_avg = 0.0
-        for o in cur.execute("""
-            SELECT ts, id, side, qty, price
-            FROM orders
-            WHERE status='filled' AND symbol=?
-            ORDER BY ts ASC, id ASC
-        """, (sym,)):
+        for o in cur.execute(_SQL_FILLED_BY_SYMBOL, (sym,)):
             qty = float(o["qty"])
             price = float(o["price"])
             side = o["side"]
@@ -157,24 +143,18 @@ def mark_to_market(conn: sqlite3.Connection) -> Tuple[float, List[Dict[str, Any]
     Retorna (unrealized_total, positions_com_mtm)
     """
     pos = list_positions(conn)
-    unreal_total = 0.0
+    # um só lookup de preços (lote) e PnL vetorizado
+    last, tfs, unreal = last_price.mark_to_market(pos)
     out = []
-    for p in pos:
-        sym = p["symbol"]
-        qty = float(p["qty"])
-        avg = float(p["avg_price"])
-        last, used_tf = _last_price(sym)
-        if last is None:
-            last = avg  # fallback neutro
-            used_tf = None
-            unreal = 0.0
-        else:
-            unreal = qty * (last - avg)
-        unreal_total += unreal
+    for i, p in enumerate(pos):
         row = dict(p)
-        row.update({"last_price": last, "mark_tf": used_tf, "unrealized_pnl": unreal})
+        if tfs[i] is None:
+            # fallback neutro
+            row.update({"last_price": float(p["avg_price"]), "mark_tf": None, "unrealized_pnl": 0.0})
+        else:
+            row.update({"last_price": float(last[i]), "mark_tf": tfs[i], "unrealized_pnl": float(unreal[i])})
         out.append(row)
-    return unreal_total, out
+    return float(unreal.sum()), out
 
 
 # --- Caixa / Portfolio ------------------------------------------------------
@@ -214,7 +194,7 @@ def withdraw(conn: sqlite3.Connection, amount: float, note: Optional[str] = None
 def build_portfolio(conn: sqlite3.Connection) -> Dict[str, Any]:
     _ensure_schema(conn)
     cash = cash_balance(conn)
-    realized = compute_realized_pnl_from_orders(conn)
+    realized = paper_db.realized_pnl_total(conn)
     unreal, pos_mtm = mark_to_market(conn)
     market_value = sum((p["last_price"] or 0.0) * float(p["qty"]) for p in pos_mtm)
     equity = cash + market_value
@@ -0,0 +1,307 @@
+# api/app/services/replay.py
+from __future__ import annotations
+
+import math
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from app.ml.data_manager import DataManager
+from app.services import last_price, order_book, paper_db, policy
+
+# Replay histórico do paper trading: o mesmo motor (paper_db._place_order,
+# _fill_position_math, livro de ordens, RiskEngine) alimentado barra a barra
+# por um stream guardado, com relógio simulado e SQLite em memória.
+
+# -------------------------------
+# Dados
+# -------------------------------
+
+_EPOCH = pd.Timestamp(0, tz="UTC")
+
+def _epoch_seconds(index: pd.Index) -> np.ndarray:
+    idx = pd.DatetimeIndex(index)
+    if idx.tz is None:
+        idx = idx.tz_localize("UTC")
+    return ((idx - _EPOCH) // pd.Timedelta(seconds=1)).to_numpy(dtype=np.int64)
+
+def load_frames(
+    symbols: Iterable[str],
+    tf: str = "1H",
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Barras OHLC dos CSV limpos (data/clean/<SYMBOL>_<TF>_clean.csv).
+    """
+    dm = DataManager()
+    out: Dict[str, pd.DataFrame] = {}
+    for sym in symbols:
+        df = dm.load_clean(sym, tf)
+        df.index = pd.to_datetime(df.index, utc=True)
+        if start:
+            df = df[df.index >= pd.Timestamp(start, tz="UTC")]
+        if end:
+            df = df[df.index <= pd.Timestamp(end, tz="UTC")]
+        out[sym] = df
+    return out
+
+class BarStream:
+    """
+    Barras de vários símbolos fundidas numa só linha temporal (arrays).
+    steps() devolve (time, início, fim): as barras [início, fim) têm o mesmo time.
+    """
+
+    def __init__(self, frames: Dict[str, pd.DataFrame]) -> None:
+        self.symbols = [last_price.symbol_key(s) for s in frames]
+        parts_t, parts_s, parts_ohlc = [], [], []
+        for i, df in enumerate(frames.values()):
+            df = df.dropna(subset=["close"])
+            if df.empty:
+                continue
+            parts_t.append(_epoch_seconds(df.index))
+            parts_s.append(np.full(len(df), i, dtype=np.int32))
+            close = df["close"].to_numpy(dtype=np.float64)
+            cols = [df[c].to_numpy(dtype=np.float64) if c in df.columns else close for c in ("open", "high", "low")]
+            parts_ohlc.append(np.column_stack(cols + [close]))
+
+        if parts_t:
+            t = np.concatenate(parts_t)
+            order = np.argsort(t, kind="stable")
+            self.time = t[order]
+            self.sym = np.concatenate(parts_s)[order]
+            ohlc = np.concatenate(parts_ohlc)[order]
+            # OHLC em falta (NaN) => close
+            self.ohlc = np.where(np.isnan(ohlc), ohlc[:, 3:4], ohlc)
+        else:
+            self.time = np.empty(0, dtype=np.int64)
+            self.sym = np.empty(0, dtype=np.int32)
+            self.ohlc = np.empty((0, 4))
+
+    def __len__(self) -> int:
+        return len(self.time)
+
+    def steps(self):
+        if not len(self.time):
+            return
+        cuts = np.flatnonzero(np.diff(self.time)) + 1
+        bounds = np.concatenate(([0], cuts, [len(self.time)]))
+        for a, b in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+            yield int(self.time[a]), a, b
+
+# -------------------------------
+# Sessão de replay
+# -------------------------------
+
+# strategy(session, bars) -> ordens [{"symbol","side","qty","otype","price","limit_price","stop_price"}]
+Strategy = Callable[["ReplaySession", Dict[str, Dict[str, Any]]], Optional[List[Dict[str, Any]]]]
+
+class ReplaySession:
+    """
+    Um replay: PaperDB ":memory:" própria (não toca na base do processo),
+    livro de ordens próprio e RiskEngine com snapshot mantido a cada fill.
+    Em cada passo (um time do stream):
+      1) ordens abertas vs a barra (order_book.on_bar, só símbolos com ordens)
+      2) strategy(session, bars) decide no fecho da barra
+      3) ordens novas: risco (vetorizado) + _place_order numa só transação,
+         market ao close (+ slippage), ts = fecho da barra
+    """
+
+    def __init__(
+        self,
+        frames: Dict[str, pd.DataFrame],
+        tf: str = "1h",
+        cfg: Optional[policy.RiskConfig] = None,
+        slippage_bps: float = 0.0,
+    ) -> None:
+        self.stream = BarStream(frames)
+        self.symbols = self.stream.symbols
+        self.tf = tf.lower()
+        self.tf_seconds = order_book.TF_SECONDS.get(self.tf, 3600)
+        self.slippage = max(0.0, float(slippage_bps)) / 1e4
+
+        self.db = paper_db.PaperDB(":memory:")
+        self.book = order_book.OrderBook(self.db)
+        self.engine = policy.RiskEngine(cfg or policy.get_config())
+
+        with self.db.connection() as conn:
+            self.cash = float(paper_db._get_portfolio(conn)["cash"])
+        self.starting_cash = self.cash
+        self.clock = 0  # relógio simulado (epoch s): fecho da barra atual
+
+        n = len(self.symbols)
+        self._idx = {s: i for i, s in enumerate(self.symbols)}
+        self.qty = np.zeros(n)
+        self.last = np.full(n, np.nan)
+
+        self.equity_time: List[int] = []
+        self.equity: List[float] = []
+        self.orders = 0
+        self.fills = 0
+        self.rejected: List[Dict[str, Any]] = []
+
+    # ---------- estado ----------
+    def position(self, symbol: str) -> float:
+        return float(self.qty[self._idx[last_price.symbol_key(symbol)]])
+
+    def _refresh_symbols(self, conn, symbols: Iterable[str]) -> None:
+        # posições tocadas por fills + caixa (fonte de verdade: a base)
+        for sym in set(symbols):
+            pos = paper_db._load_position(conn, sym)
+            q = float(pos["qty"]) if pos is not None else 0.0
+            self.qty[self._idx[sym]] = q
+            self.engine.positions[sym] = q
+        self.cash = float(paper_db._get_portfolio(conn)["cash"])
+
+    # ---------- passo ----------
+    def _match(self, bars: Dict[str, Dict[str, Any]]) -> None:
+        touched: List[str] = []
+        for sym, bar in bars.items():
+            if self.book.has_orders(sym):
+                filled = self.book.on_bar(sym, bar, ts=self.clock)
+                if filled:
+                    self.fills += len(filled)
+                    touched.append(sym)
+        if touched:
+            with self.db.connection() as conn:
+                self._refresh_symbols(conn, touched)
+
+    def submit(self, orders: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Risco + execução de um lote de ordens ao relógio atual (uma transação),
+        pelo mesmo núcleo de paper_db.place_orders.
+        """
+        if not orders:
+            return []
+        orders = [{**o, "symbol": last_price.symbol_key(o["symbol"])} for o in orders]
+        last: Dict[str, float] = {}
+        for o in orders:
+            px = self.last[self._idx[o["symbol"]]]
+            if not math.isnan(px):
+                last[o["symbol"]] = float(px)
+
+        with self.db.transaction() as conn:
+            results = paper_db._place_batch(
+                conn, orders, ts=self.clock, last=last, risk=self.engine, slippage=self.slippage,
+            )
+            for o, res in zip(orders, results):
+                sym = o["symbol"]
+                if not res["ok"]:
+                    if res["error"] == "risk":
+                        self.rejected.append({"ts": self.clock, "symbol": sym, "side": o["side"], "qty": o["qty"], "rule": res["rule"]})
+                    continue
+                self.orders += 1
+                if res["order"]["status"] == "filled":
+                    self.fills += 1
+                self.qty[self._idx[sym]] = self.engine.positions[sym]
+            self.cash = float(paper_db._get_portfolio(conn)["cash"])
+            # ordens que ficaram 'open' entram no livro
+            self.book.sync(conn)
+        return results
+
+    def _bars(self, a: int, b: int) -> Dict[str, Dict[str, Any]]:
+        s = self.stream
+        out: Dict[str, Dict[str, Any]] = {}
+        for k, (o, h, low, c) in zip(s.sym[a:b].tolist(), s.ohlc[a:b].tolist()):
+            out[self.symbols[k]] = {
+                "time": int(s.time[a]), "open": o, "high": h, "low": low, "close": c, "tf": self.tf,
+            }
+        return out
+
+    def run(self, strategy: Optional[Strategy] = None, progress: Optional[Callable[[int, int], None]] = None) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        s = self.stream
+        steps = 0
+        for t, a, b in s.steps():
+            bars = self._bars(a, b)
+            # 1) ordens abertas vs barra (fills com ts = fecho da barra)
+            self.clock = t + self.tf_seconds
+            self._match(bars)
+
+            # preços: marca + snapshot do risco
+            idx = s.sym[a:b]
+            self.last[idx] = s.ohlc[a:b, 3]
+            for sym, bar in bars.items():
+                self.engine.prices[sym] = bar["close"]
+
+            # 2) + 3) estratégia no fecho da barra
+            if strategy is not None:
+                orders = strategy(self, bars)
+                if orders:
+                    self.submit(orders)
+
+            held = self.qty != 0
+            self.equity_time.append(self.clock)
+            self.equity.append(self.cash + float(np.dot(self.qty[held], self.last[held])))
+            steps += 1
+            if progress is not None and steps % 1000 == 0:
+                progress(steps, b)
+
+        return self.summary(elapsed=time.perf_counter() - t0, steps=steps)
+
+    # ---------- resultado ----------
+    def summary(self, elapsed: float = 0.0, steps: int = 0) -> Dict[str, Any]:
+        eq = np.asarray(self.equity) if self.equity else np.array([self.starting_cash])
+        peak = np.maximum.accumulate(eq)
+        dd = float(np.max((peak - eq) / np.where(peak > 0, peak, 1.0)))
+        with self.db.connection() as conn:
+            realized = paper_db.realized_pnl_total(conn)
+            open_orders = conn.execute("SELECT COUNT(*) FROM orders WHERE status='open'").fetchone()[0]
+        return {
+            "symbols": len(self.symbols),
+            "bars": len(self.stream),
+            "steps": steps,
+            "start": int(self.stream.time[0]) if len(self.stream) else None,
+            "end": int(self.stream.time[-1]) if len(self.stream) else None,
+            "orders": self.orders,
+            "fills": self.fills,
+            "open_orders": int(open_orders),
+            "rejected": len(self.rejected),
+            "starting_cash": self.starting_cash,
+            "cash": self.cash,
+            "equity": float(eq[-1]),
+            "total_return": float(eq[-1] / self.starting_cash - 1.0) if self.starting_cash else 0.0,
+            "max_drawdown": dd,
+            "realized_pnl_total": realized,
+            "elapsed_s": elapsed,
+        }
+
+    def close(self) -> None:
+        self.db.close()
+
+# -------------------------------
+# Estratégia de referência
+# -------------------------------
+
+def sma_cross_strategy(frames: Dict[str, pd.DataFrame], fast: int = 10, slow: int = 30, notional: float = 10_000.0) -> Strategy:
+    """
+    Long-only: entra quando SMA(fast) > SMA(slow), sai quando cruza abaixo.
+    Sinais pré-calculados (vetorizados) por símbolo; no replay só se lê o estado.
+    Entradas limitadas ao cash disponível (sem alavancagem): min(notional, cash).
+    """
+    signal: Dict[str, Dict[int, bool]] = {}
+    for sym, df in frames.items():
+        close = df["close"].astype(np.float64)
+        above = (close.rolling(fast).mean() > close.rolling(slow).mean()).to_numpy()
+        signal[last_price.symbol_key(sym)] = dict(zip(_epoch_seconds(df.index).tolist(), above.tolist()))
+
+    def _strategy(session: ReplaySession, bars: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        orders = []
+        # cash ainda não comprometido nesta barra (preço de execução com slippage)
+        cash = session.cash
+        for sym, bar in bars.items():
+            want = signal[sym].get(bar["time"], False)
+            held = session.position(sym)
+            if want and held <= 0:
+                px = bar["close"] * (1.0 + session.slippage)
+                qty = math.floor(min(notional, cash) / px)
+                if qty > 0:
+                    cash -= qty * px
+                    orders.append({"symbol": sym, "side": "buy", "qty": float(qty), "otype": "market"})
+            elif not want and held > 0:
+                orders.append({"symbol": sym, "side": "sell", "qty": held, "otype": "market"})
+        return orders
+
+    return _strategy
@@ -0,0 +1,26 @@
+import pytest
+
+from app.services import last_price, order_book, paper_db
+
+
+@pytest.fixture(autouse=True)
+def no_network(monkeypatch):
+    """
+    Sem Yahoo nos testes: preços só via last_price.put_bar.
+    """
+    monkeypatch.setattr(last_price, "_fetch_many", lambda symbols, tf=None: {})
+    last_price.invalidate()
+    yield
+    last_price.invalidate()
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """
+    PaperDB temporária instalada como base do processo (get_db).
+    """
+    monkeypatch.setattr(order_book, "_BOOK", None)
+    pdb = paper_db.init_db(str(tmp_path / "paper.db"))
+    yield pdb
+    pdb.close()
+    monkeypatch.setattr(paper_db, "_DB", None)
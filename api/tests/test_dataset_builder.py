@@ -0,0 +1,25 @@
+import numpy as np
+
+from app.ml_core.config_core import SEQ_LEN
+from app.ml_core.dataset_builder_core import window_rows, windows
+
+
+def _rows(n=SEQ_LEN + 50, f=3):
+    return np.arange(n * f, dtype=np.float32).reshape(n, f)
+
+
+def test_window_rows_inverts_windows():
+    rows = _rows()
+    np.testing.assert_array_equal(window_rows(windows(rows)), rows)
+    # blocos menores que o nº de janelas
+    np.testing.assert_array_equal(window_rows(windows(rows), block=7), rows)
+
+
+def test_window_rows_rejects_gap_in_the_middle():
+    rows = _rows()
+    X = windows(rows)
+    mid = len(X) // 2
+    # consecutivas nas pontas, salto de uma linha a meio
+    X_gap = np.concatenate([X[:mid], X[mid + 1:]])
+    assert window_rows(X_gap) is None
+    assert window_rows(X_gap, block=5) is None
@@ -0,0 +1,55 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.ml_core import feature_cache_core
+from app.ml_core.feature_cache_core import FeatureCacheCore
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(feature_cache_core, "_MEMORY", {})
+    csv = tmp_path / "AAA_1H_clean.csv"
+    csv.write_text("x")
+    monkeypatch.setattr(FeatureCacheCore, "_clean_path", lambda self, symbol: str(csv))
+    return FeatureCacheCore(cache_dir=str(tmp_path)), csv
+
+
+def _clean(n=400, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.005, n)))
+    idx = pd.date_range("2024-01-02 14:30", periods=n, freq="h", tz="UTC")
+    return pd.DataFrame(
+        {"open": close, "high": close * 1.002, "low": close * 0.998, "close": close, "volume": 1_000.0},
+        index=idx,
+    )
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return {"mtime_ns": st.st_mtime_ns, "size": st.st_size}
+
+
+def test_callers_cannot_poison_the_memory_cache(cache):
+    fc, csv = cache
+    frame = fc.transform("AAA", _clean(), stamp=_stamp(csv))
+    expected = frame["close"].to_numpy().copy()
+    frame["close"] = -1.0
+
+    # memória
+    a = fc.load("AAA")
+    assert fc.status == "memory"
+    np.testing.assert_array_equal(a["close"].to_numpy(), expected)
+    a["close"] = -1.0
+
+    # disco
+    feature_cache_core._MEMORY.clear()
+    b = fc.load("AAA")
+    assert fc.status == "hit"
+    b["close"] = -1.0
+
+    c = fc.load("AAA")
+    assert fc.status == "memory"
+    np.testing.assert_array_equal(c["close"].to_numpy(), expected)
@@ -0,0 +1,38 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import jobs, ml_core
+
+
+@pytest.fixture
+def client(monkeypatch):
+    submitted = []
+
+    def _enqueue(kind, req):
+        submitted.append((kind, jobs.job_kwargs(kind, req)))
+        return {"ok": True, "job_id": "x", "kind": kind}
+
+    monkeypatch.setattr(ml_core, "enqueue", _enqueue)
+    app = FastAPI()
+    app.include_router(ml_core.router)
+    return TestClient(app), submitted
+
+
+def test_walk_forward_is_enqueued_as_a_job(client):
+    c, submitted = client
+    res = c.post("/ml_core/walk_forward", json={"symbol": "aapl", "n_splits": 3, "embargo": 2})
+    assert res.status_code == 200
+    assert res.json()["job_id"] == "x"
+    assert submitted == [("walk_forward", {"symbol": "AAPL", "n_splits": 3, "embargo": 2})]
+
+
+@pytest.mark.parametrize("body", [
+    {"symbol": "AAPL", "n_splits": 0},
+    {"symbol": "AAPL", "n_splits": jobs.WF_MAX_SPLITS + 1},
+    {"symbol": "AAPL", "embargo": -1},
+])
+def test_walk_forward_rejects_bad_parameters(client, body):
+    c, submitted = client
+    assert c.post("/ml_core/walk_forward", json=body).status_code == 422
+    assert submitted == []
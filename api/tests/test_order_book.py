@@ -0,0 +1,115 @@
+import pytest
+
+from app.services import order_book, paper_db
+
+HOUR = 3600
+T0 = 1_700_000_000 - 1_700_000_000 % HOUR  # início de uma barra 1h
+
+
+def _order(db, ts, side, otype, trigger, last=None, qty=10.0):
+    with db.transaction() as conn:
+        resp = paper_db._place_order(
+            conn,
+            ts=ts,
+            symbol="AAA",
+            exchange=None,
+            side=side,
+            qty=qty,
+            otype=otype,
+            price=None,
+            limit_price=trigger if otype == "limit" else None,
+            stop_price=trigger if otype == "stop" else None,
+            last=last,
+        )
+    return resp["order"]
+
+
+def _status(db, oid):
+    with db.connection() as conn:
+        return paper_db._order_dict(conn, oid)
+
+
+def _bar(o, h, low, c, time=T0, **extra):
+    return {"time": time, "open": o, "high": h, "low": low, "close": c, "tf": "1h", **extra}
+
+
+@pytest.fixture
+def book(db):
+    return order_book.OrderBook(db)
+
+
+def test_mid_bar_order_ignores_earlier_low_and_open(db, book):
+    # barra começou há 45 min: open 95, low 94, close 105; buy limit 100 criada a 105
+    placed = T0 + 45 * 60
+    o = _order(db, placed, "buy", "limit", 100.0, last=105.0)
+    assert o["status"] == "open"
+
+    filled = book.on_bar("AAA", _bar(95.0, 106.0, 94.0, 105.0, fetched_at=placed + 60))
+    assert filled == []
+    assert _status(db, o["id"])["status"] == "open"
+
+    # quote seguinte da mesma barra desce abaixo do limite: fill ao close, nunca ao open
+    filled = book.on_bar("AAA", _bar(95.0, 106.0, 94.0, 99.0, fetched_at=placed + 120))
+    assert filled == [o["id"]]
+    assert _status(db, o["id"])["price"] == pytest.approx(99.0)
+
+
+def test_mid_bar_order_ignores_quote_fetched_before_it(db, book):
+    placed = T0 + 30 * 60
+    o = _order(db, placed, "buy", "limit", 100.0, last=101.0)
+
+    assert book.on_bar("AAA", _bar(101.0, 102.0, 98.0, 99.0, fetched_at=placed - 5)) == []
+    assert _status(db, o["id"])["status"] == "open"
+
+
+def test_order_before_bar_uses_low_high_and_gap_open(db, book):
+    buy = _order(db, T0 - 10, "buy", "limit", 100.0, last=104.0)
+    stop = _order(db, T0 - 5, "sell", "stop", 97.0, last=104.0, qty=1.0)
+
+    # abre em gap abaixo dos dois gatilhos
+    filled = book.on_bar("AAA", _bar(95.0, 103.0, 94.0, 102.0))
+    assert filled == [buy["id"], stop["id"]]
+    assert _status(db, buy["id"])["price"] == pytest.approx(95.0)
+    assert _status(db, stop["id"])["price"] == pytest.approx(95.0)
+
+
+def test_order_before_bar_fills_at_trigger_inside_range(db, book):
+    o = _order(db, T0, "sell", "limit", 110.0, last=104.0)
+
+    assert book.on_bar("AAA", _bar(105.0, 111.0, 104.0, 106.0)) == [o["id"]]
+    assert _status(db, o["id"])["price"] == pytest.approx(110.0)
+
+
+def test_order_after_bar_is_ignored(db, book):
+    o = _order(db, T0 + HOUR, "buy", "limit", 100.0, last=104.0)
+
+    assert book.on_bar("AAA", _bar(95.0, 103.0, 94.0, 96.0)) == []
+    assert _status(db, o["id"])["status"] == "open"
+
+
+def test_no_hits_skips_write_transaction(db, book, monkeypatch):
+    _order(db, T0 - 10, "buy", "limit", 90.0, last=104.0)
+
+    def no_tx():
+        raise AssertionError("BEGIN IMMEDIATE sem fills")
+
+    monkeypatch.setattr(db, "transaction", no_tx)
+    assert book.on_bar("AAA", _bar(100.0, 103.0, 95.0, 101.0)) == []
+
+
+def test_cancelled_elsewhere_is_not_filled(db, book):
+    o = _order(db, T0 - 10, "buy", "limit", 100.0, last=104.0)
+    with db.connection() as conn:
+        book.sync(conn)
+    with db.transaction() as conn:
+        conn.execute("UPDATE orders SET status='cancelled' WHERE id=?", (o["id"],))
+
+    assert book.on_bar("AAA", _bar(99.0, 101.0, 98.0, 99.0)) == []
+    assert len(book) == 0
+
+
+def test_on_quote_matches_lowercase_symbol(db):
+    o = _order(db, T0 - 10, "buy", "limit", 100.0, last=104.0)
+
+    order_book._on_quote("aaa", _bar(99.0, 101.0, 98.0, 99.5))
+    assert _status(db, o["id"])["status"] == "filled"
@@ -0,0 +1,160 @@
+import sqlite3
+
+import pytest
+
+from app.services import order_book, paper_db
+
+
+def _market(symbol, side, qty, price):
+    return paper_db.place_order(symbol=symbol, exchange=None, side=side, qty=qty, price=price)
+
+
+def _ledger_row(symbol):
+    return paper_db.ledger()[symbol]
+
+
+def test_partial_then_full_close_realizes_pnl(db):
+    _market("AAA", "buy", 10, 100.0)
+
+    resp = _market("AAA", "sell", 4, 110.0)
+    assert resp["order"]["realized_pnl"] == pytest.approx(40.0)
+    row = _ledger_row("AAA")
+    assert row["qty"] == pytest.approx(6.0)
+    assert row["avg_cost"] == pytest.approx(100.0)
+    assert row["realized_pnl"] == pytest.approx(40.0)
+    assert row["fills"] == 2
+
+    resp = _market("AAA", "sell", 6, 90.0)
+    assert resp["order"]["realized_pnl"] == pytest.approx(-60.0)
+    row = _ledger_row("AAA")
+    assert row["qty"] == pytest.approx(0.0)
+    assert row["realized_pnl"] == pytest.approx(-20.0)
+    assert row["fills"] == 3
+
+    assert paper_db.realized_pnl_total() == pytest.approx(-20.0)
+    pf = paper_db.portfolio(mark_to_market=False)
+    assert pf["realized_pnl_total"] == pytest.approx(-20.0)
+    assert pf["cash"] == pytest.approx(paper_db.STARTING_CASH - 1000.0 + 440.0 + 540.0)
+    assert paper_db.check_ledger()["ok"]
+
+
+def test_short_partial_cover(db):
+    _market("BBB", "sell", 5, 50.0)
+    _market("BBB", "buy", 2, 40.0)
+
+    row = _ledger_row("BBB")
+    assert row["qty"] == pytest.approx(-3.0)
+    assert row["avg_cost"] == pytest.approx(50.0)
+    assert row["realized_pnl"] == pytest.approx(20.0)
+    assert paper_db.check_ledger()["ok"]
+
+
+def test_ledger_follows_fill_order_not_creation_order(db):
+    # limit criado antes, executado depois de ordens mais recentes
+    with db.transaction() as conn:
+        lim = paper_db._place_order(
+            conn, ts=1_000, symbol="CCC", exchange=None, side="sell", qty=5, otype="limit",
+            price=None, limit_price=120.0, stop_price=None, last=100.0,
+        )["order"]
+    _market("CCC", "buy", 10, 100.0)
+    _market("CCC", "buy", 10, 110.0)
+
+    book = order_book.OrderBook(db)
+    bar = {"time": 2_000, "open": 119.0, "high": 121.0, "low": 118.0, "close": 120.0, "tf": "1h"}
+    assert book.on_bar("CCC", bar) == [lim["id"]]
+
+    row = _ledger_row("CCC")
+    assert row["qty"] == pytest.approx(15.0)
+    assert row["realized_pnl"] == pytest.approx((120.0 - 105.0) * 5)
+    check = paper_db.check_ledger()
+    assert check["ok"], check["diffs"]
+
+
+def test_rebuild_ledger_restores_drift(db):
+    _market("AAA", "buy", 10, 100.0)
+    _market("AAA", "sell", 10, 101.0)
+    with db.transaction() as conn:
+        conn.execute("UPDATE symbol_pnl SET realized_pnl=999 WHERE symbol='AAA'")
+    assert not paper_db.check_ledger()["ok"]
+
+    assert paper_db.rebuild_ledger()["realized_pnl_total"] == pytest.approx(10.0)
+    assert paper_db.check_ledger()["ok"]
+
+
+# schema anterior às migrações versionadas (user_version 0, sem ledger nem fill_seq)
+_V0_SCHEMA = """
+CREATE TABLE positions (symbol TEXT PRIMARY KEY, qty REAL NOT NULL, avg_price REAL NOT NULL);
+CREATE TABLE orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts INTEGER NOT NULL,
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL CHECK(side IN ('buy','sell')),
+    qty REAL NOT NULL,
+    type TEXT NOT NULL DEFAULT 'market' CHECK(type IN ('market','limit','stop')),
+    status TEXT NOT NULL CHECK(status IN ('open','filled','cancelled','rejected')),
+    price REAL,
+    limit_price REAL,
+    stop_price REAL,
+    value REAL,
+    filled_qty REAL NOT NULL DEFAULT 0.0,
+    exchange TEXT,
+    realized_pnl REAL
+);
+CREATE TABLE portfolio (
+    id INTEGER PRIMARY KEY CHECK(id=1),
+    starting_cash REAL NOT NULL,
+    cash REAL NOT NULL,
+    realized_pnl REAL NOT NULL
+);
+"""
+
+
+def test_migrates_v0_database(tmp_path):
+    path = str(tmp_path / "v0.db")
+    conn = sqlite3.connect(path)
+    conn.executescript(_V0_SCHEMA)
+    conn.executemany(
+        "INSERT INTO orders(ts, symbol, side, qty, type, status, price, value, filled_qty) "
+        "VALUES(?,?,?,?, 'market', 'filled', ?, ?, ?)",
+        [
+            (100, "AAA", "buy", 10.0, 100.0, 1000.0, 10.0),
+            (200, "AAA", "sell", 4.0, 110.0, 440.0, 4.0),
+            (300, "BBB", "sell", 2.0, 50.0, 100.0, 2.0),
+        ],
+    )
+    conn.execute(
+        "INSERT INTO orders(ts, symbol, side, qty, type, status, limit_price) "
+        "VALUES(400, 'AAA', 'buy', 1.0, 'limit', 'open', 90.0)"
+    )
+    conn.execute("INSERT INTO positions VALUES('AAA', 6.0, 100.0), ('BBB', -2.0, 50.0)")
+    conn.execute("INSERT INTO portfolio VALUES(1, 100000.0, 99540.0, 40.0)")
+    conn.commit()
+    conn.close()
+
+    pdb = paper_db.PaperDB(path, size=1)
+    try:
+        with pdb.connection() as c:
+            assert c.execute("PRAGMA user_version").fetchone()[0] == len(paper_db.MIGRATIONS)
+            cols = {r["name"] for r in c.execute("PRAGMA table_info(orders)")}
+            assert "fill_seq" in cols
+            indexes = {r["name"] for r in c.execute("PRAGMA index_list(orders)")}
+            assert set(paper_db.ORDER_INDEXES) <= indexes
+
+            led = paper_db.ledger(c)
+            assert led["AAA"]["qty"] == pytest.approx(6.0)
+            assert led["AAA"]["realized_pnl"] == pytest.approx(40.0)
+            assert led["AAA"]["fills"] == 2
+            assert led["BBB"]["qty"] == pytest.approx(-2.0)
+            seqs = [r[0] for r in c.execute("SELECT fill_seq FROM orders ORDER BY id")]
+            assert seqs == [1, 2, 1, None]
+            assert c.execute("SELECT cash FROM portfolio").fetchone()[0] == pytest.approx(99540.0)
+    finally:
+        pdb.close()
+
+    # reabrir não volta a migrar
+    pdb = paper_db.PaperDB(path, size=1)
+    try:
+        with pdb.connection() as c:
+            assert paper_db.ledger(c)["AAA"]["fills"] == 2
+    finally:
+        pdb.close()
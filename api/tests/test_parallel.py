@@ -0,0 +1,20 @@
+import os
+
+from app.cli.parallel import run_tasks
+
+
+def _child_runtime():
+    return {k: os.environ.get(k) for k in ("ML_RUNTIME_ROLE", "ML_TRAIN_PROCS", "ML_RUNTIME_THREAD_ENV")}
+
+
+def test_run_tasks_scopes_runtime_env_to_children(monkeypatch):
+    monkeypatch.setenv("ML_RUNTIME_ROLE", "api")
+    monkeypatch.delenv("ML_TRAIN_PROCS", raising=False)
+    before = dict(os.environ)
+
+    rows = run_tasks(_child_runtime, [{}, {}], jobs=2, timeout=60)
+
+    assert [r["status"] for r in rows] == ["ok", "ok"]
+    assert rows[0]["result"]["ML_RUNTIME_ROLE"] == "train"
+    assert rows[0]["result"]["ML_TRAIN_PROCS"] == "2"
+    assert dict(os.environ) == before
@@ -0,0 +1,47 @@
+import copy
+
+from app.cli.paper_replay import _synthetic_frames
+from app.services import policy, replay
+
+
+def test_sma_strategy_never_spends_more_than_cash():
+    frames = _synthetic_frames(20, 600, 7)
+    strategy = replay.sma_cross_strategy(frames, fast=5, slow=20, notional=10_000.0)
+    cash = []
+
+    def _tracked(session, bars):
+        cash.append(session.cash)
+        return strategy(session, bars)
+
+    session = replay.ReplaySession(frames, tf="1h", slippage_bps=10.0)
+    try:
+        res = session.run(_tracked)
+    finally:
+        session.close()
+
+    assert res["orders"] > 0
+    assert min(cash + [res["cash"]]) >= 0.0
+
+
+def test_submit_shares_the_batch_core_and_leaves_orders_untouched():
+    frames = _synthetic_frames(2, 50, 1)
+    cfg = policy.RiskConfig(allow_short=False, max_order_value=1e12, max_symbol_qty=1e12, max_position_value=1e12)
+    orders = [
+        {"symbol": "syn000", "side": "buy", "qty": 2.0, "price": 100.0},
+        {"symbol": "SYN000", "side": "sell", "qty": 2.0, "price": 101.0},
+        {"symbol": "SYN000", "side": "sell", "qty": 1.0, "price": 101.0},
+    ]
+    sent = copy.deepcopy(orders)
+
+    session = replay.ReplaySession(frames, tf="1h", cfg=cfg)
+    try:
+        res = session.submit(orders)
+    finally:
+        session.close()
+
+    assert orders == sent
+    assert [r["ok"] for r in res] == [True, True, False]
+    assert res[2]["rule"] == "allow_short"
+    assert [r["rule"] for r in session.rejected] == ["allow_short"]
+    assert session.position("syn000") == 0.0
+    assert session.orders == 2
@@ -0,0 +1,82 @@
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.routers import paper
+from app.services import last_price, policy
+
+CFG = policy.RiskConfig(allow_short=False, max_order_value=5_000.0, max_symbol_qty=100.0, max_position_value=8_000.0)
+
+# qty em float, como no NewOrder
+# (side, qty, otype, ref_price, limit_price, stop_price, current_qty)
+CASES = [
+    ("buy", 10.0, "market", 100.0, None, None, 0.0),
+    ("sell", 5.0, "market", 100.0, None, None, 2.0),       # allow_short
+    ("buy", 150.0, "market", 1.0, None, None, 0.0),        # max_symbol_qty
+    ("buy", 60.0, "market", 100.0, None, None, 0.0),       # max_order_value
+    ("buy", 40.0, "limit", None, 100.0, None, 50.0),       # max_position_value
+    ("buy", 1.0, "limit", None, None, None, 0.0),          # limit_price_missing
+    ("sell", 1.0, "stop", None, None, None, 3.0),          # stop_price_missing
+    ("buy", 1.0, "market", None, None, None, 0.0),         # price_missing
+    ("sell", 3.0, "stop", None, None, 90.0, 3.0),
+]
+
+
+@pytest.mark.parametrize("side,qty,otype,ref_price,limit_price,stop_price,current_qty", CASES)
+def test_engine_matches_check_new_order(side, qty, otype, ref_price, limit_price, stop_price, current_qty):
+    expected = policy.check_new_order(
+        symbol="ZZZ", side=side, qty=qty, otype=otype, ref_price=ref_price,
+        limit_price=limit_price, stop_price=stop_price, cfg=CFG, current_qty=current_qty,
+    )
+    engine = policy.RiskEngine(CFG, positions={"ZZZ": current_qty})
+    got = engine.check(
+        symbol="zzz", side=side, qty=qty, otype=otype, ref_price=ref_price,
+        limit_price=limit_price, stop_price=stop_price,
+    )
+    assert got == expected
+
+
+def test_engine_uses_snapshot_price_like_last_price():
+    last_price.put_bar("AAA", {"time": int(time.time()), "close": 120.0})
+    expected = policy.check_new_order(symbol="AAA", side="buy", qty=50, otype="market", cfg=CFG, current_qty=0.0)
+    engine = policy.RiskEngine(CFG, prices={"AAA": 120.0})
+    got = engine.check(symbol="AAA", side="buy", qty=50, otype="market")
+    assert not got["ok"] and got["rule"] == "max_order_value"
+    assert got == expected
+
+
+def test_check_many_is_independent_of_other_candidates():
+    engine = policy.RiskEngine(CFG, positions={"AAA": 0.0})
+    orders = [
+        {"symbol": "AAA", "side": "buy", "qty": 10, "otype": "market", "price": 100.0},
+        {"symbol": "AAA", "side": "sell", "qty": 10, "otype": "market", "price": 100.0},
+    ]
+    first, second = engine.check_many(orders)
+    assert first["ok"]
+    assert second["rule"] == "allow_short"
+
+    engine.positions["AAA"] = 10.0
+    assert engine.check(**orders[1])["ok"]
+
+
+def test_batch_endpoint_rechecks_symbols_filled_in_the_batch(db, monkeypatch):
+    monkeypatch.setattr(paper, "get_config", lambda: CFG)
+    app = FastAPI()
+    app.include_router(paper.router)
+    client = TestClient(app)
+
+    body = {"orders": [
+        {"symbol": "AAA", "side": "buy", "qty": 10, "type": "market", "price": 100.0},
+        {"symbol": "AAA", "side": "sell", "qty": 10, "type": "market", "price": 100.0},
+        {"symbol": "AAA", "side": "sell", "qty": 1, "type": "market", "price": 100.0},
+        {"symbol": "BBB", "side": "buy", "qty": 60, "type": "market", "price": 100.0},
+    ]}
+    res = client.post("/paper/orders/batch", json=body)
+    assert res.status_code == 200
+    out = res.json()
+    assert [r["ok"] for r in out["results"]] == [True, True, False, False]
+    assert out["results"][2]["rule"] == "allow_short"
+    assert out["results"][3]["rule"] == "max_order_value"
+    assert out["accepted"] == 2
@@ -0,0 +1,40 @@
+import torch
+
+from app.ml_core.trainer_core import TrainerCore
+
+
+class _RecordingOptimizer:
+    """Guarda o gradiente de cada passo em vez de atualizar os pesos."""
+
+    def __init__(self, params):
+        self.params = list(params)
+        self.grads = []
+
+    def step(self):
+        self.grads.append(torch.cat([p.grad.flatten().clone() for p in self.params]))
+
+    def zero_grad(self):
+        for p in self.params:
+            p.grad = None
+
+
+def test_last_accumulation_group_is_averaged_over_its_own_batches():
+    torch.manual_seed(0)
+    trainer = TrainerCore("TEST", precision="fp32", accum_steps=2, compile_model=False, persist=False)
+    model = torch.nn.Linear(3, 1)
+    trainer.model = trainer.forward_model = model
+    trainer.optimizer = _RecordingOptimizer(model.parameters())
+    batches = [(torch.randn(4, 3), torch.randn(4, 1)) for _ in range(5)]
+    trainer.train_loader = batches
+
+    trainer.train_epoch()
+
+    def grad(group):
+        model.zero_grad()
+        sum(trainer.criterion(model(X), y) for X, y in group).div(len(group)).backward()
+        return torch.cat([p.grad.flatten() for p in model.parameters()])
+
+    expected = [grad(batches[0:2]), grad(batches[2:4]), grad(batches[4:5])]
+    assert len(trainer.optimizer.grads) == 3
+    for got, want in zip(trainer.optimizer.grads, expected):
+        torch.testing.assert_close(got, want)
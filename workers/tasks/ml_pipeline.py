@@ -0,0 +1,166 @@
+import os
+import sys
+
+from celery.contrib.abortable import AbortableTask
+from celery.exceptions import Ignore
+from celery.signals import celeryd_after_setup, worker_process_init
+
+from workers.app import celery_app
+
+# O código do pipeline vive na API (api/app/ml_core); no container do worker
+# o caminho vem de ML_API_DIR (default: <repo>/api)
+ML_API_DIR = os.getenv(
+    "ML_API_DIR",
+    os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "api")),
+)
+if ML_API_DIR not in sys.path:
+    sys.path.insert(0, ML_API_DIR)
+
+
+# ------------------------------------------------------------
+# Threads por processo: concorrência × threads torch ≈ nº de cores
+# (plano central em app/runtime.py, papel "worker")
+# ------------------------------------------------------------
+@celeryd_after_setup.connect
+def _remember_concurrency(sender, instance, **kwargs):
+    os.environ.setdefault("ML_WORKER_CONCURRENCY", str(instance.concurrency or 1))
+
+
+@worker_process_init.connect
+def _limit_threads(**kwargs):
+    import torch  # noqa: F401  (configure só aplica ao torch já carregado)
+    from app import runtime
+
+    runtime.configure("worker")
+
+
+# ------------------------------------------------------------
+# Helpers
+# ------------------------------------------------------------
+def _progress(task, **meta):
+    # sem id (chamada direta) ou já cancelado: não sobrescrever o estado
+    if task.request.id is None or task.is_aborted():
+        return
+    task.update_state(state="PROGRESS", meta=meta)
+
+
+def _check_aborted(task):
+    if task.request.id is not None and task.is_aborted():
+        # estado ABORTED já está no backend; Ignore evita passar a SUCCESS
+        raise Ignore()
+
+
+def _train(task, symbol, step="train", incremental=False, **opts):
+    from app.ml_core.pipeline_core import finetune_symbol, train_symbol
+
+    def on_epoch(info):
+        _progress(task, step=step, symbol=symbol.upper(), **info)
+
+    result = (finetune_symbol if incremental else train_symbol)(
+        symbol,
+        progress_cb=on_epoch,
+        should_stop=lambda: task.request.id is not None and task.is_aborted(),
+        **opts,
+    )
+    if result.get("cancelled"):
+        raise Ignore()
+    return result
+
+
+# ------------------------------------------------------------
+# Tasks
+# ------------------------------------------------------------
+@celery_app.task(bind=True, base=AbortableTask, name="ml.download")
+def download(self, symbol: str) -> dict:
+    from app.ml_core.pipeline_core import download_symbol
+
+    _progress(self, step="download", symbol=symbol.upper())
+    return download_symbol(symbol)
+
+
+@celery_app.task(bind=True, base=AbortableTask, name="ml.clean")
+def clean(self, symbol: str) -> dict:
+    from app.ml_core.pipeline_core import clean_symbol
+
+    _progress(self, step="clean", symbol=symbol.upper())
+    return clean_symbol(symbol)
+
+
+@celery_app.task(bind=True, base=AbortableTask, name="ml.train")
+def train(self, symbol: str, resume: bool = True) -> dict:
+    _progress(self, step="train", symbol=symbol.upper(), epoch=0)
+    return _train(self, symbol, resume=resume)
+
+
+@celery_app.task(bind=True, base=AbortableTask, name="ml.finetune")
+def finetune(self, symbol: str, window=None, epochs=None,
+             update_scaler: bool = False, resume: bool = True) -> dict:
+    _progress(self, step="finetune", symbol=symbol.upper(), epoch=0)
+    return _train(self, symbol, step="finetune", incremental=True, window=window,
+                  epochs=epochs, update_scaler=update_scaler, resume=resume)
+
+
+@celery_app.task(bind=True, base=AbortableTask, name="ml.train_global")
+def train_global(self, symbols: list) -> dict:
+    from app.ml_core.pipeline_core import train_global as train_global_model
+
+    names = [s.upper() for s in symbols]
+
+    def on_epoch(info):
+        _progress(self, step="train_global", symbols=names, **info)
+
+    _progress(self, step="train_global", symbols=names, epoch=0)
+    result = train_global_model(
+        names,
+        progress_cb=on_epoch,
+        should_stop=lambda: self.request.id is not None and self.is_aborted(),
+    )
+    if result.get("cancelled"):
+        raise Ignore()
+    return result
+
+
+@celery_app.task(bind=True, base=AbortableTask, name="ml.backtest")
+def backtest(self, symbol: str, mode: str = "moderate",
+             fees_bps: float = 0.0, slippage_bps: float = 0.0) -> dict:
+    from app.ml_core.pipeline_core import backtest_symbol
+
+    _progress(self, step="backtest", symbol=symbol.upper())
+    return backtest_symbol(symbol, mode, fees_bps, slippage_bps)
+
+
+@celery_app.task(bind=True, base=AbortableTask, name="ml.walk_forward")
+def walk_forward(self, symbol: str, n_splits: int = 5, embargo: int = 0) -> dict:
+    from app.ml_core.pipeline_core import walk_forward_symbol
+
+    # folds em série: o paralelismo vem da concorrência do worker
+    _progress(self, step="walk_forward", symbol=symbol.upper())
+    return walk_forward_symbol(symbol, n_splits=n_splits, embargo=embargo, jobs=1)
+
+
+@celery_app.task(bind=True, base=AbortableTask, name="ml.full_pipeline")
+def full_pipeline(self, symbol: str, mode: str = "moderate",
+                  fees_bps: float = 0.0, slippage_bps: float = 0.0, resume: bool = True) -> dict:
+    from app.ml_core.pipeline_core import backtest_symbol, clean_symbol, download_symbol
+
+    _progress(self, step="download", symbol=symbol.upper())
+    downloaded = download_symbol(symbol)
+    _check_aborted(self)
+
+    _progress(self, step="clean", symbol=symbol.upper())
+    cleaned = clean_symbol(symbol)
+    _check_aborted(self)
+
+    trained = _train(self, symbol, resume=resume)
+    _check_aborted(self)
+
+    _progress(self, step="backtest", symbol=symbol.upper())
+    result = backtest_symbol(symbol, mode, fees_bps, slippage_bps)
+
+    return {
+        "symbol": symbol.upper(),
+        "download": downloaded,
+        "clean": cleaned,
+        "train": trained,
+        "backtest": result,
+    }